@@ -1,10 +1,17 @@
+-- Baseline schema for a fresh database. Later changes (indexes, partitioning) are
+-- versioned migrations in sma_collector/database/migrations.py, applied by the
+-- workers at startup or with: python -m sma_collector.database.migrations
+
 -- Phase 1 Tables
 CREATE TABLE IF NOT EXISTS commits (
     sha VARCHAR(40) PRIMARY KEY,
     author_name VARCHAR(255),
     author_email VARCHAR(255),
     authored_date TIMESTAMP WITH TIME ZONE,
-    message TEXT
+    message TEXT,
+    lines_added INTEGER,
+    lines_deleted INTEGER,
+    files_changed INTEGER
 );
 
 CREATE TABLE IF NOT EXISTS issues (
@@ -104,3 +111,11 @@ CREATE TABLE IF NOT EXISTS code_quality_metrics (
     UNIQUE (analysis_date, project_key, metric_name)
 );
 
+-- Collection State
+CREATE TABLE IF NOT EXISTS collection_watermarks (
+    source VARCHAR(100) NOT NULL,
+    watermark_key VARCHAR(512) NOT NULL,
+    value TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (source, watermark_key)
+);
@@ -1,7 +1,10 @@
+from datetime import date, timedelta
 from fastapi import FastAPI, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
 
+from sma_collector.database.engines import pool_metrics
+from sma_collector.dora import PERIODS, query_dora_metrics
 from sma_collector.storage.db import Database
 from . import crud, schemas
 
@@ -11,9 +14,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 프로세스 전체에서 하나의 엔진(커넥션 풀)을 공유합니다.
+db = Database()
+
 # 데이터베이스 의존성 주입 함수
 def get_db_session():
-    db = Database()
     with db.get_session() as session:
         yield session
 
@@ -21,6 +26,28 @@ def get_db_session():
 def read_root():
     return {"message": "Welcome to the Software Metrics Analyzer API"}
 
+@app.get("/metrics/db-pool")
+def read_db_pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    데이터베이스 커넥션 풀의 사용 현황과 체크아웃 대기 시간을 조회합니다.
+    """
+    return pool_metrics()
+
+@app.get("/metrics/dora")
+def read_dora_metrics(start: Optional[date] = None, end: Optional[date] = None, period: str = "week",
+                      team: Optional[str] = None, repo: Optional[str] = None, group_by: str = "team,repo",
+                      db: Session = Depends(get_db_session)) -> List[Dict[str, Any]]:
+    """
+    미리 계산된 DORA 지표(배포 빈도, 변경 리드 타임, 변경 실패율, MTTR)를 기간별로 조회합니다.
+    기본 조회 범위는 최근 12주이며, group_by에 없는 차원(team, repo)은 합산되어 "*"로 표시됩니다.
+    """
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(PERIODS)}")
+    end = end or date.today()
+    start = start or end - timedelta(weeks=12)
+    dimensions = [name for name in group_by.split(",") if name in ("team", "repo")]
+    return query_dora_metrics(db, start, end, period=period, team=team, repo=repo, group_by=dimensions)
+
 @app.get("/commits/", response_model=List[schemas.Commit])
 def read_commits(skip: int = 0, limit: int = 100, db: Session = Depends(get_db_session)):
     """
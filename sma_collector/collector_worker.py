@@ -3,44 +3,118 @@ import pika
 import json
 import time
 import logging
+import functools
+from typing import Any, Dict
 from sma_collector.config import settings
 from sma_collector.database.models import get_db_session
-from sma_collector.registry import register_connector, register_processor, CONNECTOR_REGISTRY, PROCESSOR_REGISTRY
+from sma_collector.database.migrations import create_upcoming_partitions, migrate
+from sma_collector.job_executor import SourceExecutor
+from sma_collector.connector_cache import ConnectorCache
+from sma_collector.watermarks import WatermarkStore
+from sma_collector.connectors.collector import prefetch_batches
+from sma_collector.registry import (
+    register_connector, register_processor, register_task, register_watermark_seed,
+    CONNECTOR_REGISTRY, PROCESSOR_REGISTRY, TASK_REGISTRY, WATERMARK_SEED_REGISTRY
+)
 from sma_collector.connectors.local_git_connector import LocalGitConnector
 from sma_collector.connectors.github_connector import GitHubConnector
 from sma_collector.connectors.jira_connector import JiraCollector
-from sma_collector.processors import process_git_data, process_github_data, process_jira_data
+from sma_collector.connectors.jenkins_connector import JenkinsConnector
+from sma_collector.connectors.sonarqube_connector import SonarQubeConnector
+from sma_collector.connectors.profiling_connector import ProfilingConnector
+from sma_collector.connectors.vts_connector import VtsConnector
+from sma_collector.deployment_index import update_deployment_index
+from sma_collector.dora import refresh_dora_metrics
+from sma_collector.incident_attribution import attribute_incidents
+from sma_collector.osp_rollups import apply_retention
+from sma_collector.processors import (
+    process_batches, process_git_data, process_github_data, process_jira_data, process_jenkins_data, process_sonarqube_data,
+    process_profiling_data, process_vts_data, seed_jenkins_watermark, seed_profiling_watermark, seed_vts_watermark
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Connectors (opened repos, authenticated clients, HTTP sessions) are reused across jobs.
+connector_cache = ConnectorCache(ttl_seconds=settings.CONNECTOR_CACHE_TTL_SECONDS)
+
 def setup_registry():
     """Registers all the available connectors and processors."""
     register_connector('git', LocalGitConnector)
     register_connector('github', GitHubConnector)
     register_connector('jira', JiraCollector)
+    register_connector('jenkins', JenkinsConnector)
+    register_connector('sonarqube', SonarQubeConnector)
+    register_connector('profiling', ProfilingConnector)
+    register_connector('vts', VtsConnector)
 
     register_processor('git', process_git_data)
     register_processor('github', process_github_data)
     register_processor('jira', process_jira_data)
+    register_processor('jenkins', process_jenkins_data)
+    register_processor('sonarqube', process_sonarqube_data)
+    register_processor('profiling', process_profiling_data)
+    register_processor('vts', process_vts_data)
 
-def callback(ch, method, properties, body):
-    job = json.loads(body)
-    logger.info(f" [x] Received job: {job}")
+    register_watermark_seed('jenkins', seed_jenkins_watermark)
+    register_watermark_seed('profiling', seed_profiling_watermark)
+    register_watermark_seed('vts', seed_vts_watermark)
 
+    register_task('osp_metrics_retention', apply_retention)
+    register_task('osp_metrics_partitions', create_upcoming_partitions)
+    register_task('deployment_index', update_deployment_index)
+    register_task('incident_attribution', attribute_incidents)
+    register_task('dora_metrics', refresh_dora_metrics)
+
+def run_job(job: Dict[str, Any]):
+    """
+    Runs a single collection job. Errors are logged, never raised.
+
+    Shard jobs may carry 'settings' overrides for building the connector and
+    'params' passed to collect(), see sma_collector.sharding. Jobs with a
+    'task' run that registered maintenance task with their 'params' instead.
+    """
     source = job.get('source')
     session = get_db_session()
 
     try:
+        if 'task' in job:
+            task_function = TASK_REGISTRY.get(job['task'])
+            if task_function:
+                logger.info(f"Running task {job['task']}...")
+                task_function(session, **job.get('params', {}))
+            else:
+                logger.warning(f"Unknown task: {job['task']}")
+            return
+
         connector_class = CONNECTOR_REGISTRY.get(source)
         processor_function = PROCESSOR_REGISTRY.get(source)
 
         if connector_class and processor_function:
             logger.info(f"Starting {source} collection...")
-            connector = connector_class(settings)
-            data = connector.collect()
-            processor_function(session, data)
-            logger.info(f"{source} collection finished.")
+            overrides = job.get('settings') or {}
+            job_settings = settings.copy(update=overrides) if overrides else settings
+            with connector_cache.lease(source, overrides, lambda: connector_class(job_settings)) as connector:
+                params = dict(job.get('params', {}))
+
+                # Incremental collectors resume from the cursor stored by the previous run.
+                watermarks = WatermarkStore(session)
+                watermark_key = connector.watermark_key(**params)
+                connector.watermark = None
+                if watermark_key:
+                    since = watermarks.get(source, watermark_key)
+                    seed_function = WATERMARK_SEED_REGISTRY.get(source)
+                    if since is None and seed_function:
+                        since = seed_function(session, **params)
+                    params['since'] = since
+
+                batches = connector.iter_batches(settings.COLLECT_BATCH_SIZE, **params)
+                count = process_batches(session, processor_function, prefetch_batches(batches, settings.COLLECT_PREFETCH_BATCHES))
+
+                # Only advance the cursor once every batch has been stored.
+                if watermark_key and connector.watermark is not None:
+                    watermarks.set(source, watermark_key, connector.watermark)
+            logger.info(f"{source} collection finished ({count} records).")
         else:
             logger.warning(f"Unknown source: {source}")
 
@@ -48,20 +122,88 @@ def callback(ch, method, properties, body):
         logger.error(f"An error occurred processing job {job}: {e}", exc_info=True)
     finally:
         session.close()
+        connector_cache.evict_expired()
+
+def callback(ch, method, properties, body):
+    """Runs the job on the calling (pika I/O) thread and acks it afterwards."""
+    job = json.loads(body)
+    logger.info(f" [x] Received job: {job}")
+
+    try:
+        run_job(job)
+    finally:
         ch.basic_ack(delivery_tag=method.delivery_tag)
         logger.info(f"Finished processing job: {job}")
 
+def make_threaded_callback(connection, executor: SourceExecutor):
+    """
+    Returns a consumer callback that hands jobs to the executor.
+
+    The I/O thread only dispatches, so heartbeats keep flowing while jobs run.
+    The ack is scheduled back onto the connection thread once the job really
+    finishes, because pika channels are not thread-safe.
+
+    A job whose source already has its share of jobs in the executor is
+    requeued after a short delay instead of waiting, unacked, in the
+    source's pool: the prefetch window is shared by all sources.
+    """
+    def on_message(ch, method, properties, body):
+        job = json.loads(body)
+        logger.info(f" [x] Received job: {job}")
+
+        def ack(future):
+            connection.add_callback_threadsafe(
+                functools.partial(ch.basic_ack, delivery_tag=method.delivery_tag)
+            )
+            logger.info(f"Finished processing job: {job}")
+
+        source = job.get('source')
+        future = executor.try_submit(source, run_job, job)
+        if future is None:
+            logger.info(f"{executor.pending(source)} {source} jobs already pending. Requeueing job: {job}")
+            connection.call_later(
+                settings.WORKER_REQUEUE_DELAY_SECONDS,
+                functools.partial(ch.basic_nack, delivery_tag=method.delivery_tag, requeue=True)
+            )
+            return
+        future.add_done_callback(ack)
+
+    return on_message
+
 
 def main():
+    if settings.DB_AUTO_MIGRATE:
+        migrate()
+
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=settings.RABBITMQ_HOST, heartbeat=600, blocked_connection_timeout=300))
     channel = connection.channel()
 
     channel.queue_declare(queue='collection_jobs', durable=True)
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue='collection_jobs', on_message_callback=callback)
 
-    logger.info(' [*] Waiting for messages. To exit press CTRL+C')
-    channel.start_consuming()
+    executor = None
+    if settings.WORKER_MODE == "threaded":
+        executor = SourceExecutor(settings.WORKER_SOURCE_CONCURRENCY, settings.WORKER_DEFAULT_CONCURRENCY,
+                                  settings.WORKER_QUEUED_JOBS_PER_SLOT)
+        prefetch_count = settings.WORKER_PREFETCH_COUNT or executor.capacity(CONNECTOR_REGISTRY)
+        on_message_callback = make_threaded_callback(connection, executor)
+    else:
+        prefetch_count = settings.WORKER_PREFETCH_COUNT or 1
+        on_message_callback = callback
+
+    channel.basic_qos(prefetch_count=prefetch_count)
+    channel.basic_consume(queue='collection_jobs', on_message_callback=on_message_callback)
+
+    logger.info(f' [*] Waiting for messages ({settings.WORKER_MODE} mode, prefetch={prefetch_count}). To exit press CTRL+C')
+    try:
+        channel.start_consuming()
+    except KeyboardInterrupt:
+        channel.stop_consuming()
+    finally:
+        if executor:
+            # Let running jobs finish, then flush their pending acks before closing.
+            executor.shutdown(wait=True)
+            connection.process_data_events(time_limit=0)
+        connection.close()
 
 if __name__ == '__main__':
     setup_registry()
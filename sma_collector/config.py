@@ -1,5 +1,6 @@
 from pydantic import BaseSettings
-from typing import Optional
+from datetime import date
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     """
@@ -11,28 +12,161 @@ class Settings(BaseSettings):
     JIRA_USERNAME: str = "user@example.com"
     JIRA_API_TOKEN: str = "your_api_token"
     JIRA_PROJECT_KEY: str = "PROJ"
+    # Split Jira collection into created-date windows of this many days (0 disables windowing).
+    JIRA_SHARD_WINDOW_DAYS: int = 0
+    JIRA_SHARD_START_DATE: Optional[date] = None
+    # "serial" pages through full issues one block at a time; "parallel" fetches
+    # field-projected page ranges concurrently (Jira Server/Data Center search API).
+    JIRA_FETCH_MODE: str = "serial"
+    JIRA_FETCH_WORKERS: int = 4
+    JIRA_PAGE_SIZE: int = 100
 
     # Git and GitHub Settings
     GIT_REPO_PATH: str = "./local_repo"
     GIT_REPO_URL: Optional[str] = None
     GITHUB_TOKEN: Optional[str] = None
+    # Pull requests whose comments and reviews are fetched by one GraphQL query.
+    GITHUB_REVIEW_ACTIVITY_BATCH: int = 25
+    # Additional repositories collected as one job per repository, cloned under GIT_REPOS_DIR.
+    GIT_REPO_URLS: List[str] = []
+    GIT_REPOS_DIR: str = "./repos"
+    # "cli" streams `git log --numstat` (commits with diff stats); "gitpython" walks commits without stats.
+    GIT_LOG_BACKEND: str = "cli"
+    # Bare mirrors of every repository are kept under GIT_MIRROR_DIR and refreshed with fetch
+    # (see sma_collector.git_mirrors). GIT_MIRROR_FILTER makes them partial clones, e.g. "blob:none"
+    # or "tree:0"; git then downloads missing objects on demand, which diff stats do need.
+    GIT_MIRROR_DIR: Optional[str] = None
+    GIT_MIRROR_FILTER: Optional[str] = None
+    GIT_MIRROR_FETCH_WORKERS: int = 8
+    GIT_MIRROR_MAX_AGE_SECONDS: int = 0
+    GIT_MIRROR_TIMEOUT_SECONDS: Optional[int] = 1800
+    # Per-commit diff stats cached by sha, shared by all repositories (see connectors/diff_stat_cache.py).
+    GIT_DIFF_STAT_CACHE_PATH: Optional[str] = None
 
     # Bitbucket Settings
     BITBUCKET_SERVER: str = "https://your-bitbucket-instance.com"
     BITBUCKET_USERNAME: str = "user@example.com"
     BITBUCKET_API_TOKEN: str = "your_api_token"
+    # Repositories as "PROJECT/repo-slug"
+    BITBUCKET_REPOSITORIES: List[str] = []
 
     # Swarm Settings
     SWARM_SERVER: str = "https://your-swarm-instance.com"
     SWARM_USERNAME: str = "user@example.com"
     SWARM_API_TOKEN: str = "your_api_token"
+    SWARM_PROJECTS: List[str] = []
+
+    # Jenkins Settings
+    JENKINS_HOST: Optional[str] = None
+    JENKINS_USER: Optional[str] = None
+    JENKINS_TOKEN: Optional[str] = None
+    JENKINS_JOB_NAME: Optional[str] = None
+    JENKINS_JOB_NAMES: List[str] = []
+    DEPLOYMENT_JOB_NAME_PATTERN: Optional[str] = None
+    # "tree" lists builds and their changeSet commits with one projected job query
+    # per job (falling back to per-build requests); "per_build" always uses the latter.
+    JENKINS_FETCH_MODE: str = "tree"
+    JENKINS_FETCH_WORKERS: int = 4
+
+    # SonarQube Settings
+    SONARQUBE_HOST: Optional[str] = None
+    SONARQUBE_TOKEN: Optional[str] = None
+    SONARQUBE_PROJECT_KEY: Optional[str] = None
+    SONARQUBE_PROJECT_KEYS: List[str] = []
+
+    # DORA Metrics Settings
+    # Jira issues of these types are stored as incidents. Deployments get the team and
+    # repository of the first regex matching their Jenkins job name, e.g.
+    # {"^deploy-payments": {"team": "payments", "repo": "org/payments"}}; others are "unassigned".
+    # Incidents are attributed to the deployment live when they were created, among the
+    # deployments of the service named by their Jira component: the "service" of a map entry,
+    # or else the job name. Incidents of no known service are matched against every deployment.
+    INCIDENT_ISSUE_TYPES: List[str] = ["Incident"]
+    DORA_SERVICE_MAP: Dict[str, Dict[str, str]] = {}
+
+    # Profiling Data Settings
+    # CSV (with a header) and JSON-lines dumps of timestamp/device_id/metric_name/metric_value
+    # samples, ingested incrementally into osp_metrics. Files are split into ranges of about
+    # PROFILING_CHUNK_BYTES, parsed by PROFILING_PARSE_WORKERS processes (the CPU count
+    # when unset, 0 parses in the worker itself).
+    PROFILING_DATA_PATH: Optional[str] = None
+    PROFILING_FILE_PATTERNS: List[str] = ["*.csv", "*.jsonl"]
+    PROFILING_CHUNK_BYTES: int = 32 * 1024 * 1024
+    PROFILING_PARSE_WORKERS: Optional[int] = None
+
+    # VTS Settings
+    # Tradefed result files under VTS_RESULTS_PATH, streamed by VTS_PARSE_WORKERS
+    # processes (the CPU count when unset, 0 parses in the worker itself).
+    VTS_RESULTS_PATH: Optional[str] = None
+    VTS_FILE_PATTERNS: List[str] = ["test_result.xml"]
+    VTS_PARSE_WORKERS: Optional[int] = None
+
+    # HTTP Settings for asyncio connectors
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_CONCURRENCY: int = 8
+    HTTP_TIMEOUT_SECONDS: int = 30
+    HTTP_PAGE_WINDOW: int = 4
+    # On-disk conditional-request cache shared by the HTTP connectors; disabled when unset.
+    HTTP_CACHE_PATH: Optional[str] = None
+    HTTP_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # Token buckets per API host and credential, adapted from X-RateLimit-*/Retry-After headers.
+    # With RATE_LIMIT_STATE_PATH the buckets are shared by all worker processes on the host.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STATE_PATH: Optional[str] = None
+    RATE_LIMIT_BURST: int = 10
+    RATE_LIMIT_MAX_RETRIES: int = 3
+    # Static ceilings (requests per second) for hosts that do not send rate-limit headers.
+    RATE_LIMIT_HOST_RATES: Dict[str, float] = {}
 
     # Database URL
     DATABASE_URL: str = "sqlite:///sma_data.db"
+    # Connection pool of the process-wide engine (per DATABASE_URL) shared by all sessions.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Workers apply pending schema migrations at startup; osp_metrics partitions are created this many months ahead.
+    DB_AUTO_MIGRATE: bool = True
+    OSP_METRICS_PARTITION_MONTHS_AHEAD: int = 3
+    # Raw osp_metrics samples and rollups ("1m", "1h", "1d") older than this many days are
+    # deleted by the retention task; unset keeps them. Series queries return at most
+    # OSP_ROLLUP_MAX_POINTS points, from the finest rollup that allows it.
+    OSP_METRICS_RAW_RETENTION_DAYS: Optional[int] = None
+    OSP_ROLLUP_RETENTION_DAYS: Dict[str, int] = {}
+    OSP_ROLLUP_MAX_POINTS: int = 1000
+    # Rows per executemany call, and the batch size from which PostgreSQL upserts
+    # COPY into a staging table instead.
+    BULK_UPSERT_CHUNK_SIZE: int = 1000
+    BULK_COPY_THRESHOLD: int = 5000
+    # Applied to every SQLite connection; ignored for other databases.
+    SQLITE_PRAGMAS: Dict[str, str] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": "-65536",
+        "busy_timeout": "30000",
+    }
 
     # RabbitMQ Host
     RABBITMQ_HOST: str = "rabbitmq"
 
+    # Worker Settings
+    # "inline" runs each job on the pika I/O thread; "threaded" runs jobs on per-source thread pools.
+    WORKER_MODE: str = "inline"
+    WORKER_PREFETCH_COUNT: Optional[int] = None
+    WORKER_DEFAULT_CONCURRENCY: int = 1
+    WORKER_SOURCE_CONCURRENCY: Dict[str, int] = {}
+    # Threaded mode: a source with concurrency × this many jobs queued or running gets further
+    # jobs requeued after WORKER_REQUEUE_DELAY_SECONDS, leaving the prefetch window to other sources.
+    WORKER_QUEUED_JOBS_PER_SLOT: int = 2
+    WORKER_REQUEUE_DELAY_SECONDS: float = 1.0
+    # Records per batch handed from a collector to its processor, and batches fetched ahead.
+    COLLECT_BATCH_SIZE: int = 500
+    COLLECT_PREFETCH_BATCHES: int = 1
+    # Idle connectors are reused across jobs for this many seconds (0 disables the cache).
+    CONNECTOR_CACHE_TTL_SECONDS: int = 900
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
@@ -0,0 +1,117 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from sma_collector.connectors.collector import BaseCollector
+
+logger = logging.getLogger(__name__)
+
+class ConnectorCache:
+    """
+    Keeps connector instances alive between jobs of the same worker.
+
+    Instances are keyed by source and the job's settings overrides, and are
+    leased exclusively: a job checks one out, and returns it when it is done,
+    so connectors never need to be thread-safe. Idle instances older than
+    ttl_seconds are closed, instances that fail their health check are
+    replaced, and a job that raises discards the instance it was using.
+    """
+    def __init__(self, ttl_seconds: float = 900, max_idle_per_key: int = 4):
+        self.ttl_seconds = ttl_seconds
+        self.max_idle_per_key = max_idle_per_key
+        self.hits = 0
+        self.misses = 0
+        # key -> idle (connector, created_at) pairs, most recently returned last
+        self._idle: Dict[str, List[Tuple[BaseCollector, float]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source: str, overrides: Dict[str, Any]) -> str:
+        return f"{source}:{json.dumps(overrides or {}, sort_keys=True, default=str)}"
+
+    @contextmanager
+    def lease(self, source: str, overrides: Dict[str, Any], factory: Callable[[], BaseCollector]) -> Iterator[BaseCollector]:
+        """Yields a cached connector for the key, or a new one built by factory."""
+        key = self.make_key(source, overrides)
+        connector, created_at = self._checkout(key)
+        if connector is None:
+            self.misses += 1
+            connector, created_at = factory(), time.monotonic()
+        else:
+            self.hits += 1
+
+        try:
+            yield connector
+        except BaseException:
+            logger.info(f"Discarding connector for {source} after a failed job.")
+            self._close(connector)
+            raise
+        else:
+            self._checkin(key, connector, created_at)
+
+    def _checkout(self, key: str) -> Tuple[Any, float]:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None, 0.0
+                connector, created_at = idle.pop()
+
+            if self._expired(created_at):
+                self._close(connector)
+                continue
+            try:
+                if connector.is_healthy():
+                    connector.refresh()
+                    return connector, created_at
+                logger.info(f"Cached connector {key} failed its health check. Replacing it.")
+            except Exception as e:
+                logger.warning(f"Cached connector {key} could not be reused: {e}")
+            self._close(connector)
+
+    def _checkin(self, key: str, connector: BaseCollector, created_at: float):
+        if self.ttl_seconds <= 0 or self._expired(created_at):
+            self._close(connector)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            idle.append((connector, created_at))
+            surplus = idle[:-self.max_idle_per_key] if len(idle) > self.max_idle_per_key else []
+            del idle[:len(surplus)]
+        for old_connector, _ in surplus:
+            self._close(old_connector)
+
+    def _expired(self, created_at: float) -> bool:
+        return time.monotonic() - created_at > self.ttl_seconds
+
+    def invalidate(self, source: str | None = None):
+        """Closes idle connectors of one source, or of every source."""
+        with self._lock:
+            keys = [key for key in self._idle if source is None or key.startswith(f"{source}:")]
+            connectors = [connector for key in keys for connector, _ in self._idle.pop(key)]
+        for connector in connectors:
+            self._close(connector)
+
+    def evict_expired(self):
+        """Closes idle connectors whose TTL has passed."""
+        with self._lock:
+            expired = []
+            for idle in self._idle.values():
+                keep = []
+                for connector, created_at in idle:
+                    if self._expired(created_at):
+                        expired.append(connector)
+                    else:
+                        keep.append((connector, created_at))
+                idle[:] = keep
+        for connector in expired:
+            self._close(connector)
+
+    @staticmethod
+    def _close(connector: BaseCollector):
+        try:
+            connector.close()
+        except Exception as e:
+            logger.warning(f"Error closing connector: {e}")
@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import aiohttp
+from yarl import URL
+from .collector import BaseCollector
+from .http_cache import ResponseCache
+from .rate_limiter import RateLimiter, bucket_key, is_rate_limited
+
+logger = logging.getLogger(__name__)
+
+class AsyncHTTPCollector(BaseCollector):
+    """
+    Base class for collectors that read REST APIs over asyncio.
+
+    Every instance owns a private event loop and one aiohttp ClientSession,
+    so keep-alive connections stay pooled for the lifetime of the instance
+    (and across jobs when the worker caches it). Requests are issued
+    concurrently, bounded by max_concurrency, so a collection costs roughly
+    its slowest round trip instead of the sum of all of them.
+
+    With a response_cache, GETs are revalidated with If-None-Match /
+    If-Modified-Since and 304 answers are served from the cache. With a
+    rate_limiter, every request waits for its slot in the host's bucket and
+    rate-limited responses are retried.
+
+    Subclasses stay synchronous from the outside: collect() and
+    iter_batches() drive the loop with run().
+    """
+    def __init__(self, base_url: str, auth: Optional[Tuple[str, str]] = None, max_connections: int = 20,
+                 max_concurrency: int = 8, timeout_seconds: float = 30, response_cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.base_url = base_url.rstrip('/')
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self._headers = {'Authorization': 'Basic ' + base64.b64encode(':'.join(auth).encode()).decode()} if auth else {}
+        self._bucket_key = bucket_key(self.base_url, self._headers.get('Authorization'))
+        self._loop = asyncio.new_event_loop()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def run(self, coro):
+        """Runs a coroutine to completion on this collector's event loop."""
+        return self._loop.run_until_complete(coro)
+
+    def run_all(self, coros: Iterable[Awaitable]) -> List[Any]:
+        """Runs several coroutines concurrently and returns their results in order."""
+        async def gather():
+            return await asyncio.gather(*coros)
+        return self.run(gather())
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self._headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                raise_for_status=True,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith('http') else f"{self.base_url}/{path.lstrip('/')}"
+
+    async def fetch_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """GETs a JSON document through the shared connection pool."""
+        session = self._get_session()
+        url = str(URL(self._url(path)).update_query(params)) if params else self._url(path)
+        cache_key = entry = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.make_key(url, self._headers.get('Authorization'))
+            entry = self.response_cache.get(cache_key)
+
+        attempt = 0
+        while True:
+            # Wait for the rate-limit slot before taking a concurrency slot, so that
+            # requests sleeping until their turn do not hold one of max_concurrency.
+            if self.rate_limiter is not None:
+                await asyncio.sleep(self.rate_limiter.reserve(self._bucket_key))
+            async with self._semaphore:
+                try:
+                    async with session.get(url, headers=entry.conditional_headers() if entry else None) as response:
+                        if self.rate_limiter is not None:
+                            self.rate_limiter.update(self._bucket_key, response.headers, response.status)
+                        if response.status == 304 and entry:
+                            self.response_cache.record_hit(cache_key)
+                            return json.loads(entry.body)
+                        body = await response.read()
+                        if self.response_cache is not None:
+                            self.response_cache.record_miss()
+                            if response.status == 200:
+                                self.response_cache.put(cache_key, url, dict(response.headers), body)
+                        return json.loads(body)
+                except aiohttp.ClientResponseError as e:
+                    if self.rate_limiter is None:
+                        raise
+                    headers = e.headers or {}
+                    self.rate_limiter.update(self._bucket_key, headers, e.status)
+                    if not is_rate_limited(e.status, headers) or attempt >= self.rate_limiter.max_retries:
+                        raise
+                    attempt += 1
+                    logger.warning(f"Rate limited by {self.base_url} ({e.status}), retrying.")
+
+    async def fetch_all(self, requests: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[Any]:
+        """GETs several JSON documents concurrently, preserving request order."""
+        return await asyncio.gather(*(self.fetch_json(path, params) for path, params in requests))
+
+    async def iter_offset_pages(self, path: str, params: Dict[str, Any], page_size: int,
+                                is_last_page: Callable[[Any], bool], start_param: str = 'start',
+                                limit_param: str = 'limit', window: int = 4) -> AsyncIterator[Any]:
+        """
+        Yields the pages of an offset-paginated endpoint in order.
+
+        Offsets are known up front, so `window` pages are requested at once;
+        at most window - 1 requests past the last page are wasted.
+        """
+        start = 0
+        while True:
+            pages = await self.fetch_all([
+                (path, {**params, start_param: start + i * page_size, limit_param: page_size})
+                for i in range(window)
+            ])
+            for page in pages:
+                yield page
+                if is_last_page(page):
+                    return
+            start += window * page_size
+
+    def close(self):
+        if self._session is not None and not self._session.closed:
+            self.run(self._session.close())
+        self._loop.close()
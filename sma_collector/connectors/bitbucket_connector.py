@@ -1,52 +1,149 @@
+import asyncio
 import logging
-from typing import List, Dict, Any
-from atlassian import Bitbucket
-from sma_collector.config import settings
-from .collector import BaseCollector
+import aiohttp
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+from sma_collector.config import Settings, settings as default_settings
+from .async_http_collector import AsyncHTTPCollector
+from .http_cache import get_response_cache
+from .rate_limiter import get_rate_limiter
+from .review_activity import as_utc, summarize_activity
 
 logger = logging.getLogger(__name__)
 
-class BitbucketConnector(BaseCollector):
+PAGE_SIZE = 100
+
+# Pull request activities that review it, besides comments.
+REVIEW_ACTIONS = {"APPROVED", "REVIEWED"}
+
+class BitbucketConnector(AsyncHTTPCollector):
     """
     Bitbucket 서버에서 커밋 및 풀 리퀘스트 데이터를 수집하는 클래스.
     """
-    def __init__(self):
-        try:
-            self.bitbucket = Bitbucket(
-                url=settings.BITBUCKET_SERVER,
-                username=settings.BITBUCKET_USERNAME,
-                password=settings.BITBUCKET_API_TOKEN
-            )
-            logger.info(f"Bitbucket 서버 '{settings.BITBUCKET_SERVER}'에 연결되었습니다.")
-        except Exception as e:
-            logger.error(f"Bitbucket 연결 실패: {e}")
-            raise
-
-    def collect(self) -> List[Dict[str, Any]]:
+    def __init__(self, settings: Settings = default_settings):
+        self.settings = settings
+        super().__init__(
+            settings.BITBUCKET_SERVER,
+            auth=(settings.BITBUCKET_USERNAME, settings.BITBUCKET_API_TOKEN),
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_concurrency=settings.HTTP_MAX_CONCURRENCY,
+            timeout_seconds=settings.HTTP_TIMEOUT_SECONDS,
+            response_cache=get_response_cache(settings),
+            rate_limiter=get_rate_limiter(settings),
+        )
+        logger.info(f"Bitbucket 서버 '{settings.BITBUCKET_SERVER}'에 연결되었습니다.")
+
+    def watermark_key(self, **params) -> Optional[str]:
+        """서버별로 마지막으로 본 풀 리퀘스트의 updatedDate를 저장합니다. collect()만 이 값을 갱신합니다."""
+        return self.base_url
+
+    def collect(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
         # For now, we will focus on collecting pull requests, as they are equivalent to code reviews.
         # We can extend this to collect commits later if needed.
-        return self.collect_pull_requests()
+        # Every configured repository is paged concurrently.
+        repositories = [repo.split('/', 1) for repo in self.settings.BITBUCKET_REPOSITORIES]
+        try:
+            results = self.run_all(self._fetch_pull_requests(project_key, slug, since) for project_key, slug in repositories)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Bitbucket 풀 리퀘스트 수집 중 오류 발생: {e}")
+            return []
+        pull_requests_data = [pr for prs in results for pr in prs]
+        self._advance_watermark(pull_requests_data)
+        logger.info(f"Collected {len(pull_requests_data)} pull requests from {len(repositories)} Bitbucket repositories.")
+        return pull_requests_data
 
-    def collect_pull_requests(self, project_key: str, repository_slug: str) -> List[Dict[str, Any]]:
+    def collect_pull_requests(self, project_key: str, repository_slug: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         지정된 프로젝트와 레포지토리에서 풀 리퀘스트 목록을 수집합니다.
+        since가 주어지면 그 이후에 변경된 풀 리퀘스트만 내보냅니다.
+        워터마크는 서버 단위이므로 모든 레포지토리를 수집하는 collect()에서만 갱신합니다.
         """
         pull_requests_data = []
         try:
-            prs = self.bitbucket.get_pull_requests(project_key, repository_slug, state="ALL")
-            for pr in prs:
-                pull_requests_data.append({
-                    "id": f"{project_key}-{repository_slug}-{pr['id']}",
-                    "repo_name": f"{project_key}/{repository_slug}",
-                    "pr_number": pr['id'],
-                    "title": pr['title'],
-                    "author": pr['author']['user']['displayName'],
-                    "created_date": pr['createdDate'],
-                    "merged_date": pr.get('mergedDate'),
-                    "state": pr['state'],
-                })
+            pull_requests_data = self.run(self._fetch_pull_requests(project_key, repository_slug, since))
             logger.info(f"Collected {len(pull_requests_data)} pull requests from Bitbucket.")
-        except Exception as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Bitbucket 풀 리퀘스트 수집 중 오류 발생: {e}")
 
         return pull_requests_data
+
+    async def _fetch_pull_requests(self, project_key: str, repository_slug: str,
+                                   since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Bitbucket은 start/limit 오프셋 페이지네이션을 사용하므로 HTTP_PAGE_WINDOW개의 페이지를 동시에 요청합니다.
+        코멘트나 리뷰가 있는 풀 리퀘스트의 activities는 동시에 가져와 리뷰 활동 필드를 채웁니다.
+        """
+        path = f"/rest/api/1.0/projects/{project_key}/repos/{repository_slug}/pull-requests"
+        since_dt = as_utc(since)
+        pull_requests = []
+        async for page in self.iter_offset_pages(path, {"state": "ALL"}, PAGE_SIZE,
+                                                 is_last_page=lambda page: page.get("isLastPage", True),
+                                                 window=max(1, self.settings.HTTP_PAGE_WINDOW)):
+            pull_requests.extend(pr for pr in page.get("values", []) if _updated_since(pr, since_dt))
+
+        reviewed = [pr for pr in pull_requests if _has_review_activity(pr)]
+        activities = await asyncio.gather(*(self._fetch_activities(path, pr["id"]) for pr in reviewed))
+        activities_by_id = {pr["id"]: pr_activities for pr, pr_activities in zip(reviewed, activities)}
+        return [
+            self._pull_request_to_dict(project_key, repository_slug, pr, activities_by_id.get(pr["id"], []))
+            for pr in pull_requests
+        ]
+
+    async def _fetch_activities(self, path: str, pr_id: int) -> List[Dict[str, Any]]:
+        activities = []
+        async for page in self.iter_offset_pages(f"{path}/{pr_id}/activities", {}, PAGE_SIZE,
+                                                 is_last_page=lambda page: page.get("isLastPage", True), window=1):
+            activities.extend(page.get("values", []))
+        return activities
+
+    def _advance_watermark(self, pull_requests: List[Dict[str, Any]]):
+        updated = [pr["updated_date"] for pr in pull_requests if pr.get("updated_date")]
+        if updated:
+            self.watermark = max(updated).isoformat()
+
+    def _pull_request_to_dict(self, project_key: str, repository_slug: str, pr: Dict[str, Any],
+                              activities: List[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        author = pr['author']['user']['displayName']
+        merged_date = _from_epoch_millis(pr.get('closedDate')) if pr['state'] == "MERGED" else None
+        created_date = _from_epoch_millis(pr['createdDate'])
+        activity = summarize_activity(
+            author, created_date, merged_date,
+            comments=[(_display_name(a), _from_epoch_millis(a.get('createdDate'))) for a in activities if a.get('action') == "COMMENTED"],
+            reviews=[(_display_name(a), _from_epoch_millis(a.get('createdDate'))) for a in activities if a.get('action') in REVIEW_ACTIONS],
+            comment_count=(pr.get('properties') or {}).get('commentCount'),
+        )
+        return {
+            "id": f"{project_key}-{repository_slug}-{pr['id']}",
+            "repo_name": f"{project_key}/{repository_slug}",
+            "pr_number": pr['id'],
+            "title": pr['title'],
+            "author": author,
+            "created_date": created_date,
+            "merged_date": merged_date,
+            "updated_date": _from_epoch_millis(pr.get('updatedDate')),
+            "state": pr['state'],
+            **activity,
+        }
+
+
+def _updated_since(pr: Dict[str, Any], since: Optional[datetime]) -> bool:
+    updated = _from_epoch_millis(pr.get('updatedDate'))
+    return since is None or updated is None or updated > since
+
+
+def _has_review_activity(pr: Dict[str, Any]) -> bool:
+    """코멘트가 있거나 리뷰어가 승인 또는 수정 요청을 한 풀 리퀘스트만 activities를 가져옵니다."""
+    if (pr.get('properties') or {}).get('commentCount'):
+        return True
+    return any(reviewer.get('status', "UNAPPROVED") != "UNAPPROVED" for reviewer in pr.get('reviewers', []))
+
+
+def _display_name(activity: Dict[str, Any]) -> Optional[str]:
+    return (activity.get('user') or {}).get('displayName')
+
+
+def _from_epoch_millis(value):
+    """Bitbucket Server는 시각을 epoch 밀리초로 반환합니다."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    return value
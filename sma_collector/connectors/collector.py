@@ -1,13 +1,168 @@
+import fnmatch
+import multiprocessing
+import os
+import queue
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional
 
 class BaseCollector(ABC):
     """
     Abstract base class for all data collectors.
+
+    Incremental collectors return a key from watermark_key() and accept a
+    `since` parameter holding the value stored for that key by the previous
+    run. While iterating they set `watermark` to the cursor reached; the
+    worker persists it only after every batch has been stored.
     """
+    watermark: Optional[str] = None
+
     @abstractmethod
     def collect(self) -> List[Dict[str, Any]]:
         """
         Collects data from a source and returns it as a list of dictionaries.
         """
         pass
+
+    def iter_batches(self, batch_size: int = 500, **params) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields collected records in lists of at most batch_size records.
+
+        This default adapter chunks the result of collect(). Collectors that
+        can stream from their source override it to keep memory bounded.
+        """
+        yield from chunked(self.collect(**params), batch_size)
+
+    def watermark_key(self, **params) -> Optional[str]:
+        """
+        Returns the key under which this job's cursor is stored, or None if
+        the collector always performs a full collection.
+        """
+        return None
+
+    def is_healthy(self) -> bool:
+        """Checks whether a cached instance can still be used for another job."""
+        return True
+
+    def refresh(self):
+        """Prepares a cached instance for another job (e.g. fetches new commits)."""
+        pass
+
+    def close(self):
+        """Releases sessions, clients and file handles held by the collector."""
+        pass
+
+
+def chunked(records: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Groups an iterable of records into lists of at most batch_size records."""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+_DONE = object()
+
+def prefetch_batches(batches: Iterable[List[Dict[str, Any]]], depth: int = 1) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Fetches up to depth batches ahead on a background thread.
+
+    The next batch is fetched from the source while the current one is being
+    written, so loading overlaps with fetching. Errors raised by the source
+    are re-raised in the consuming thread. When the consumer stops early or
+    raises, the producer stops, the batches fetched ahead are dropped and the
+    source is closed, so e.g. its pagination sessions are released.
+    """
+    if depth <= 0:
+        yield from batches
+        return
+
+    source = iter(batches)
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for batch in source:
+                if not put(batch):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+        finally:
+            # Closed here: a generator cannot be closed from another thread while it runs.
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, name="sma-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while True:
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                break
+        producer.join(timeout=1)
+
+
+def find_files(root: str, patterns: List[str]) -> List[str]:
+    """Paths, relative to root and sorted, of the files under root whose name matches one of the glob patterns."""
+    paths = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                paths.append(os.path.relpath(os.path.join(directory, name), root))
+    return sorted(paths)
+
+
+def map_in_processes(function: Callable, tasks: List[tuple], workers: Optional[int] = None) -> Iterator[Any]:
+    """
+    Yields function(*task) for every task, in order, computed by a pool of
+    worker processes (the CPU count when workers is None) for CPU-bound
+    parsing. At most two tasks per process are in flight, so results are
+    consumed about as fast as they are produced. With workers <= 0, or a
+    single task, everything runs in the calling process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 0 or len(tasks) <= 1:
+        for task in tasks:
+            yield function(*task)
+        return
+
+    # spawn: the worker process has threads (pika, prefetching) that a fork would copy mid-flight.
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("spawn"))
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(pool.submit(function, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
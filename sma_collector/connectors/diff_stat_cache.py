@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from sma_collector.config import Settings
+from .collector import chunked
+from .git_log import FileStat, iter_git_log, iter_numstat, summarize
+
+# Bump when the way stats are computed changes; the cache is then rebuilt.
+STATS_FORMAT = "numstat-v1"
+
+# SQLite limits the number of bound parameters per statement.
+LOOKUP_CHUNK = 500
+
+
+class DiffStatCache:
+    """
+    Per-commit and per-file line counts, keyed by commit sha, in one SQLite file.
+
+    A commit's diff never changes, so entries never expire: a force-push only
+    introduces new shas, and repositories with shared history (forks,
+    mirrors of the same project) reuse each other's entries. Shas are stored
+    as raw bytes in WITHOUT ROWID tables to keep the file compact.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+        if row is not None and row[0] != STATS_FORMAT:
+            self._conn.execute("DROP TABLE IF EXISTS commit_stats")
+            self._conn.execute("DROP TABLE IF EXISTS file_stats")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS commit_stats ("
+            " sha BLOB PRIMARY KEY, lines_added INTEGER, lines_deleted INTEGER, files_changed INTEGER) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_stats ("
+            " sha BLOB, path TEXT, added INTEGER, deleted INTEGER, PRIMARY KEY (sha, path)) WITHOUT ROWID"
+        )
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('format', ?)", (STATS_FORMAT,))
+        self._conn.commit()
+
+    def get_many(self, shas: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """Returns the per-commit totals of the shas that are cached."""
+        shas = list(shas)
+        found = {}
+        with self._lock:
+            for chunk in chunked(shas, LOOKUP_CHUNK):
+                rows = self._conn.execute(
+                    f"SELECT sha, lines_added, lines_deleted, files_changed FROM commit_stats"
+                    f" WHERE sha IN ({','.join('?' * len(chunk))})",
+                    [bytes.fromhex(sha) for sha in chunk],
+                )
+                for sha, lines_added, lines_deleted, files_changed in rows:
+                    found[sha.hex()] = {"lines_added": lines_added, "lines_deleted": lines_deleted, "files_changed": files_changed}
+            self.hits += len(found)
+            self.misses += len(shas) - len(found)
+        return found
+
+    def file_stats(self, sha: str) -> List[FileStat]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, added, deleted FROM file_stats WHERE sha = ? ORDER BY path", (bytes.fromhex(sha),)
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def put_many(self, stats: Iterable[Tuple[str, List[FileStat]]]):
+        """Stores per-file stats (and their totals) of commits."""
+        with self._lock:
+            for sha, files in stats:
+                key = bytes.fromhex(sha)
+                totals = summarize(files)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO commit_stats VALUES (?, ?, ?, ?)",
+                    (key, totals["lines_added"], totals["lines_deleted"], totals["files_changed"]),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO file_stats VALUES (?, ?, ?, ?)",
+                    [(key, path, added, deleted) for path, added, deleted in files],
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            commits = self._conn.execute("SELECT COUNT(*) FROM commit_stats").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "commits": commits}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[str, DiffStatCache] = {}
+_caches_lock = threading.Lock()
+
+def get_diff_stat_cache(settings: Settings) -> Optional[DiffStatCache]:
+    """Returns the process-wide cache for GIT_DIFF_STAT_CACHE_PATH, or None when it is disabled."""
+    if not settings.GIT_DIFF_STAT_CACHE_PATH:
+        return None
+    with _caches_lock:
+        cache = _caches.get(settings.GIT_DIFF_STAT_CACHE_PATH)
+        if cache is None:
+            cache = DiffStatCache(settings.GIT_DIFF_STAT_CACHE_PATH)
+            _caches[settings.GIT_DIFF_STAT_CACHE_PATH] = cache
+        return cache
+
+
+def iter_git_log_cached(repo_dir: str, rev: str, max_count: Optional[int], cache: DiffStatCache,
+                        batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Like iter_git_log, but diff stats come from the cache. Commit metadata is
+    streamed without diffs, and only the commits of each batch that were
+    never seen before are diffed, in one `git log --no-walk --stdin` call.
+    """
+    for batch in chunked(iter_git_log(repo_dir, rev, max_count, numstat=False), batch_size):
+        cached = cache.get_many(commit["sha"] for commit in batch)
+        missing = [commit["sha"] for commit in batch if commit["sha"] not in cached]
+        if missing:
+            computed = list(iter_numstat(repo_dir, missing))
+            cache.put_many(computed)
+            cached.update((sha, summarize(files)) for sha, files in computed)
+        for commit in batch:
+            commit.update(cached.get(commit["sha"], {}))
+            yield commit
@@ -0,0 +1,118 @@
+import subprocess
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from git import GitCommandError
+
+# Each commit starts with RS and its header fields are separated by US; the
+# message is the last field, terminated by US so it may contain anything but
+# those two control characters. The --numstat lines follow the header.
+RECORD_SEP = '\x1e'
+FIELD_SEP = '\x1f'
+LOG_FORMAT = '%x1e%H%x1f%an%x1f%ae%x1f%aI%x1f%B%x1f'
+NUMSTAT_FORMAT = '%x1e%H'
+
+READ_SIZE = 64 * 1024
+
+# (path, lines added, lines deleted); binary files have no line counts
+FileStat = Tuple[str, Optional[int], Optional[int]]
+
+
+def iter_git_log(repo_dir: str, rev: str, max_count: Optional[int] = None,
+                 extra_args: Optional[List[str]] = None, numstat: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Streams commits of `rev` with their diff stats from a single
+    `git log --numstat` process (metadata only with numstat=False).
+
+    Output is parsed record by record as it arrives, so memory stays
+    constant however long the history is. Closing the generator early
+    terminates the subprocess. A non-zero exit raises GitCommandError.
+    """
+    cmd = ['git', '-C', repo_dir, 'log', '--no-color', f'--format={LOG_FORMAT}']
+    if numstat:
+        cmd.append('--numstat')
+    if max_count is not None:
+        cmd.append(f'--max-count={max_count}')
+    cmd += list(extra_args or []) + [rev, '--']
+    for record in _iter_records(cmd):
+        yield parse_log_record(record)
+
+
+def iter_numstat(repo_dir: str, shas: Iterable[str]) -> Iterator[Tuple[str, List[FileStat]]]:
+    """Streams the per-file --numstat of exactly the given commits, fed to one `git log --no-walk --stdin`."""
+    cmd = ['git', '-C', repo_dir, 'log', '--no-color', '--numstat', '--no-walk=unsorted', '--stdin', f'--format={NUMSTAT_FORMAT}']
+    for record in _iter_records(cmd, stdin=''.join(f"{sha}\n" for sha in shas).encode()):
+        sha, _, numstat = record.partition('\n')
+        yield sha.strip(), parse_numstat(numstat)
+
+
+def _iter_records(cmd: List[str], stdin: Optional[bytes] = None) -> Iterator[str]:
+    # stdin and stderr are files so git can never block on a full pipe while we read stdout.
+    stdin_file = tempfile.TemporaryFile() if stdin is not None else subprocess.DEVNULL
+    if stdin is not None:
+        stdin_file.write(stdin)
+        stdin_file.seek(0)
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(cmd, stdin=stdin_file, stdout=subprocess.PIPE, stderr=stderr_file)
+    finished = False
+    try:
+        buffer = b''
+        while True:
+            chunk = process.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            buffer += chunk
+            *records, buffer = buffer.split(RECORD_SEP.encode())
+            for record in records:
+                if record:
+                    yield record.decode('utf-8', errors='replace')
+        if buffer:
+            yield buffer.decode('utf-8', errors='replace')
+
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            raise GitCommandError(cmd, process.returncode, stderr_file.read())
+        finished = True
+    finally:
+        if not finished and process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+        stderr_file.close()
+        if stdin is not None:
+            stdin_file.close()
+
+
+def parse_numstat(numstat: str) -> List[FileStat]:
+    """Parses --numstat lines. Binary files report '-' for both counts."""
+    files = []
+    for line in numstat.splitlines():
+        parts = line.split('\t', 2)
+        if len(parts) != 3:
+            continue
+        added, deleted, path = parts
+        files.append((path, int(added) if added.isdigit() else None, int(deleted) if deleted.isdigit() else None))
+    return files
+
+
+def summarize(files: List[FileStat]) -> Dict[str, int]:
+    """Per-commit totals of per-file stats."""
+    return {
+        "lines_added": sum(added or 0 for _, added, _ in files),
+        "lines_deleted": sum(deleted or 0 for _, _, deleted in files),
+        "files_changed": len(files),
+    }
+
+
+def parse_log_record(record: str) -> Dict[str, Any]:
+    """Parses one LOG_FORMAT record followed by its --numstat lines."""
+    header, _, numstat = record.rpartition(FIELD_SEP)
+    sha, author_name, author_email, authored_date, message = header.split(FIELD_SEP, 4)
+    return {
+        "sha": sha,
+        "author_name": author_name,
+        "author_email": author_email,
+        "authored_date": datetime.fromisoformat(authored_date),
+        "message": message.strip(),
+        **summarize(parse_numstat(numstat)),
+    }
@@ -1,11 +1,26 @@
 import logging
-from typing import List, Dict, Any, Optional
+import requests
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional
 from github import Github, GithubException
+from github.Requester import HTTPSRequestsConnectionClass
 from sma_collector.config import Settings
-from .collector import BaseCollector
+from .collector import BaseCollector, chunked
+from .http_cache import CachingHTTPAdapter, get_response_cache
+from .rate_limiter import get_rate_limiter
+from .review_activity import summarize_activity
 
 logger = logging.getLogger(__name__)
 
+# Comments and reviews of one pull request; a query asks for it under an alias per pull request.
+# Connections list the oldest first, so the first page holds the first comment and review.
+REVIEW_ACTIVITY_FRAGMENT = """
+fragment activity on PullRequest {
+  comments(first: 100) { totalCount nodes { createdAt author { login } } }
+  reviews(first: 100) { nodes { submittedAt author { login } comments { totalCount } } }
+}
+"""
+
 class GitHubConnector(BaseCollector):
     """
     GitHub에서 Pull Request 데이터를 수집하는 클래스.
@@ -21,7 +36,9 @@ class GitHubConnector(BaseCollector):
             logger.warning("GitHub token not provided. Skipping GitHub client creation.")
             return None
         try:
-            return Github(self.settings.GITHUB_TOKEN)
+            client = Github(self.settings.GITHUB_TOKEN)
+            _install_connector_adapter(client, self.settings)
+            return client
         except Exception as e:
             logger.error(f"Failed to create GitHub client: {e}")
             return None
@@ -32,30 +49,151 @@ class GitHubConnector(BaseCollector):
             return '/'.join(repo_url.split('/')[-2:]).replace('.git', '')
         return None
 
-    def collect(self, max_count: int = 100) -> List[Dict[str, Any]]:
+    def is_healthy(self) -> bool:
+        return self.github_client is not None
+
+    def close(self):
+        if self.github_client:
+            self.github_client.close()
+
+    def watermark_key(self, **params) -> Optional[str]:
+        """레포지토리별로 마지막으로 본 Pull Request의 updated_at을 저장합니다."""
+        return self.github_repo_name
+
+    def collect(self, max_count: int = 100, since: Optional[str] = None) -> List[Dict[str, Any]]:
         """GitHub에서 Pull Request 목록을 수집합니다."""
-        reviews = []
+        reviews = [review for batch in self.iter_batches(max_count=max_count, since=since) for review in batch]
+        if reviews:
+            logger.info(f"Collected {len(reviews)} pull requests from GitHub.")
+        return reviews
+
+    def iter_batches(self, batch_size: int = 500, max_count: int = 100,
+                     since: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Pull Request를 페이지 단위로 가져오면서 batch_size 단위로 내보냅니다.
+        since가 주어지면 그 이후에 변경된 Pull Request만 가져옵니다.
+        각 배치의 코멘트와 리뷰는 GraphQL 쿼리 몇 개로 한꺼번에 가져와 리뷰 활동 필드를 채웁니다.
+        """
         if not self.github_client or not self.github_repo_name:
             logger.warning("GitHub client or repo name not configured. Skipping PR collection.")
-            return reviews
+            return
 
+        failed = []
         try:
-            repo = self.github_client.get_repo(self.github_repo_name)
-            pulls = repo.get_pulls(state='all', sort='created', direction='desc')
-            
-            for pr in pulls[:max_count]:
-                reviews.append({
-                    "id": f"{repo.id}-{pr.number}",
-                    "repo_name": self.github_repo_name,
-                    "pr_number": pr.number,
-                    "title": pr.title,
-                    "author": pr.user.login,
-                    "created_date": pr.created_at,
-                    "merged_date": pr.merged_at,
-                    "state": pr.state,
-                })
-            logger.info(f"Collected {len(reviews)} pull requests from GitHub.")
+            for batch in chunked(self._iter_pulls(max_count, since), batch_size):
+                failed.extend(self._add_review_activity(batch))
+                yield batch
         except GithubException as e:
             logger.error(f"Failed to collect GitHub pull requests: {e}")
+        if failed and self.watermark is not None:
+            # 활동을 가져오지 못한 Pull Request는 다음 수집에서 다시 읽도록 워터마크를 그 앞에 둡니다.
+            self.watermark = min(pr["updated_date"] for pr in failed).isoformat()
 
-        return reviews
+    def _iter_pulls(self, max_count: int, since: Optional[str]) -> Iterator[Dict[str, Any]]:
+        repo = self.github_client.get_repo(self.github_repo_name)
+        latest_updated = None
+
+        if since:
+            # 최근 변경 순으로 읽다가 since 이전에 변경된 PR을 만나면 중단합니다.
+            since_dt = datetime.fromisoformat(since)
+            pulls = repo.get_pulls(state='all', sort='updated', direction='desc')
+        else:
+            since_dt = None
+            pulls = repo.get_pulls(state='all', sort='created', direction='desc')[:max_count]
+
+        for pr in pulls:
+            if since_dt and pr.updated_at < since_dt:
+                break
+            if latest_updated is None or pr.updated_at > latest_updated:
+                latest_updated = pr.updated_at
+            yield {
+                "id": f"{repo.id}-{pr.number}",
+                "repo_name": self.github_repo_name,
+                "pr_number": pr.number,
+                "title": pr.title,
+                "author": pr.user.login,
+                "created_date": pr.created_at,
+                "merged_date": pr.merged_at,
+                "state": pr.state,
+                "updated_date": pr.updated_at,
+            }
+
+        if latest_updated:
+            self.watermark = latest_updated.isoformat()
+
+    def _add_review_activity(self, pulls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        GITHUB_REVIEW_ACTIVITY_BATCH개의 Pull Request마다 GraphQL 쿼리 하나로 코멘트와 리뷰를 가져옵니다.
+        오류 응답에 함께 온 부분 결과(예: 삭제된 Pull Request 하나의 NOT_FOUND)는 그대로 쓰고,
+        가져오지 못한 Pull Request는 활동 필드 없이 두어 저장된 값을 덮어쓰지 않습니다.
+        결과를 전혀 받지 못한 쿼리의 Pull Request 목록을 반환합니다.
+        """
+        owner, name = self.github_repo_name.split('/', 1)
+        activities = {}
+        failed = []
+        for group in chunked(pulls, max(1, self.settings.GITHUB_REVIEW_ACTIVITY_BATCH)):
+            fields = " ".join(f"pr{pr['pr_number']}: pullRequest(number: {pr['pr_number']}) {{ ...activity }}" for pr in group)
+            query = f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+            try:
+                _, data = self.github_client.requester.graphql_query(query + REVIEW_ACTIVITY_FRAGMENT, {"owner": owner, "name": name})
+            except GithubException as e:
+                logger.warning(f"Review activity query of {len(group)} pull requests returned errors: {e}")
+                data = e.data
+            except requests.RequestException as e:
+                logger.warning(f"Failed to fetch review activity of {len(group)} pull requests: {e}")
+                failed.extend(group)
+                continue
+            repository = (data.get("data") or {}).get("repository") if isinstance(data, dict) else None
+            if isinstance(repository, dict):
+                activities.update(repository)
+            else:
+                failed.extend(group)
+
+        for pr in pulls:
+            activity = activities.get(f"pr{pr['pr_number']}")
+            if not activity:
+                continue
+            comments = activity.get("comments") or {"totalCount": 0, "nodes": []}
+            reviews = (activity.get("reviews") or {}).get("nodes", [])
+            pr.update(summarize_activity(
+                pr["author"], pr["created_date"], pr["merged_date"],
+                comments=[(_login(comment), comment["createdAt"]) for comment in comments["nodes"]],
+                reviews=[(_login(review), review["submittedAt"]) for review in reviews],
+                comment_count=comments["totalCount"] + sum(review["comments"]["totalCount"] for review in reviews),
+            ))
+        return failed
+
+
+def _login(node: Dict[str, Any]) -> Optional[str]:
+    """삭제된 사용자의 author는 null입니다."""
+    return (node.get("author") or {}).get("login")
+
+
+# Requester attribute holding the connection class. PyGithub offers no public per-client hook
+# (Requester.injectConnectionClasses is process-wide and disables connection reuse), so
+# requirements.txt pins PyGithub and tests/connectors/test_github_connector.py checks it still exists.
+CONNECTION_CLASS_ATTRIBUTE = "_Requester__connectionClass"
+
+
+def _install_connector_adapter(client: Github, settings: Settings):
+    """
+    PyGithub는 세션을 직접 노출하지 않으므로, 응답 캐시와 rate limiter 어댑터를 마운트하는 연결 클래스를 이 클라이언트의 Requester에만 지정합니다.
+    304 응답은 GitHub rate limit에서 차감되지 않습니다.
+    PyGithub가 바뀌어 연결 클래스를 지정할 수 없으면 경고를 남기고 어댑터 없이 수집합니다.
+    """
+    cache, rate_limiter = get_response_cache(settings), get_rate_limiter(settings)
+    if cache is None and rate_limiter is None:
+        return
+    if not hasattr(client.requester, CONNECTION_CLASS_ATTRIBUTE):
+        logger.warning("This PyGithub version has no connection class to replace. "
+                       "GitHub requests bypass the response cache and the rate limiter.")
+        return
+
+    class ConnectorHTTPSConnection(HTTPSRequestsConnectionClass):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.adapter = CachingHTTPAdapter(cache, rate_limiter=rate_limiter, max_retries=self.retry,
+                                              pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            self.session.mount("https://", self.adapter)
+
+    setattr(client.requester, CONNECTION_CLASS_ATTRIBUTE, ConnectorHTTPSConnection)
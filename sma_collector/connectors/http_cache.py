@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+import requests
+from requests.adapters import DEFAULT_POOLSIZE
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from sma_collector.config import Settings
+from .rate_limiter import RateLimitedHTTPAdapter, RateLimiter, get_rate_limiter
+
+# Headers that describe the original transfer, not the (already decoded) body we keep.
+_TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+@dataclass
+class CachedResponse:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    headers: Dict[str, str]
+    body: bytes
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of GET responses that carry an ETag or Last-Modified header.
+
+    Cached entries are revalidated, never served blindly: callers send the
+    stored validators and only reuse the body when the server answers
+    304 Not Modified. Many APIs (GitHub in particular) do not charge rate
+    limit for 304s, and they carry no body. Entries are keyed by URL and a
+    digest of the credentials, and the least recently used ones are evicted
+    once the bodies exceed max_bytes. The SQLite file can be shared by
+    several worker processes.
+    """
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_responses ("
+            " key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT,"
+            " headers TEXT, body BLOB, size INTEGER, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_http_responses_last_access ON http_responses (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, authorization: Optional[str] = None) -> str:
+        credential = hashlib.sha256(authorization.encode()).hexdigest() if authorization else ''
+        return hashlib.sha256(f"GET {url} {credential}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, headers, body FROM http_responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(row[0], row[1], json.loads(row[2]), row[3])
+
+    def put(self, key: str, url: str, headers: Dict[str, str], body: bytes):
+        """Stores a 200 response if it can be revalidated later."""
+        validators = CaseInsensitiveDict(headers)
+        etag = validators.get('ETag')
+        last_modified = validators.get('Last-Modified')
+        if not (etag or last_modified) or len(body) > self.max_bytes:
+            return
+        stored_headers = {name: value for name, value in headers.items() if name.lower() not in _TRANSFER_HEADERS}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, json.dumps(stored_headers), body, len(body), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def record_hit(self, key: str):
+        """Counts a 304 served from the cache and marks the entry as recently used."""
+        with self._lock:
+            self.hits += 1
+            self._conn.execute("UPDATE http_responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM http_responses ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM http_responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM http_responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+def get_response_cache(settings: Settings) -> Optional[ResponseCache]:
+    """Returns the process-wide cache for HTTP_CACHE_PATH, or None when caching is disabled."""
+    if not settings.HTTP_CACHE_PATH:
+        return None
+    with _caches_lock:
+        cache = _caches.get(settings.HTTP_CACHE_PATH)
+        if cache is None:
+            cache = ResponseCache(settings.HTTP_CACHE_PATH, settings.HTTP_CACHE_MAX_BYTES)
+            _caches[settings.HTTP_CACHE_PATH] = cache
+        return cache
+
+
+class CachingHTTPAdapter(RateLimitedHTTPAdapter):
+    """
+    requests transport adapter that revalidates GETs against a ResponseCache.
+    Requests still go through the rate limiter, revalidations included.
+    """
+    def __init__(self, cache: Optional[ResponseCache] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, stream=False, **kwargs):
+        if self.cache is None or request.method != 'GET':
+            return super().send(request, stream=stream, **kwargs)
+
+        key = self.cache.make_key(request.url, request.headers.get('Authorization'))
+        entry = self.cache.get(key)
+        if entry:
+            request.headers.update(entry.conditional_headers())
+
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and entry:
+            self.cache.record_hit(key)
+            return self._from_cache(request, response, entry)
+
+        self.cache.record_miss()
+        if response.status_code == 200 and not stream:
+            self.cache.put(key, request.url, response.headers, response.content)
+        return response
+
+    def _from_cache(self, request, not_modified: requests.Response, entry: CachedResponse) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        # Fresh headers (rate limit counters, dates) win over the stored ones.
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.headers.update(not_modified.headers)
+        for name in _TRANSFER_HEADERS:
+            response.headers.pop(name, None)
+        response._content = entry.body
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = not_modified.elapsed
+        return response
+
+
+def mount_connector_adapters(session: requests.Session, settings: Settings):
+    """Mounts the configured response cache and rate limiter on a connector's requests session."""
+    mount_response_cache(session, get_response_cache(settings), get_rate_limiter(settings))
+
+
+def mount_response_cache(session: requests.Session, cache: Optional[ResponseCache], rate_limiter: Optional[RateLimiter] = None):
+    """Replaces the session's transport adapters with caching ones, keeping their retry and pool settings."""
+    if cache is None and rate_limiter is None:
+        return
+    for prefix in ('https://', 'http://'):
+        current = session.get_adapter(prefix)
+        session.mount(prefix, CachingHTTPAdapter(
+            cache,
+            rate_limiter=rate_limiter,
+            max_retries=current.max_retries,
+            pool_connections=getattr(current, '_pool_connections', DEFAULT_POOLSIZE),
+            pool_maxsize=getattr(current, '_pool_maxsize', DEFAULT_POOLSIZE),
+        ))
@@ -1,44 +1,225 @@
 # sma_collector/connectors/jenkins_connector.py
+import json
 import logging
+import re
 import jenkins
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional
+from urllib.parse import quote
+from sma_collector.config import Settings
+from .collector import BaseCollector
 
-class JenkinsConnector:
-    def __init__(self, host: str, user: str, token: str):
-        self.server = jenkins.Jenkins(host, username=user, password=token)
+# Everything collect_builds needs, for the builds in a range of positions (newest first), in a single request.
+# Freestyle builds report commits in changeSet, pipeline runs in changeSets.
+BUILDS_TREE = (
+    "builds[number,url,result,building,timestamp,duration,"
+    "changeSet[items[commitId]],changeSets[items[commitId]]]{%d,%d}"
+)
 
-    def collect_builds(self, job_name: str, max_builds=100) -> tuple[list[dict], dict]:
-        builds =
-        build_commits_map = {}
+class JenkinsConnector(BaseCollector):
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.server = jenkins.Jenkins(settings.JENKINS_HOST, username=settings.JENKINS_USER, password=settings.JENKINS_TOKEN)
+
+    def is_healthy(self) -> bool:
         try:
-            job_info = self.server.get_job_info(job_name, depth=1)
-            build_numbers = [b['number'] for b in job_info.get('builds',)[:max_builds]]
+            self.server.get_whoami()
+            return True
+        except jenkins.JenkinsException as e:
+            logging.warning(f"Jenkins health check failed: {e}")
+            return False
+
+    def watermark_key(self, job_name: Optional[str] = None, job_pattern: Optional[str] = None, **params) -> Optional[str]:
+        """
+        The last collected build number is tracked per job. Jobs collected
+        together (job_pattern, or all configured jobs) share one key whose
+        value is a JSON object of job name -> build number.
+        """
+        if job_name:
+            return job_name
+        if job_pattern:
+            return f"pattern:{job_pattern}"
+        if self.settings.JENKINS_JOB_NAMES or self.settings.DEPLOYMENT_JOB_NAME_PATTERN:
+            return "*"
+        return self.settings.JENKINS_JOB_NAME
+
+    def collect(self, job_name: Optional[str] = None, job_pattern: Optional[str] = None, max_builds: int = 100,
+                since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Collects builds of a job; each build carries the commit ids of its changeSet.
+
+        Without a job_name, all jobs matching job_pattern (or, without one, every
+        configured job plus the DEPLOYMENT_JOB_NAME_PATTERN jobs) are collected in parallel.
+        """
+        if job_name is None and job_pattern is None and self.watermark_key() != "*":
+            job_name = self.settings.JENKINS_JOB_NAME
+            if not job_name:
+                logging.warning("Jenkins job name not provided. Skipping build collection.")
+                return []
+        if job_name:
+            return self._collect_job(job_name, max_builds, since)
+
+        job_names = self.resolve_job_names(job_pattern)
+        if not job_names:
+            logging.warning("Jenkins job name not provided. Skipping build collection.")
+            return []
+        return self._collect_jobs(job_names, max_builds, json.loads(since) if since else {})
 
-            for number in build_numbers:
+    def resolve_job_names(self, job_pattern: Optional[str] = None) -> List[str]:
+        """
+        Without job_pattern: the configured job names plus the DEPLOYMENT_JOB_NAME_PATTERN jobs.
+        With job_pattern: the matching jobs that are not configured by name, since
+        those are collected by their own shard (see sma_collector.sharding).
+        """
+        configured = list(dict.fromkeys(
+            ([self.settings.JENKINS_JOB_NAME] if self.settings.JENKINS_JOB_NAME else []) + list(self.settings.JENKINS_JOB_NAMES)
+        ))
+        names = [] if job_pattern else list(configured)
+        pattern = job_pattern or self.settings.DEPLOYMENT_JOB_NAME_PATTERN
+        if pattern:
+            try:
+                # Folders are listed as jobs too, but only buildable jobs have a color.
+                for job in self.server.get_all_jobs():
+                    if 'color' in job and re.search(pattern, job['fullname']) and job['fullname'] not in configured + names:
+                        names.append(job['fullname'])
+            except jenkins.JenkinsException as e:
+                logging.error(f"Failed to list Jenkins jobs: {e}")
+        return names
+
+    def _collect_job(self, job_name: str, max_builds: int, since: Optional[str]) -> List[Dict[str, Any]]:
+        builds, build_commits_map = self.collect_builds(job_name, max_builds=max_builds, since=int(since) if since else None)
+        for build in builds:
+            build["commit_shas"] = build_commits_map.get(build["id"], [])
+        return builds
+
+    def _collect_jobs(self, job_names: List[str], max_builds: int, since: Dict[str, int]) -> List[Dict[str, Any]]:
+        watermarks = dict(since)
+        all_builds = []
+        with ThreadPoolExecutor(max_workers=max(1, self.settings.JENKINS_FETCH_WORKERS), thread_name_prefix="sma-jenkins") as pool:
+            results = pool.map(lambda name: (name, self._fetch_builds(name, max_builds, since.get(name))), job_names)
+            for job_name, (builds, build_commits_map, watermark) in results:
+                for build in builds:
+                    build["commit_shas"] = build_commits_map.get(build["id"], [])
+                all_builds.extend(builds)
+                if watermark is not None:
+                    watermarks[job_name] = watermark
+
+        logging.info(f"Collected {len(all_builds)} builds from {len(job_names)} Jenkins jobs.")
+        self.watermark = json.dumps(watermarks, sort_keys=True) if watermarks != since else None
+        return all_builds
+
+    def collect_builds(self, job_name: str, max_builds=100, since: int | None = None) -> tuple[list[dict], dict]:
+        """
+        Collects the builds after since, or the max_builds newest ones without it.
+        Builds after since are all collected, max_builds at a time, even when
+        more than max_builds ran since the last collection.
+        """
+        builds, build_commits_map, watermark = self._fetch_builds(job_name, max_builds, since)
+        logging.info(f"Collected {len(builds)} builds from Jenkins.")
+        self.watermark = str(watermark) if watermark is not None else None
+        return builds, build_commits_map
+
+    def _fetch_builds(self, job_name: str, max_builds: int, since: int | None) -> tuple[list[dict], dict, int | None]:
+        """
+        Returns the builds, their commit ids and the new watermark of a job.
+        Builds still running or that failed to load must be fetched again next time,
+        so the watermark stops right before the oldest of them.
+        """
+        build_infos, pending = None, []
+        try:
+            if self.settings.JENKINS_FETCH_MODE == "tree":
                 try:
-                    build_info = self.server.get_build_info(job_name, number)
-                    start_time = datetime.fromtimestamp(build_info['timestamp'] / 1000, tz=timezone.utc)
-                    finish_time = start_time + timedelta(milliseconds=build_info['duration'])
-
-                    builds.append({
-                        "id": build_info['url'],
-                        "job_name": job_name,
-                        "number": build_info['number'],
-                        "status": self._normalize_status(build_info['result']),
-                        "start_time": start_time,
-                        "finish_time": finish_time,
-                        "duration_millis": build_info['duration'],
-                    })
-                    
-                    commits = [change['commitId'] for change in build_info.get('changeSet', {}).get('items',) if 'commitId' in change]
-                    build_commits_map[build_info['url']] = commits
-                except jenkins.JenkinsException as e:
-                    logging.warning(f"Could not get build {number}: {e}")
+                    build_infos = self._get_builds_tree(job_name, max_builds, since)
+                except (jenkins.JenkinsException, requests.exceptions.RequestException, ValueError) as e:
+                    logging.warning(f"Bulk build query failed for {job_name}, falling back to per-build requests: {e}")
+            if build_infos is None:
+                build_infos, pending = self._get_builds_per_build(job_name, max_builds, since)
         except jenkins.JenkinsException as e:
             logging.error(f"Failed to get job info for {job_name}: {e}")
+            return [], {}, None
 
-        logging.info(f"Collected {len(builds)} builds from Jenkins.")
-        return builds, build_commits_map
+        builds = []
+        build_commits_map = {}
+        is_deployment = bool(self.settings.DEPLOYMENT_JOB_NAME_PATTERN and re.search(self.settings.DEPLOYMENT_JOB_NAME_PATTERN, job_name))
+        for build_info in build_infos:
+            if since is not None and build_info['number'] <= since:
+                continue
+            if build_info.get('building'):
+                pending.append(build_info['number'])
+            start_time = datetime.fromtimestamp(build_info['timestamp'] / 1000, tz=timezone.utc)
+            finish_time = start_time + timedelta(milliseconds=build_info['duration'])
+
+            builds.append({
+                "id": build_info['url'],
+                "job_name": job_name,
+                "number": build_info['number'],
+                "status": self._normalize_status(build_info['result']),
+                "start_time": start_time,
+                "finish_time": finish_time,
+                "duration_millis": build_info['duration'],
+                "is_deployment": is_deployment,
+            })
+            build_commits_map[build_info['url']] = self._commit_ids(build_info)
+
+        if pending:
+            watermark = min(pending) - 1 if since is None or min(pending) - 1 > since else None
+        elif builds:
+            watermark = max(build['number'] for build in builds)
+        else:
+            watermark = None
+        return builds, build_commits_map, watermark
+
+    def _get_builds_tree(self, job_name: str, max_builds: int, since: int | None = None) -> List[Dict[str, Any]]:
+        """
+        Fetches metadata and changeSet commit ids of the newest builds with tree-projected job queries,
+        max_builds per query. With since, older ranges are queried until one reaches a build <= since.
+        Folder jobs ("folder/job") map to job/folder/job/job/, each segment quoted.
+        """
+        job_path = "".join(f"job/{quote(segment, safe='')}/" for segment in job_name.split('/'))
+        page_size = max(1, max_builds)
+        builds = []
+        start = 0
+        while True:
+            url = f"{self.server.server.rstrip('/')}/{job_path}api/json?tree={BUILDS_TREE % (start, start + page_size)}"
+            response = self.server.jenkins_open(requests.Request('GET', url))
+            if not response:
+                raise jenkins.JenkinsException(f"job[{job_name}] does not exist")
+            page = json.loads(response).get('builds', [])
+            builds.extend(page)
+            if since is None or len(page) < page_size or any(build['number'] <= since for build in page):
+                return builds
+            start += page_size
+
+    def _get_builds_per_build(self, job_name: str, max_builds: int, since: int | None) -> tuple[list[dict], list[int]]:
+        """
+        Fetches build details one request per build, JENKINS_FETCH_WORKERS requests at a time.
+        Job info only lists the newest builds, so allBuilds is requested when those do not reach since.
+        """
+        job_info = self.server.get_job_info(job_name)
+        numbers = [b['number'] for b in job_info.get('builds', [])]
+        if since is not None and numbers and min(numbers) > since + 1:
+            numbers = [b['number'] for b in self.server.get_job_info(job_name, fetch_all_builds=True).get('builds', [])]
+        build_numbers = numbers[:max_builds] if since is None else [number for number in numbers if number > since]
+
+        def get_build_info(number):
+            try:
+                return self.server.get_build_info(job_name, number)
+            except jenkins.JenkinsException as e:
+                logging.warning(f"Could not get build {number}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, self.settings.JENKINS_FETCH_WORKERS), thread_name_prefix="sma-jenkins-build") as pool:
+            results = list(pool.map(get_build_info, build_numbers))
+        build_infos = [info for info in results if info is not None]
+        failed = [number for number, info in zip(build_numbers, results) if info is None]
+        return build_infos, failed
+
+    @staticmethod
+    def _commit_ids(build_info: Dict[str, Any]) -> List[str]:
+        change_sets = build_info.get('changeSets') or [build_info.get('changeSet') or {}]
+        return [change['commitId'] for change_set in change_sets for change in change_set.get('items', []) if 'commitId' in change]
 
     def _normalize_status(self, result: str | None) -> str:
         if result == "SUCCESS": return "SUCCESS"
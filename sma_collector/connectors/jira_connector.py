@@ -1,11 +1,21 @@
 import logging
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import List, Dict, Any, Iterator, Optional
 from jira import JIRA, JIRAError
 from sma_collector.config import Settings
-from .collector import BaseCollector
+from .collector import BaseCollector, chunked
+from .http_cache import mount_connector_adapters
 
 logger = logging.getLogger(__name__)
 
+# process_jira_data와 워터마크 계산에 필요한 필드만 요청합니다 (description 등은 제외).
+JIRA_FIELDS = ["summary", "status", "issuetype", "reporter", "assignee", "created", "updated", "resolutiondate", "components"]
+
 class JiraCollector(BaseCollector):
     """
     Jira 서버에서 이슈 데이터를 수집하는 클래스.
@@ -17,41 +27,195 @@ class JiraCollector(BaseCollector):
                 server=self.settings.JIRA_SERVER,
                 basic_auth=(self.settings.JIRA_USERNAME, self.settings.JIRA_API_TOKEN)
             )
+            mount_connector_adapters(self.jira._session, self.settings)
             logger.info(f"Jira 서버 '{self.settings.JIRA_SERVER}'에 연결되었습니다.")
         except JIRAError as e:
             logger.error(f"Jira 연결 실패: {e.text}")
             raise
 
-    def collect(self) -> List[Dict[str, Any]]:
-        all_issues_data = []
-        jql = f'project = {self.settings.JIRA_PROJECT_KEY} ORDER BY created DESC'
+    def is_healthy(self) -> bool:
+        try:
+            return bool(self.jira.server_info())
+        except JIRAError as e:
+            logger.warning(f"Jira 연결 확인 실패: {e.text}")
+            return False
+
+    def close(self):
+        self.jira.close()
+
+    def watermark_key(self, created_after: Optional[str] = None, created_before: Optional[str] = None, **params) -> Optional[str]:
+        """프로젝트(및 생성일 구간)별로 마지막으로 본 이슈의 updated 시각을 저장합니다."""
+        return f"{self.settings.JIRA_PROJECT_KEY}:{created_after or '*'}..{created_before or '*'}"
+
+    def _build_jql(self, created_after: Optional[str] = None, created_before: Optional[str] = None,
+                   since: Optional[str] = None) -> str:
+        """
+        프로젝트 JQL을 만들고, 생성일 구간이 주어지면 해당 구간으로 제한합니다.
+        since가 주어지면 그 이후에 변경된 이슈만 updated 순으로 조회합니다.
+        """
+        clauses = [f'project = {self.settings.JIRA_PROJECT_KEY}']
+        if created_after:
+            clauses.append(f'created >= "{created_after}"')
+        if created_before:
+            clauses.append(f'created < "{created_before}"')
+        if since:
+            clauses.append(f'updated >= "{self._jql_datetime(since)}"')
+            return ' AND '.join(clauses) + ' ORDER BY updated ASC'
+        return ' AND '.join(clauses) + ' ORDER BY created DESC'
+
+    @cached_property
+    def _user_timezone(self) -> Optional[ZoneInfo]:
+        """JQL 시각을 해석하는 사용자 시간대. 연결이 유지되는 동안 한 번만 조회합니다."""
+        try:
+            return ZoneInfo(self.jira.myself()['timeZone'])
+        except (JIRAError, KeyError, TypeError, ZoneInfoNotFoundError):
+            return None
+
+    def _jql_datetime(self, value: str) -> str:
+        """
+        ISO 시각을 JQL 형식으로 변환합니다. JQL은 분 단위이고 사용자 시간대로 해석되므로,
+        사용자 시간대를 알 수 없으면 하루를 겹쳐서 조회합니다 (중복은 upsert로 흡수됩니다).
+        """
+        moment = datetime.fromisoformat(value)
+        if self._user_timezone is None:
+            moment = moment.astimezone(timezone.utc) - timedelta(days=1)
+        else:
+            moment = moment.astimezone(self._user_timezone)
+        return moment.strftime('%Y-%m-%d %H:%M')
+
+    def collect(self, created_after: Optional[str] = None, created_before: Optional[str] = None,
+                since: Optional[str] = None) -> List[Dict[str, Any]]:
+        return list(self._iter_issues(created_after, created_before, since))
+
+    def iter_batches(self, batch_size: int = 500, created_after: Optional[str] = None,
+                     created_before: Optional[str] = None, since: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """이슈를 페이지 단위로 가져오면서 batch_size 단위로 내보냅니다."""
+        yield from chunked(self._iter_issues(created_after, created_before, since), batch_size)
+
+    def _iter_issues(self, created_after: Optional[str], created_before: Optional[str],
+                     since: Optional[str]) -> Iterator[Dict[str, Any]]:
+        latest_updated = None
+        if since:
+            pages = self._iter_pages_since(created_after, created_before, since)
+        elif self.settings.JIRA_FETCH_MODE == "parallel":
+            pages = self._iter_pages_parallel(self._build_jql(created_after, created_before))
+        else:
+            pages = self._iter_pages_serial(self._build_jql(created_after, created_before))
+
+        try:
+            for page in pages:
+                for issue_data in page:
+                    if isinstance(issue_data["updated"], str) and (
+                            latest_updated is None or datetime.fromisoformat(issue_data["updated"]) > datetime.fromisoformat(latest_updated)):
+                        latest_updated = issue_data["updated"]
+                    yield issue_data
+        except JIRAError as e:
+            logger.error(f"Jira 이슈 검색 중 오류 발생: {e.text}")
+            return
+
+        # 오류 없이 끝까지 조회한 경우에만 워터마크를 전진시킵니다.
+        if latest_updated:
+            self.watermark = latest_updated
+
+    def _iter_pages_serial(self, jql: str) -> Iterator[List[Dict[str, Any]]]:
         block_size = 100
         block_num = 0
         
         while True:
-            try:
-                start_at = block_num * block_size
-                issues = self.jira.search_issues(jql, startAt=start_at, maxResults=block_size)
-                if not issues:
-                    break
-                
-                for issue in issues:
-                    fields = issue.fields
-                    issue_data = {
-                        "key": issue.key,
-                        "summary": fields.summary,
-                        "description": fields.description or "",
-                        "status": fields.status.name,
-                        "issue_type": fields.issuetype.name,
-                        "reporter": fields.reporter.displayName if fields.reporter else "N/A",
-                        "assignee": fields.assignee.displayName if fields.assignee else "N/A",
-                        "created": fields.created,
-                        "updated": fields.updated,
-                        "resolved": fields.resolutiondate,
-                    }
-                    all_issues_data.append(issue_data)
-                block_num += 1
-            except JIRAError as e:
-                logger.error(f"Jira 이슈 검색 중 오류 발생: {e.text}")
+            start_at = block_num * block_size
+            issues = self.jira.search_issues(jql, startAt=start_at, maxResults=block_size)
+            if not issues:
                 break
-        return all_issues_data
\ No newline at end of file
+            yield [self._issue_to_dict(issue) for issue in issues]
+            block_num += 1
+
+    def _iter_pages_since(self, created_after: Optional[str], created_before: Optional[str],
+                          since: str) -> Iterator[List[Dict[str, Any]]]:
+        """
+        updated 순 조회를 startAt 오프셋 대신 마지막으로 받은 이슈의 updated를 다음 하한으로 삼아 다시 조회합니다.
+        조회 중에 변경된 이슈가 결과 끝으로 옮겨가면 오프셋 페이지가 한 칸씩 밀려 이슈 하나를 건너뛰기 때문입니다.
+        하한이 JQL의 분 단위에서 더 나아가지 못할 때만 같은 하한 안에서 오프셋으로 넘깁니다.
+        이미 받은 (키, updated)는 다시 내보내지 않습니다.
+        """
+        page_size = self.settings.JIRA_PAGE_SIZE if self.settings.JIRA_FETCH_MODE == "parallel" else 100
+        lower, start_at = since, 0
+        seen: Dict[str, Any] = {}
+        while True:
+            jql = self._build_jql(created_after, created_before, lower)
+            if self.settings.JIRA_FETCH_MODE == "parallel":
+                page = [self._raw_issue_to_dict(raw) for raw in self._search_projected(jql, start_at).get("issues", [])]
+            else:
+                page = [self._issue_to_dict(issue) for issue in self.jira.search_issues(jql, startAt=start_at, maxResults=page_size)]
+            fresh = [issue for issue in page if seen.get(issue["key"]) != issue["updated"]]
+            seen.update((issue["key"], issue["updated"]) for issue in fresh)
+            if fresh:
+                yield fresh
+            if len(page) < page_size:
+                return
+            last = page[-1]["updated"]
+            advances = isinstance(last, str) and datetime.fromisoformat(last) > datetime.fromisoformat(lower)
+            if advances and self._jql_datetime(last) != self._jql_datetime(lower):
+                lower, start_at = last, 0
+            else:
+                start_at += page_size
+
+    def _iter_pages_parallel(self, jql: str) -> Iterator[List[Dict[str, Any]]]:
+        """
+        첫 페이지에서 전체 건수(total)를 확인한 뒤, 나머지 페이지 구간을 스레드 풀에서 동시에 가져옵니다.
+        필요한 필드만 JSON으로 받아 Issue 객체 생성 비용도 줄입니다.
+        앞서 요청하는 페이지 수는 JIRA_FETCH_WORKERS의 두 배로 제한되어 메모리 사용량이 일정합니다.
+        """
+        page_size = self.settings.JIRA_PAGE_SIZE
+        workers = max(1, self.settings.JIRA_FETCH_WORKERS)
+
+        first = self._search_projected(jql, 0)
+        yield [self._raw_issue_to_dict(raw) for raw in first.get("issues", [])]
+
+        starts = iter(range(page_size, first.get("total", 0), page_size))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sma-jira") as pool:
+            pending = deque(pool.submit(self._search_projected, jql, start) for start in islice(starts, workers * 2))
+            while pending:
+                page = pending.popleft().result()
+                for start in islice(starts, 1):
+                    pending.append(pool.submit(self._search_projected, jql, start))
+                yield [self._raw_issue_to_dict(raw) for raw in page.get("issues", [])]
+
+    def _search_projected(self, jql: str, start_at: int) -> Dict[str, Any]:
+        return self.jira.search_issues(
+            jql, startAt=start_at, maxResults=self.settings.JIRA_PAGE_SIZE,
+            fields=JIRA_FIELDS, expand=None, json_result=True
+        )
+
+    def _raw_issue_to_dict(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        fields = raw["fields"]
+        reporter = fields.get("reporter")
+        assignee = fields.get("assignee")
+        return {
+            "key": raw["key"],
+            "summary": fields.get("summary"),
+            "description": "",
+            "status": fields["status"]["name"],
+            "issue_type": fields["issuetype"]["name"],
+            "reporter": reporter["displayName"] if reporter else "N/A",
+            "assignee": assignee["displayName"] if assignee else "N/A",
+            "created": fields.get("created"),
+            "updated": fields.get("updated"),
+            "resolved": fields.get("resolutiondate"),
+            "components": [component["name"] for component in fields.get("components") or []],
+        }
+
+    def _issue_to_dict(self, issue) -> Dict[str, Any]:
+        fields = issue.fields
+        return {
+            "key": issue.key,
+            "summary": fields.summary,
+            "description": fields.description or "",
+            "status": fields.status.name,
+            "issue_type": fields.issuetype.name,
+            "reporter": fields.reporter.displayName if fields.reporter else "N/A",
+            "assignee": fields.assignee.displayName if fields.assignee else "N/A",
+            "created": fields.created,
+            "updated": fields.updated,
+            "resolved": fields.resolutiondate,
+            "components": [component.name for component in getattr(fields, "components", None) or []],
+        }
@@ -1,8 +1,12 @@
 import logging
-from typing import List, Dict, Any, Optional
+import subprocess
+from typing import List, Dict, Any, Iterator, Optional
 from git import Repo, GitCommandError, NoSuchPathError
 from sma_collector.config import Settings
-from .collector import BaseCollector
+from sma_collector.git_mirrors import GitMirrorManager
+from .collector import BaseCollector, chunked
+from .git_log import iter_git_log
+from .diff_stat_cache import get_diff_stat_cache, iter_git_log_cached
 
 logger = logging.getLogger(__name__)
 
@@ -12,16 +16,23 @@ class LocalGitConnector(BaseCollector):
     """
     def __init__(self, settings: Settings):
         self.settings = settings
-        self._repo = self._clone_or_open_repo()
+        self._mirrors = GitMirrorManager.from_settings(settings) if settings.GIT_MIRROR_DIR and settings.GIT_REPO_URL else None
+        self._repo = self._open_mirror() if self._mirrors else self._clone_or_open_repo()
+
+    def _open_mirror(self) -> Optional[Repo]:
+        """GIT_MIRROR_DIR 아래의 bare 미러를 클론하거나 fetch한 뒤 엽니다."""
+        try:
+            return Repo(self._mirrors.ensure(self.settings.GIT_REPO_URL))
+        except (GitCommandError, OSError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Failed to sync mirror of {self.settings.GIT_REPO_URL}: {e}")
+            return None
 
     def _clone_or_open_repo(self) -> Optional[Repo]:
         """로컬 레포지토리를 열거나, 없으면 원격 URL에서 클론합니다."""
         try:
             repo = Repo(self.settings.GIT_REPO_PATH)
             logger.info(f"Repository found at {self.settings.GIT_REPO_PATH}.")
-            if self.settings.GIT_REPO_URL:
-                logger.info("Pulling latest changes.")
-                repo.remotes.origin.pull()
+            self._pull(repo)
         except (NoSuchPathError, IndexError):
             if not self.settings.GIT_REPO_URL:
                 logger.error("Repository not found at specified path and no remote URL provided.")
@@ -32,29 +43,90 @@ class LocalGitConnector(BaseCollector):
             except GitCommandError as e:
                 logger.error(f"Failed to clone repository: {e}")
                 return None
+
+        return repo
+
+    def _pull(self, repo: Repo):
+        if not self.settings.GIT_REPO_URL:
+            return
+        try:
+            logger.info("Pulling latest changes.")
+            repo.remotes.origin.pull()
         except GitCommandError as e:
             logger.error(f"Error pulling latest changes: {e}")
-            repo = Repo(self.settings.GIT_REPO_PATH)
 
-        return repo
+    def is_healthy(self) -> bool:
+        return self._repo is not None
 
-    def collect(self, max_count: int = 1000) -> List[Dict[str, Any]]:
+    def refresh(self):
+        """캐시된 인스턴스를 재사용할 때 새 커밋을 가져옵니다."""
+        if self._mirrors:
+            self._mirrors.ensure(self.settings.GIT_REPO_URL)
+            return
+        self._pull(self._repo)
+
+    def close(self):
+        if self._repo is not None:
+            self._repo.close()
+
+    def watermark_key(self, branch: str = 'HEAD', **params) -> Optional[str]:
+        """브랜치별로 마지막으로 수집한 커밋 sha를 저장합니다."""
+        return f"{self.settings.GIT_REPO_URL or self.settings.GIT_REPO_PATH}@{branch}"
+
+    def collect(self, max_count: int = 1000, branch: str = 'HEAD', since: Optional[str] = None) -> List[Dict[str, Any]]:
         """지정된 브랜치에서 커밋 목록을 수집합니다."""
-        commits = []
+        commits = [commit for batch in self.iter_batches(max_count=max_count, branch=branch, since=since) for commit in batch]
+        logger.info(f"Collected {len(commits)} commits.")
+        return commits
+
+    def iter_batches(self, batch_size: int = 500, max_count: int = 1000, branch: str = 'HEAD',
+                     since: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        커밋을 batch_size 단위로 스트리밍합니다. 전체 히스토리를 메모리에 올리지 않습니다.
+        since가 주어지면 그 커밋 이후에 추가된 커밋만 수집합니다.
+        """
         if not self._repo:
-            return commits
+            return
 
         try:
-            for commit in self._repo.iter_commits('HEAD', max_count=max_count):
-                commits.append({
-                    "sha": commit.hexsha,
-                    "author_name": commit.author.name,
-                    "author_email": commit.author.email,
-                    "authored_date": commit.authored_datetime,
-                    "message": commit.message.strip(),
-                })
-            logger.info(f"Collected {len(commits)} commits.")
+            head = self._repo.commit(branch).hexsha
+            if since == head:
+                logger.info(f"No new commits on {branch} since {since}.")
+            elif since and self._is_ancestor(since, head):
+                yield from chunked(self._iter_commits(f"{since}..{head}", None), batch_size)
+            else:
+                if since:
+                    logger.warning(f"{since} is no longer an ancestor of {branch} (force-push?). Collecting full history.")
+                yield from chunked(self._iter_commits(branch, max_count), batch_size)
+            self.watermark = head
         except GitCommandError as e:
             logger.error(f"Error collecting commits: {e}")
 
-        return commits
+    def _is_ancestor(self, ancestor: str, rev: str) -> bool:
+        try:
+            return self._repo.is_ancestor(ancestor, rev)
+        except (GitCommandError, ValueError):
+            return False
+
+    def _iter_commits(self, rev: str, max_count: Optional[int]) -> Iterator[Dict[str, Any]]:
+        """
+        기본(cli) 백엔드는 git log --numstat 하나를 스트리밍해 diff 통계(lines_added, lines_deleted, files_changed)까지 채웁니다.
+        GIT_DIFF_STAT_CACHE_PATH가 설정되면 처음 보는 커밋의 통계만 계산하고 나머지는 캐시에서 읽습니다.
+        gitpython 백엔드는 통계 없이 커밋 메타데이터만 수집합니다.
+        """
+        if self.settings.GIT_LOG_BACKEND == "cli":
+            repo_dir = self._repo.git_dir if self._repo.bare else self._repo.working_dir
+            diff_stats = get_diff_stat_cache(self.settings)
+            if diff_stats:
+                yield from iter_git_log_cached(repo_dir, rev, max_count, diff_stats)
+            else:
+                yield from iter_git_log(repo_dir, rev, max_count)
+            return
+        for commit in self._repo.iter_commits(rev, max_count=max_count):
+            yield {
+                "sha": commit.hexsha,
+                "author_name": commit.author.name,
+                "author_email": commit.author.email,
+                "authored_date": commit.authored_datetime,
+                "message": commit.message.strip(),
+            }
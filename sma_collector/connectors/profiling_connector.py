@@ -0,0 +1,232 @@
+# sma_collector/connectors/profiling_connector.py
+import csv
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import chain
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sma_collector.config import Settings
+from .collector import BaseCollector, find_files, map_in_processes
+
+logger = logging.getLogger(__name__)
+
+# Order of the values in ProfilingChunk.rows, i.e. the osp_metrics columns loaded.
+SAMPLE_COLUMNS = ["timestamp", "device_id", "metric_name", "metric_value", "source"]
+
+# A file's cursor also keeps a hash of its first bytes, to notice a file replaced by another one.
+FINGERPRINT_BYTES = 4096
+
+
+@dataclass
+class ProfilingChunk:
+    """
+    The samples parsed from bytes start..end of one file, plus their
+    rollup aggregates (see osp_rollups.aggregate). len() is the sample
+    count, so a chunk is a batch for process_batches. `cursor` is the
+    file's watermark value once the chunk is stored and `previous` the one
+    the chunk continues from; `replaced` marks the first chunk of a file
+    that was rewritten since it was last ingested.
+    """
+    path: str
+    start: int
+    end: int
+    rows: List[Tuple[Any, ...]] = field(default_factory=list)
+    rollups: Dict[tuple, List[float]] = field(default_factory=dict)
+    bins: Counter = field(default_factory=Counter)
+    skipped: int = 0
+    cursor: Optional[str] = None
+    previous: Optional[str] = None
+    replaced: bool = False
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class ProfilingConnector(BaseCollector):
+    """
+    Ingests the profiling dumps under PROFILING_DATA_PATH into osp_metrics.
+
+    Files matching PROFILING_FILE_PATTERNS are read as CSV with a header
+    (.csv) or as JSON lines (.jsonl); either way every sample has timestamp
+    (ISO 8601 or epoch seconds), device_id, metric_name and metric_value.
+    Dumps are treated as append-only: each file has its own cursor, the byte
+    offset after the last complete line ingested, so growing files are read
+    from where the previous run stopped and unchanged files are not opened.
+
+    New bytes are split at line boundaries, found through mmap, into ranges
+    of about PROFILING_CHUNK_BYTES, which a pool of PROFILING_PARSE_WORKERS
+    processes parses in parallel, several files at once. Chunks come back in
+    order, each with its samples and rollup aggregates, and are stored one
+    transaction per chunk together with the file's new cursor.
+    """
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.root = settings.PROFILING_DATA_PATH
+
+    def watermark_key(self, **params) -> Optional[str]:
+        """
+        Cursors are stored per file by the processor (source 'profiling', key =
+        relative path), in the transaction of each chunk. The job-level key
+        never gets a value, so every run starts from the per-file cursors
+        gathered by seed_profiling_watermark.
+        """
+        return "*"
+
+    def collect(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [dict(zip(SAMPLE_COLUMNS, row)) for chunk in self.iter_chunks(since) for row in chunk.rows]
+
+    def iter_batches(self, batch_size: int = 500, since: Optional[str] = None, **params) -> Iterator[ProfilingChunk]:
+        """Yields one ProfilingChunk per parsed range; their size follows PROFILING_CHUNK_BYTES, not batch_size."""
+        return self.iter_chunks(since)
+
+    def iter_chunks(self, since: Optional[str] = None) -> Iterator[ProfilingChunk]:
+        if not self.root or not os.path.isdir(self.root):
+            logger.warning("PROFILING_DATA_PATH not provided or not a directory. Skipping profiling data collection.")
+            return
+        stored = json.loads(since) if since else {}
+        cursors = {path: json.loads(value) for path, value in stored.items()}
+
+        tasks, replaced, emptied = [], set(), []
+        for path in find_files(self.root, self.settings.PROFILING_FILE_PATTERNS):
+            file_tasks, was_replaced = self._plan_file(path, cursors.get(path))
+            tasks.extend(file_tasks)
+            if was_replaced:
+                replaced.add(path)
+                if not file_tasks:
+                    # Rewritten without any complete sample: an empty chunk still deletes the old ones and resets the cursor.
+                    emptied.append(ProfilingChunk(path, 0, 0))
+        if not tasks and not emptied:
+            logger.info("No new profiling data.")
+            return
+
+        parsed = map_in_processes(parse_range, tasks, self.settings.PROFILING_PARSE_WORKERS) if tasks else []
+        first_of_file = set()
+        for chunk in chain(emptied, parsed):
+            full_path = os.path.join(self.root, chunk.path)
+            chunk.cursor = json.dumps({"offset": chunk.end, "fingerprint": fingerprint(full_path, chunk.end)})
+            chunk.previous = stored.get(chunk.path)
+            stored[chunk.path] = chunk.cursor
+            if chunk.path in replaced and chunk.path not in first_of_file:
+                chunk.replaced = True
+            first_of_file.add(chunk.path)
+            if chunk.skipped:
+                logger.warning(f"Skipped {chunk.skipped} unparsable lines in {chunk.path} [{chunk.start}:{chunk.end}].")
+            yield chunk
+
+    def _plan_file(self, path: str, cursor: Optional[Dict[str, Any]]) -> Tuple[List[tuple], bool]:
+        """parse_range arguments for the new bytes of a file, and whether it was replaced since its cursor."""
+        full_path = os.path.join(self.root, path)
+        size = os.path.getsize(full_path)
+        offset, replaced = 0, False
+        if cursor:
+            offset = cursor["offset"]
+            if size < offset or fingerprint(full_path, offset) != cursor["fingerprint"]:
+                logger.warning(f"{path} was rewritten since it was ingested; ingesting it again from the start.")
+                offset, replaced = 0, True
+        if size == offset:
+            return [], replaced
+
+        file_format = "jsonl" if path.endswith(".jsonl") else "csv"
+        with open(full_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            columns = None
+            body = 0
+            if file_format == "csv":
+                header_end = data.find(b"\n")
+                if header_end < 0:
+                    return [], replaced
+                columns = next(csv.reader([data[:header_end].decode("utf-8-sig").strip()]))
+                body = header_end + 1
+            ranges = line_ranges(data, max(offset, body), size, self.settings.PROFILING_CHUNK_BYTES)
+        if ranges and offset < body:
+            # The header belongs to the first range, so the cursor moves past it with that chunk.
+            ranges[0] = (offset, ranges[0][1])
+        return [(full_path, path, file_format, columns, start, end) for start, end in ranges], replaced
+
+
+def fingerprint(path: str, offset: int) -> str:
+    """Hash of the first min(offset, FINGERPRINT_BYTES) bytes of a file."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(min(offset, FINGERPRINT_BYTES))).hexdigest()
+
+
+def line_ranges(data, start: int, end: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Splits data[start:end] into ranges of about chunk_bytes that end right
+    after a newline. A last line without its newline is still being written
+    and is left for the next run.
+    """
+    ranges = []
+    while start < end:
+        stop = data.rfind(b"\n", start, min(start + max(chunk_bytes, 1), end))
+        if stop < 0:
+            # A line longer than chunk_bytes: extend the range to its end.
+            stop = data.find(b"\n", start, end)
+            if stop < 0:
+                break
+        ranges.append((start, stop + 1))
+        start = stop + 1
+    return ranges
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """ISO 8601 or epoch seconds; naive timestamps are UTC."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    except ValueError:
+        timestamp = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+
+def parse_range(full_path: str, path: str, file_format: str, columns: Optional[List[str]],
+                start: int, end: int) -> ProfilingChunk:
+    """
+    Parses the complete lines in bytes start..end of a file into a
+    ProfilingChunk. Runs in the parsing processes, which also aggregate the
+    rollups so that only the samples and small aggregates travel back.
+    """
+    # Imported here: spawned parsing processes only pay for it once they parse.
+    from sma_collector.osp_rollups import aggregate
+
+    chunk = ProfilingChunk(path, start, end)
+    with open(full_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        text = data[start:end].decode("utf-8", errors="replace")
+    lines = text.splitlines()
+    if file_format == "csv":
+        if start == 0 and lines:
+            lines = lines[1:]
+        records = (dict(zip(columns, values)) for values in csv.reader(lines))
+    else:
+        records = (_json_record(line) for line in lines if line.strip())
+
+    for record in records:
+        try:
+            value = float(record["metric_value"])
+            if not math.isfinite(value):
+                raise ValueError(value)
+            chunk.rows.append((
+                parse_timestamp(record["timestamp"]),
+                str(record["device_id"]),
+                str(record["metric_name"]),
+                value,
+                path,
+            ))
+        except (KeyError, TypeError, ValueError):
+            chunk.skipped += 1
+    chunk.rollups, chunk.bins = aggregate(dict(zip(SAMPLE_COLUMNS, row)) for row in chunk.rows)
+    return chunk
+
+
+def _json_record(line: str) -> Dict[str, Any]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {}
+    return record if isinstance(record, dict) else {}
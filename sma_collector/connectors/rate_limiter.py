@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from sma_collector.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# epoch seconds above this are absolute reset times, smaller values are deltas
+_EPOCH_THRESHOLD = 1_000_000_000
+
+
+def bucket_key(url: str, authorization: Optional[str] = None) -> str:
+    """Requests are limited per API host and credential, like the quotas themselves."""
+    credential = hashlib.sha256(authorization.encode()).hexdigest()[:16] if authorization else 'anonymous'
+    return f"{urlsplit(url).netloc}|{credential}"
+
+
+def is_rate_limited(status: int, headers: Mapping[str, str]) -> bool:
+    """429s, and the 403s GitHub sends when a primary or secondary limit is exhausted."""
+    if status == 429:
+        return True
+    return status == 403 and (headers.get('Retry-After') is not None or headers.get('X-RateLimit-Remaining') == '0')
+
+
+class MemoryBucketStore:
+    """Bucket state shared by the threads of one process."""
+    def __init__(self):
+        self._buckets: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def transact(self, key: str, fn: Callable[[Optional[Dict[str, Any]]], Tuple[Dict[str, Any], Any]]) -> Any:
+        with self._lock:
+            state, result = fn(self._buckets.get(key))
+            self._buckets[key] = state
+            return result
+
+
+class SqliteBucketStore:
+    """Bucket state shared by every worker process on the host, through one SQLite file."""
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets (key TEXT PRIMARY KEY, state TEXT)")
+        self._lock = threading.Lock()
+
+    def transact(self, key: str, fn: Callable[[Optional[Dict[str, Any]]], Tuple[Dict[str, Any], Any]]) -> Any:
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT state FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                state, result = fn(json.loads(row[0]) if row else None)
+                self._conn.execute("INSERT OR REPLACE INTO rate_limit_buckets VALUES (?, ?)", (key, json.dumps(state)))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by host and credential.
+
+    reserve() hands out request slots: it takes a token and returns how long
+    the caller must wait before sending, so concurrent callers are spaced out
+    at the bucket's rate instead of all firing at once. Tokens may go
+    negative; that is the queue of callers already holding a later slot.
+
+    update() adapts the bucket to what the server reports:
+    X-RateLimit-Remaining/Reset (GitHub) spreads the remaining quota evenly
+    until the reset, X-RateLimit-FillRate/Interval-Seconds (Bitbucket Data
+    Center) sets the refill rate directly, and Retry-After blocks the bucket.
+    A 304 gives its token back: revalidations are not charged against the
+    quota (GitHub), and where they are, the reported remaining quota still caps
+    the bucket.
+    Until a host reports limits it is unlimited, unless a static rate is
+    configured for it. Callers retry rate-limited responses up to max_retries times.
+    """
+    def __init__(self, store=None, burst: int = 10, host_rates: Optional[Dict[str, float]] = None,
+                 max_retries: int = 3, clock: Callable[[], float] = time.time):
+        self.store = store or MemoryBucketStore()
+        self.burst = burst
+        self.max_retries = max_retries
+        self.host_rates = host_rates or {}
+        self.clock = clock
+
+    def _new_bucket(self, key: str, now: float) -> Dict[str, Any]:
+        rate = self.host_rates.get(key.split('|', 1)[0])
+        return {"tokens": float(self.burst), "capacity": float(self.burst), "rate": rate, "updated": now, "blocked_until": 0.0}
+
+    def reserve(self, key: str) -> float:
+        """Takes a slot in the bucket and returns the seconds to wait before using it."""
+        def take(state):
+            now = self.clock()
+            state = state or self._new_bucket(key, now)
+            start = max(now, state["blocked_until"])
+            rate = state["rate"]
+            if not rate:
+                state["updated"] = now
+                return state, start - now
+            # Tokens do not accrue while the bucket is blocked.
+            accrued = max(0.0, now - max(state["updated"], state["blocked_until"])) * rate
+            state["tokens"] = min(state["capacity"], state["tokens"] + accrued) - 1
+            state["updated"] = now
+            queued = -state["tokens"] / rate if state["tokens"] < 0 else 0.0
+            return state, (start - now) + queued
+        return self.store.transact(key, take)
+
+    def update(self, key: str, headers: Mapping[str, str], status: int):
+        """Adapts the bucket to the rate-limit headers of a response."""
+        def adapt(state):
+            now = self.clock()
+            state = state or self._new_bucket(key, now)
+            limit = _number(headers.get('X-RateLimit-Limit'))
+            remaining = _number(headers.get('X-RateLimit-Remaining'))
+            reset = _number(headers.get('X-RateLimit-Reset'))
+            fill_rate = _number(headers.get('X-RateLimit-FillRate'))
+            interval = _number(headers.get('X-RateLimit-Interval-Seconds'))
+            static_rate = self.host_rates.get(key.split('|', 1)[0])
+            if status == 304:
+                state["tokens"] = min(state["capacity"], state["tokens"] + 1)
+
+            if remaining is not None and reset is not None:
+                reset_at = reset if reset > _EPOCH_THRESHOLD else now + reset
+                window = max(reset_at - now, 1.0)
+                if remaining <= 0:
+                    state["blocked_until"] = max(state["blocked_until"], reset_at)
+                    rate = (limit or 1) / window
+                else:
+                    rate = remaining / window
+                state["tokens"] = min(state["tokens"], remaining)
+                state["rate"] = min(rate, static_rate) if static_rate else rate
+            elif fill_rate and interval:
+                rate = fill_rate / interval
+                state["rate"] = min(rate, static_rate) if static_rate else rate
+                if limit:
+                    state["capacity"] = limit
+
+            retry_after = _retry_after(headers.get('Retry-After'), now)
+            if retry_after is not None and status in (403, 429, 503):
+                state["blocked_until"] = max(state["blocked_until"], now + retry_after)
+                state["tokens"] = min(state["tokens"], 0.0)
+            elif is_rate_limited(status, headers) and state["blocked_until"] <= now:
+                # Rejected without a hint: back off for a second before the next slot.
+                state["blocked_until"] = now + 1.0
+            return state, None
+        self.store.transact(key, adapt)
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(value: Optional[str], now: float) -> Optional[float]:
+    """Retry-After is either delta seconds or an HTTP date."""
+    if value is None:
+        return None
+    seconds = _number(value)
+    if seconds is not None:
+        return max(seconds, 0.0)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - now, 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(settings: Settings) -> Optional[RateLimiter]:
+    """
+    Returns the process-wide limiter, or None when rate limiting is disabled.
+    With RATE_LIMIT_STATE_PATH the buckets are shared by all worker processes.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    path = settings.RATE_LIMIT_STATE_PATH or ''
+    with _limiters_lock:
+        limiter = _limiters.get(path)
+        if limiter is None:
+            store = SqliteBucketStore(path) if path else MemoryBucketStore()
+            limiter = RateLimiter(store, burst=settings.RATE_LIMIT_BURST, host_rates=settings.RATE_LIMIT_HOST_RATES,
+                                  max_retries=settings.RATE_LIMIT_MAX_RETRIES)
+            _limiters[path] = limiter
+        return limiter
+
+
+class RateLimitedHTTPAdapter(HTTPAdapter):
+    """requests transport adapter that waits for a slot before each request and retries rate-limited ones."""
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter = rate_limiter
+
+    def send(self, request, **kwargs):
+        if self.rate_limiter is None:
+            return super().send(request, **kwargs)
+
+        key = bucket_key(request.url, request.headers.get('Authorization'))
+        for attempt in range(self.rate_limiter.max_retries + 1):
+            delay = self.rate_limiter.reserve(key)
+            if delay > 0:
+                time.sleep(delay)
+            response = super().send(request, **kwargs)
+            self.rate_limiter.update(key, response.headers, response.status_code)
+            if not is_rate_limited(response.status_code, response.headers) or attempt == self.rate_limiter.max_retries:
+                return response
+            logger.warning(f"Rate limited by {key.split('|', 1)[0]} ({response.status_code}), retrying.")
+            response.close()
+        return response
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Fields of code_reviews filled by summarize_activity().
+REVIEW_ACTIVITY_FIELDS = ("first_comment_date", "time_to_first_review_minutes", "time_to_merge_minutes", "comment_count")
+
+# (author, time) of a comment or a review.
+ReviewEvent = Tuple[Optional[str], Any]
+
+
+def summarize_activity(author: Optional[str], created: Any, merged: Any, comments: Iterable[ReviewEvent],
+                       reviews: Iterable[ReviewEvent] = (), comment_count: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Derives the review activity fields of a pull request from its comment
+    and review events, in the pass that fetched them.
+
+    The first comment and the first review (a review or a comment, whichever
+    came first) only count events by others than the author. comment_count
+    defaults to the number of comments, for APIs that return a total
+    separately from a first page of events.
+    """
+    comments = [(who, as_utc(when)) for who, when in comments if when is not None]
+    others = [when for who, when in comments if who != author]
+    reviewed = others + [as_utc(when) for who, when in reviews if when is not None and who != author]
+    created = as_utc(created)
+    first_comment = min(others, default=None)
+    return {
+        "first_comment_date": first_comment,
+        "time_to_first_review_minutes": _minutes(created, min(reviewed, default=None)),
+        "time_to_merge_minutes": _minutes(created, as_utc(merged)),
+        "comment_count": len(comments) if comment_count is None else comment_count,
+    }
+
+
+def as_utc(value: Any) -> Optional[datetime]:
+    """Datetimes, ISO 8601 strings or epoch seconds, in UTC; naive datetimes are UTC."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _minutes(start: Optional[datetime], end: Optional[datetime]) -> Optional[int]:
+    if start is None or end is None or end < start:
+        return None
+    return int((end - start).total_seconds() // 60)
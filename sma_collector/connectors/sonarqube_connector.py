@@ -1,16 +1,25 @@
 # sma_collector/connectors/sonarqube_connector.py
 import logging
 from datetime import date
+from typing import List, Dict, Any, Optional
 from sonarqube import SonarQubeClient
+from sma_collector.config import Settings
+from .collector import BaseCollector
+from .http_cache import mount_connector_adapters
 
-class SonarQubeConnector:
-    def __init__(self, host: str | None, token: str | None):
+class SonarQubeConnector(BaseCollector):
+    def __init__(self, settings: Settings):
+        self.settings = settings
         self.client = None
-        if host and token:
-            self.client = SonarQubeClient(sonarqube_url=host, token=token)
+        if settings.SONARQUBE_HOST and settings.SONARQUBE_TOKEN:
+            self.client = SonarQubeClient(sonarqube_url=settings.SONARQUBE_HOST, token=settings.SONARQUBE_TOKEN)
+            mount_connector_adapters(self.client.session, settings)
+
+    def collect(self, project_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.collect_quality_metrics(project_key or self.settings.SONARQUBE_PROJECT_KEY)
 
     def collect_quality_metrics(self, project_key: str | None) -> list[dict]:
-        metrics =
+        metrics = []
         if not (self.client and project_key):
             logging.warning("SonarQube host/token/project_key not provided. Skipping quality metrics collection.")
             return metrics
@@ -26,7 +35,7 @@ class SonarQubeConnector:
                 if measure['metric'] == 'sqale_debt_ratio': metric_name = 'TECHNICAL_DEBT_RATIO'
                 elif measure['metric'] == 'complexity': metric_name = 'CYCLOMATIC_COMPLEXITY'
                 elif measure['metric'] == 'violations': metric_name = 'MISRA_VIOLATIONS'
-                
+
                 if metric_name:
                     metrics.append({
                         "analysis_date": analysis_date,
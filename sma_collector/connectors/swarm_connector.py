@@ -1,60 +1,142 @@
+import asyncio
 import logging
-import requests
-from typing import List, Dict, Any
-from sma_collector.config import settings
-from .collector import BaseCollector
+import aiohttp
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from sma_collector.config import Settings, settings as default_settings
+from .async_http_collector import AsyncHTTPCollector
+from .http_cache import get_response_cache
+from .rate_limiter import get_rate_limiter
+from .review_activity import as_utc, summarize_activity
 
 logger = logging.getLogger(__name__)
 
-class SwarmConnector(BaseCollector):
+REVIEW_FIELDS = "id,author,created,updated,description,state,projectName,participants,comments"
+
+class SwarmConnector(AsyncHTTPCollector):
     """
     Swarm에서 코드 리뷰 데이터를 수집하는 클래스.
     """
-    def __init__(self):
+    def __init__(self, settings: Settings = default_settings):
+        self.settings = settings
         self.swarm_url = settings.SWARM_SERVER
         self.username = settings.SWARM_USERNAME
         self.api_token = settings.SWARM_API_TOKEN
-        self.session = requests.Session()
-        self.session.auth = (self.username, self.api_token)
+        super().__init__(
+            self.swarm_url,
+            auth=(self.username, self.api_token),
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_concurrency=settings.HTTP_MAX_CONCURRENCY,
+            timeout_seconds=settings.HTTP_TIMEOUT_SECONDS,
+            response_cache=get_response_cache(settings),
+            rate_limiter=get_rate_limiter(settings),
+        )
 
         # Test connection
         try:
-            response = self.session.get(f"{self.swarm_url}/api/v9/reviews", params={"max": 1})
-            response.raise_for_status()
+            self.run(self._check_connection())
             logger.info(f"Swarm 서버 '{self.swarm_url}'에 연결되었습니다.")
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Swarm 연결 실패: {e}")
+            self.close()
             raise
 
-    def collect(self) -> List[Dict[str, Any]]:
-        return self.collect_reviews()
+    async def _check_connection(self):
+        await self.fetch_json("/api/v9/reviews", {"max": 1})
+
+    def is_healthy(self) -> bool:
+        try:
+            self.run(self._check_connection())
+            return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Swarm 연결 확인 실패: {e}")
+            return False
+
+    def watermark_key(self, **params) -> Optional[str]:
+        """서버별로 마지막으로 본 리뷰의 updated 시각을 저장합니다."""
+        return self.swarm_url
 
-    def collect_reviews(self, max_reviews: int = 100) -> List[Dict[str, Any]]:
+    def collect(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.collect_reviews(since=since)
+
+    def collect_reviews(self, max_reviews: int = 100, since: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Swarm에서 코드 리뷰 목록을 수집합니다.
+        SWARM_PROJECTS가 설정되어 있으면 프로젝트별 페이지를 동시에 가져옵니다.
+        since가 주어지면 그 이후에 변경된 리뷰만 내보냅니다. 코멘트가 있는 리뷰의 코멘트는
+        동시에 가져와 리뷰 활동 필드를 채웁니다.
         """
         reviews_data = []
+        projects = self.settings.SWARM_PROJECTS or [None]
+        since_dt = as_utc(since)
         try:
-            response = self.session.get(
-                f"{self.swarm_url}/api/v9/reviews",
-                params={"max": max_reviews, "fields": "id,author,created,description,state,projectName,participants"}
-            )
-            response.raise_for_status()
-            reviews = response.json().get("reviews", [])
-
-            for review in reviews:
-                reviews_data.append({
-                    "id": f"swarm-{review['id']}",
-                    "repo_name": review.get("projectName", "N/A"),
-                    "pr_number": review['id'],
-                    "title": review.get("description", "").split('\\n')[0],
-                    "author": review.get("author", "N/A"),
-                    "created_date": review.get("created"),
-                    "merged_date": None,  # Swarm API does not provide a direct merged date for reviews
-                    "state": review.get("state"),
-                })
-            logger.info(f"Collected {len(reviews_data)} reviews from Swarm.")
-        except requests.exceptions.RequestException as e:
+            results = self.run_all(self._fetch_reviews(project, max_reviews) for project in projects)
+            reviews = [review for page in results for review in page if _updated_since(review, since_dt)]
+            commented = [review for review in reviews if _comment_total(review)]
+            comments = self.run(self.fetch_all([
+                ("/api/v9/comments", {"topic": f"reviews/{review['id']}", "max": 1000}) for review in commented
+            ]))
+            comments_by_review = {review["id"]: _comment_list(page) for review, page in zip(commented, comments)}
+            reviews_data = [self._review_to_dict(review, comments_by_review.get(review["id"], [])) for review in reviews]
+            logger.info(f"Collected {len(reviews_data)} reviews from Swarm ({len(commented)} with comments).")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Swarm 리뷰 수집 중 오류 발생: {e}")
+            return []
 
+        updated = [as_utc(review.get("updated")) for review in reviews if review.get("updated")]
+        if updated:
+            self.watermark = max(updated).isoformat()
         return reviews_data
+
+    async def _fetch_reviews(self, project: Optional[str], max_reviews: int) -> List[Dict[str, Any]]:
+        """Swarm의 after 커서를 따라 한 프로젝트의 리뷰를 max_reviews개까지 가져옵니다."""
+        reviews = []
+        after = None
+        while len(reviews) < max_reviews:
+            params = {"max": max_reviews - len(reviews), "fields": REVIEW_FIELDS}
+            if project:
+                params["project[]"] = project
+            if after is not None:
+                params["after"] = after
+            page = await self.fetch_json("/api/v9/reviews", params)
+            page_reviews = page.get("reviews", [])
+            reviews.extend(page_reviews)
+            after = page.get("lastSeen")
+            if not page_reviews or after is None:
+                break
+        return reviews
+
+    def _review_to_dict(self, review: Dict[str, Any], comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        activity = summarize_activity(
+            review.get("author"), review.get("created"), None,
+            comments=[(comment.get("user"), comment.get("time")) for comment in comments],
+            comment_count=_comment_total(review),
+        )
+        return {
+            "id": f"swarm-{review['id']}",
+            "repo_name": review.get("projectName", "N/A"),
+            "pr_number": review['id'],
+            "title": review.get("description", "").split('\n')[0],
+            "author": review.get("author", "N/A"),
+            "created_date": review.get("created"),
+            "merged_date": None,  # Swarm API does not provide a direct merged date for reviews
+            "state": review.get("state"),
+            **activity,
+        }
+
+
+def _updated_since(review: Dict[str, Any], since: Optional[datetime]) -> bool:
+    updated = as_utc(review.get("updated"))
+    return since is None or updated is None or updated > since
+
+
+def _comment_total(review: Dict[str, Any]) -> Optional[int]:
+    """Swarm은 열린 코멘트와 닫힌 코멘트 수를 [open, closed]로 반환합니다. 없으면 None입니다."""
+    counts = review.get("comments")
+    return sum(counts) if isinstance(counts, list) else None
+
+
+def _comment_list(page: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Swarm은 코멘트를 id를 키로 하는 객체나 목록으로 반환합니다."""
+    comments = page.get("comments") or []
+    return list(comments.values()) if isinstance(comments, dict) else comments
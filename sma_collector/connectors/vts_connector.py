@@ -0,0 +1,145 @@
+# sma_collector/connectors/vts_connector.py
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from xml.etree.ElementTree import ParseError, iterparse
+from sma_collector.config import Settings
+from .collector import BaseCollector, chunked, find_files, map_in_processes
+
+logger = logging.getLogger(__name__)
+
+# Elements cleared once parsed, so that no more than one test case is held in memory.
+_CLEARED = {"Test", "TestCase", "Module"}
+
+
+class VtsConnector(BaseCollector):
+    """
+    Collects the run summaries of the VTS (Tradefed) result files under VTS_RESULTS_PATH.
+
+    Each test_result.xml is streamed with iterparse, clearing every test case
+    once counted, so memory does not grow with the size of the file. Files
+    are parsed by a pool of VTS_PARSE_WORKERS processes.
+
+    A file is skipped while its size and mtime match its cursor; a file
+    whose mtime changed is read again but only stored if its sha256 changed
+    too. Cursors are stored per file by the processor (source 'vts', key =
+    relative path) in the transaction of the runs they cover. Files that do
+    not parse, e.g. results still being written, get no cursor and are
+    retried by the next run.
+    """
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.root = settings.VTS_RESULTS_PATH
+
+    def watermark_key(self, **params) -> Optional[str]:
+        """The job-level key never gets a value; runs start from the per-file cursors gathered by seed_vts_watermark."""
+        return "*"
+
+    def collect(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        return list(self.iter_results(since))
+
+    def iter_batches(self, batch_size: int = 500, since: Optional[str] = None, **params) -> Iterator[List[Dict[str, Any]]]:
+        return chunked(self.iter_results(since), batch_size)
+
+    def iter_results(self, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields one record per new or changed file: its relative `path`, its
+        new `cursor` and the `run` summary (None if only the mtime changed).
+        """
+        if not self.root or not os.path.isdir(self.root):
+            logger.warning("VTS_RESULTS_PATH not provided or not a directory. Skipping VTS result collection.")
+            return
+        cursors = {path: json.loads(value) for path, value in json.loads(since).items()} if since else {}
+
+        tasks = []
+        for path in find_files(self.root, self.settings.VTS_FILE_PATTERNS):
+            stat = os.stat(os.path.join(self.root, path))
+            cursor = cursors.get(path)
+            if cursor and cursor["size"] == stat.st_size and cursor["mtime_ns"] == stat.st_mtime_ns:
+                continue
+            tasks.append((self.root, path, stat.st_size, stat.st_mtime_ns))
+        logger.info(f"Parsing {len(tasks)} new or modified VTS result files.")
+
+        for result in map_in_processes(parse_result_file, tasks, self.settings.VTS_PARSE_WORKERS):
+            if "error" in result:
+                logger.warning(f"Could not parse {result['path']}: {result['error']}")
+                continue
+            previous = cursors.get(result["path"])
+            if previous and previous["sha256"] == result["cursor"]["sha256"]:
+                result["run"] = None
+            result["cursor"] = json.dumps(result["cursor"], sort_keys=True)
+            yield result
+
+
+class _HashingReader:
+    """File wrapper that hashes what the parser reads, so a file is read only once."""
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def parse_result_file(root: str, path: str, size: int, mtime_ns: int) -> Dict[str, Any]:
+    """
+    Streams one result file into a vts_runs record. Runs in the parsing
+    processes; errors are returned rather than raised, so that one broken
+    file does not stop the others.
+    """
+    digest = hashlib.sha256()
+    attributes: Dict[str, str] = {}
+    summary: Dict[str, str] = {}
+    passed = failed = 0
+    try:
+        with open(os.path.join(root, path), "rb") as f:
+            for event, element in iterparse(_HashingReader(f, digest), events=("start", "end")):
+                if event == "start":
+                    if element.tag == "Result":
+                        attributes = dict(element.attrib)
+                    elif element.tag == "Summary":
+                        summary = dict(element.attrib)
+                    continue
+                if element.tag == "Test":
+                    result = element.get("result")
+                    if result == "pass":
+                        passed += 1
+                    elif result == "fail":
+                        failed += 1
+                if element.tag in _CLEARED:
+                    element.clear()
+        if not attributes:
+            raise ValueError("no <Result> element")
+        if not passed and not failed and summary:
+            # Files without test cases still summarize their counts.
+            passed, failed = int(summary.get("pass", 0)), int(summary.get("failed", 0))
+        start, end = _from_millis(attributes.get("start")), _from_millis(attributes.get("end"))
+    except (OSError, ParseError, ValueError) as e:
+        return {"path": path, "error": str(e)}
+
+    total = passed + failed
+    test_plan = attributes.get("suite_plan")
+    return {
+        "path": path,
+        "cursor": {"size": size, "mtime_ns": mtime_ns, "sha256": digest.hexdigest()},
+        "run": {
+            "id": f"{test_plan}:{attributes.get('devices', '')}:{attributes['start']}" if start else path,
+            "run_name": os.path.basename(os.path.dirname(path)) or path,
+            "test_plan": test_plan,
+            "start_time": start,
+            "end_time": end,
+            "total_tests": total,
+            "passed_tests": passed,
+            "failed_tests": failed,
+            "pass_rate": passed / total if total else None,
+        },
+    }
+
+
+def _from_millis(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromtimestamp(int(value) / 1000, timezone.utc) if value else None
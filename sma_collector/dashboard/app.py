@@ -3,16 +3,20 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 import plotly.express as px
 import pandas as pd
-from sqlalchemy import create_engine
+
+from datetime import date, timedelta
+from sqlalchemy.orm import Session
 
 from sma_collector.config import settings
+from sma_collector.database.engines import get_engine
+from sma_collector.dora import query_dora_metrics
 
 # Dash 앱 초기화
 app = dash.Dash(__name__)
 app.title = "Software Metrics Dashboard"
 
 # 데이터베이스 연결
-engine = create_engine(settings.DATABASE_URL)
+engine = get_engine(settings.DATABASE_URL)
 
 def load_data():
     """데이터베이스에서 데이터를 로드하여 Pandas DataFrame으로 변환합니다."""
@@ -20,6 +24,15 @@ def load_data():
     issues_df = pd.read_sql_table('issues', engine, parse_dates=['created', 'updated', 'resolved'])
     return commits_df, issues_df
 
+def load_dora_metrics(weeks: int = 26):
+    """미리 계산된 주별 DORA 지표(전체 팀 합산)를 불러옵니다. 이력을 다시 집계하지 않습니다."""
+    today = date.today()
+    with Session(engine) as session:
+        rows = query_dora_metrics(session, today - timedelta(weeks=weeks), today, period="week", group_by=())
+    return pd.DataFrame(rows, columns=[
+        'period_start', 'deployments_per_day', 'lead_time_median_minutes', 'change_failure_rate', 'mttr_minutes'
+    ])
+
 # 앱 레이아웃 정의
 app.layout = html.Div(children=[
     html.H1(children='소프트웨어 개발 지표 대시보드', style={'textAlign': 'center'}),
@@ -39,6 +52,10 @@ app.layout = html.Div(children=[
     
     html.H2(children='이슈 상태 분포'),
     dcc.Graph(id='issue-status-pie-chart'),
+
+    html.H2(children='DORA 지표'),
+    dcc.Graph(id='dora-throughput-graph'),
+    dcc.Graph(id='dora-stability-graph'),
 ])
 
 # 콜백 함수: 인터벌에 따라 그래프 업데이트
@@ -46,6 +63,8 @@ app.layout = html.Div(children=[
     [Output('commits-over-time-graph', 'figure'),
      Output('commits-by-author-graph', 'figure'),
      Output('issue-status-pie-chart', 'figure'),
+     Output('dora-throughput-graph', 'figure'),
+     Output('dora-stability-graph', 'figure'),
      Output('live-update-text', 'children')],
     [Input('interval-component', 'n_intervals')]
 )
@@ -68,9 +87,16 @@ def update_graphs(n):
     issue_status_counts.columns = ['status', 'count']
     fig_issue_status = px.pie(issue_status_counts, values='count', names='status', title='Jira 이슈 상태 분포')
 
+    # 4. DORA 지표 (주별, 미리 계산된 값)
+    dora_df = load_dora_metrics()
+    fig_dora_throughput = px.line(dora_df, x='period_start', y=['deployments_per_day', 'lead_time_median_minutes'],
+                                  title='배포 빈도(일 평균)와 변경 리드 타임 중앙값(분)', markers=True)
+    fig_dora_stability = px.line(dora_df, x='period_start', y=['change_failure_rate', 'mttr_minutes'],
+                                 title='변경 실패율과 평균 복구 시간(분)', markers=True)
+
     update_time = f"마지막 업데이트: {pd.Timestamp.now()}"
     
-    return fig_commits_time, fig_commits_author, fig_issue_status, update_time
+    return fig_commits_time, fig_commits_author, fig_issue_status, fig_dora_throughput, fig_dora_stability, update_time
 
 
 def run_dashboard():
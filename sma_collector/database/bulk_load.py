@@ -0,0 +1,245 @@
+import io
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import Boolean, func, literal_column, or_, select, text
+from sma_collector.config import settings
+from .dialects import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# Rows written per COPY call into the staging table, to bound the size of the text buffer.
+COPY_CHUNK_ROWS = 50_000
+
+
+@dataclass
+class BulkLoadResult:
+    table: str
+    rows: int
+    method: str
+    seconds: float
+    inserted: int = 0
+    updated: int = 0
+
+    @property
+    def unchanged(self) -> int:
+        return self.rows - self.inserted - self.updated
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+
+def bulk_upsert(session, model, records: List[Dict[str, Any]], index_elements: Optional[List[str]] = None,
+                chunk_size: Optional[int] = None, copy_threshold: Optional[int] = None,
+                method: Optional[str] = None, commit: bool = True) -> Optional[BulkLoadResult]:
+    """
+    Inserts records into the model's table, updating rows that already exist.
+
+    The upsert is built for the session's dialect (PostgreSQL or SQLite,
+    both INSERT ... ON CONFLICT). Conflicts are detected on the primary key
+    unless index_elements names another unique key; records repeating a key
+    are collapsed to the last one, since one statement cannot update the
+    same row twice. Records are sent chunk_size at a time through the
+    driver's executemany: SQLite reuses one prepared statement, and
+    SQLAlchemy batches PostgreSQL rows into multi-row VALUES pages below the
+    bind-parameter limit. On PostgreSQL, batches of copy_threshold rows or
+    more are COPYed into a temporary staging table and merged with a single
+    INSERT ... SELECT ... ON CONFLICT instead. `method` ("executemany" or
+    "copy") forces a path. All chunks are committed together unless
+    commit=False.
+
+    Existing rows are only rewritten when a loaded column IS DISTINCT FROM
+    the stored value, so re-collecting unchanged data writes nothing. The
+    result counts inserted, updated and unchanged rows.
+    """
+    if not records:
+        return None
+
+    table = getattr(model, '__table__', model)
+    conflict_keys = index_elements or [key.name for key in table.primary_key]
+    if not conflict_keys:
+        logger.warning(f"Table {table.name} has no primary key for upsert. Skipping.")
+        return None
+
+    started = time.perf_counter()
+    dialect = session.get_bind().dialect.name
+    insert = upsert_insert(dialect)
+    records = _dedupe(records, conflict_keys)
+    columns = [column.name for column in table.columns if any(column.name in record for record in records)]
+    if method is None:
+        threshold = copy_threshold if copy_threshold is not None else settings.BULK_COPY_THRESHOLD
+        method = "copy" if len(records) >= threshold and _supports_copy(session, dialect) else "executemany"
+
+    if method == "copy":
+        inserted, updated = _copy_merge(session, table, columns, records, conflict_keys)
+    else:
+        inserted, updated = _executemany_merge(session, insert, table, columns, records, conflict_keys,
+                                               max(1, chunk_size or settings.BULK_UPSERT_CHUNK_SIZE))
+    if commit:
+        session.commit()
+
+    result = BulkLoadResult(table.name, len(records), method, time.perf_counter() - started, inserted, updated)
+    logger.debug(f"Upserted {result.rows} rows into {result.table} via {result.method} "
+                f"in {result.seconds:.3f}s ({result.rows_per_second:.0f} rows/s): "
+                f"{result.inserted} inserted, {result.updated} updated, {result.unchanged} unchanged.")
+    return result
+
+
+def bulk_insert(session, model, columns: List[str], rows: Sequence[Sequence[Any]], chunk_size: Optional[int] = None,
+                copy_threshold: Optional[int] = None, method: Optional[str] = None,
+                commit: bool = True) -> Optional[BulkLoadResult]:
+    """
+    Appends rows (sequences of values in the order of columns) to the model's
+    table, without any conflict handling: for append-only tables such as
+    osp_metrics, whose samples have no natural key. On PostgreSQL, batches of
+    copy_threshold rows or more are COPYed straight into the table; other
+    batches go through executemany, chunk_size rows at a time. `method` and
+    `commit` work as in bulk_upsert.
+    """
+    if not rows:
+        return None
+
+    table = getattr(model, '__table__', model)
+    started = time.perf_counter()
+    dialect = session.get_bind().dialect.name
+    if method is None:
+        threshold = copy_threshold if copy_threshold is not None else settings.BULK_COPY_THRESHOLD
+        method = "copy" if len(rows) >= threshold and _supports_copy(session, dialect) else "executemany"
+
+    if method == "copy":
+        _copy_rows(session, _qualified(table), columns, rows)
+    else:
+        stmt = table.insert()
+        rows_per_chunk = max(1, chunk_size or settings.BULK_UPSERT_CHUNK_SIZE)
+        for start in range(0, len(rows), rows_per_chunk):
+            session.execute(stmt, [dict(zip(columns, row)) for row in rows[start:start + rows_per_chunk]])
+    if commit:
+        session.commit()
+
+    result = BulkLoadResult(table.name, len(rows), method, time.perf_counter() - started, inserted=len(rows))
+    logger.debug(f"Inserted {result.rows} rows into {result.table} via {result.method} "
+                 f"in {result.seconds:.3f}s ({result.rows_per_second:.0f} rows/s).")
+    return result
+
+
+def _dedupe(records: List[Dict[str, Any]], conflict_keys: List[str]) -> List[Dict[str, Any]]:
+    unique = {tuple(record.get(key) for key in conflict_keys): record for record in records}
+    return records if len(unique) == len(records) else list(unique.values())
+
+
+def _update_columns(table, columns: List[str], conflict_keys: List[str]) -> List[str]:
+    # Only loaded columns are updated; the others keep their stored values.
+    return [name for name in columns if not table.c[name].primary_key and name not in conflict_keys]
+
+
+def _on_conflict(stmt, table, columns: List[str], conflict_keys: List[str]):
+    """ON CONFLICT clause that only updates rows whose loaded columns changed."""
+    update_columns = _update_columns(table, columns, conflict_keys)
+    if not update_columns:
+        return stmt.on_conflict_do_nothing(index_elements=conflict_keys)
+    return stmt.on_conflict_do_update(
+        index_elements=conflict_keys,
+        set_={name: stmt.excluded[name] for name in update_columns},
+        where=or_(*[table.c[name].is_distinct_from(stmt.excluded[name]) for name in update_columns]),
+    )
+
+
+def _executemany_merge(session, insert, table, columns: List[str], records: List[Dict[str, Any]],
+                       conflict_keys: List[str], rows_per_chunk: int) -> Tuple[int, int]:
+    # Two statements per chunk tell inserts from updates on both dialects: new
+    # rows are inserted first, then only the remaining ones are upserted.
+    # RETURNING yields just the rows each statement actually wrote.
+    keys = [table.c[name] for name in conflict_keys]
+    insert_new = insert(table).on_conflict_do_nothing(index_elements=conflict_keys).returning(*keys)
+    update_changed = None
+    if _update_columns(table, columns, conflict_keys):
+        update_changed = _on_conflict(insert(table), table, columns, conflict_keys).returning(*keys)
+
+    inserted = updated = 0
+    for start in range(0, len(records), rows_per_chunk):
+        # executemany needs the same keys in every row.
+        rows = [{name: record.get(name) for name in columns} for record in records[start:start + rows_per_chunk]]
+        new_keys = {tuple(row) for row in session.execute(insert_new, rows)}
+        inserted += len(new_keys)
+        existing = [row for row in rows if tuple(row[name] for name in conflict_keys) not in new_keys]
+        if update_changed is not None and existing:
+            updated += len(session.execute(update_changed, existing).all())
+    return inserted, updated
+
+
+def _supports_copy(session, dialect: str) -> bool:
+    """COPY needs PostgreSQL through psycopg2, whose cursors have copy_expert."""
+    if dialect != 'postgresql':
+        return False
+    cursor = session.connection().connection.cursor()
+    try:
+        return hasattr(cursor, 'copy_expert')
+    finally:
+        cursor.close()
+
+
+def _copy_merge(session, table, columns: List[str], records: List[Dict[str, Any]],
+                conflict_keys: List[str]) -> Tuple[int, int]:
+    # The staging table only has the loaded columns, without constraints, and
+    # lives in this transaction; it is dropped explicitly so that several
+    # upserts can share one transaction.
+    stage = f"_stage_{table.name}_{uuid.uuid4().hex[:8]}"
+    quoted = ', '.join(f'"{name}"' for name in columns)
+    session.execute(text(
+        f'CREATE TEMPORARY TABLE "{stage}" ON COMMIT DROP AS SELECT {quoted} FROM {_qualified(table)} WITH NO DATA'
+    ))
+    _copy_rows(session, f'"{stage}"', columns, ([record.get(name) for name in columns] for record in records))
+
+    # xmax is 0 only in row versions created by an insert; RETURNING skips rows left unchanged.
+    staged = text(f'SELECT {quoted} FROM "{stage}"').columns(*[table.c[name] for name in columns])
+    merge = _on_conflict(upsert_insert('postgresql')(table).from_select(columns, staged), table, columns, conflict_keys)
+    merged = merge.returning(literal_column("xmax = 0", Boolean).label("inserted")).cte("merged")
+    inserted, written = session.execute(
+        select(func.count().filter(merged.c.inserted), func.count()).select_from(merged)
+    ).one()
+    session.execute(text(f'DROP TABLE "{stage}"'))
+    return inserted, written - inserted
+
+
+def _copy_rows(session, target: str, columns: List[str], rows: Iterable[Sequence[Any]]):
+    """COPYs rows into target (a quoted table name) in COPY_CHUNK_ROWS chunks of text format."""
+    quoted = ', '.join(f'"{name}"' for name in columns)
+    rows = iter(rows)
+    cursor = session.connection().connection.cursor()
+    try:
+        while True:
+            chunk = list(islice(rows, COPY_CHUNK_ROWS))
+            if not chunk:
+                return
+            buffer = io.StringIO()
+            for row in chunk:
+                buffer.write('\t'.join(_copy_value(value) for value in row))
+                buffer.write('\n')
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {target} ({quoted}) FROM STDIN', buffer)
+    finally:
+        cursor.close()
+
+
+def _qualified(table) -> str:
+    return f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+
+
+def _copy_value(value: Any) -> str:
+    """Formats a value for COPY's text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
@@ -0,0 +1,39 @@
+from typing import Dict
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Both dialects support INSERT ... ON CONFLICT with an `excluded` pseudo-table.
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def upsert_insert(dialect_name: str):
+    """Returns the insert() construct that supports on_conflict_* on this dialect."""
+    try:
+        return UPSERT_INSERTS[dialect_name]
+    except KeyError:
+        raise NotImplementedError(f"Upserts are not supported on {dialect_name}.") from None
+
+
+def apply_sqlite_pragmas(engine, pragmas: Dict[str, str]):
+    """
+    Runs the PRAGMAs on every new connection of a SQLite engine; other
+    engines are returned untouched. WAL lets readers (the API, the
+    dashboard) run while a worker writes, and synchronous=NORMAL only syncs
+    at checkpoints, which is durable enough in WAL mode.
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return engine
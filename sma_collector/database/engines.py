@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from sma_collector.config import Settings, settings as default_settings
+from .dialects import apply_sqlite_pragmas
+
+
+class PoolMetrics:
+    """Counters of one engine's connection pool, kept by InstrumentedQueuePool and the engine's connect event."""
+    def __init__(self):
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds, 6),
+                "wait_seconds_max": round(self.max_wait_seconds, 6),
+                "wait_seconds_avg": round(self.wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+    def __init__(self, *args, metrics: Optional[PoolMetrics] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics or PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+def get_engine(url: Optional[str] = None, settings: Settings = default_settings) -> Engine:
+    """
+    Returns the process-wide engine of a database URL (DATABASE_URL by
+    default), so every session of the process draws from one pool.
+
+    Pooled engines get DB_POOL_SIZE connections plus DB_MAX_OVERFLOW extra
+    ones under load, wait DB_POOL_TIMEOUT_SECONDS for a free connection,
+    test connections before use (DB_POOL_PRE_PING) and replace them after
+    DB_POOL_RECYCLE_SECONDS, before servers or proxies drop idle ones.
+    In-memory SQLite keeps SQLAlchemy's default single-connection pool.
+    """
+    url = url or settings.DATABASE_URL
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = apply_sqlite_pragmas(_create_engine(url, settings), settings.SQLITE_PRAGMAS)
+            _engines[url] = engine
+        return engine
+
+
+def _create_engine(url: str, settings: Settings) -> Engine:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return create_engine(url)
+
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_use_lifo=True,
+    )
+    metrics = engine.pool.metrics
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: metrics.record_connect())
+    return engine
+
+
+def pool_status(engine: Engine) -> Dict[str, Any]:
+    """Current occupancy and cumulative checkout metrics of an engine's pool."""
+    pool = engine.pool
+    status: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """pool_status of every engine in the registry, keyed by URL without password."""
+    with _engines_lock:
+        engines = dict(_engines)
+    return {
+        make_url(url).render_as_string(hide_password=True): pool_status(engine)
+        for url, engine in engines.items()
+    }
+
+
+def dispose_engines():
+    """Closes the pooled connections of every engine, e.g. in a child process after fork."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
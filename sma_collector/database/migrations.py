@@ -0,0 +1,326 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once per database, in version order, and its version is
+recorded in schema_migrations. Migrations are written to be idempotent
+(checkfirst/IF NOT EXISTS), because databases bootstrapped from
+postgres/init.sql already contain the baseline tables.
+
+    python -m sma_collector.database.migrations [--target VERSION]
+"""
+import argparse
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+from sma_collector.config import Settings, settings as default_settings
+from .engines import get_engine
+from .models import Base
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key of the advisory lock that keeps concurrent workers from migrating at once.
+MIGRATION_LOCK_KEY = 0x534D41
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(255)),
+    Column('applied_at', DateTime(timezone=True)),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, name: str):
+    def register(upgrade: Callable[[Connection], None]):
+        MIGRATIONS.append(Migration(version, name, upgrade))
+        return upgrade
+    return register
+
+
+# --- 1: baseline ---
+# The tables of postgres/init.sql, as they were before versioned migrations.
+BASELINE_TABLES = [
+    'commits', 'issues', 'builds', 'build_commits', 'deployments', 'incidents', 'vts_runs',
+    'osp_metrics', 'team_surveys', 'code_reviews', 'code_quality_metrics', 'collection_watermarks',
+]
+
+@migration(1, "baseline")
+def _baseline(connection: Connection):
+    # CreateTable only creates the table itself; indexes come with later migrations.
+    existing = set(inspect(connection).get_table_names())
+    for name in BASELINE_TABLES:
+        if name not in existing:
+            connection.execute(CreateTable(Base.metadata.tables[name]))
+
+
+# --- 2: monthly partitions of osp_metrics ---
+@migration(2, "partition osp_metrics by month")
+def _partition_osp_metrics(connection: Connection):
+    """
+    Recreates osp_metrics as a table range-partitioned by month on timestamp
+    (PostgreSQL only), keeping its rows and id sequence. A partition's
+    primary key must contain the partition key, hence (id, timestamp).
+    Rows without a timestamp cannot be placed in a partition and are left
+    in osp_metrics_legacy.
+    """
+    if connection.dialect.name != 'postgresql' or is_partitioned(connection, 'osp_metrics'):
+        return
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence('osp_metrics', 'id')")).scalar()
+    if sequence is None:
+        sequence = 'osp_metrics_id_seq'
+        connection.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {sequence}"))
+    else:
+        # Detach the sequence, or dropping the old table would drop it too.
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    connection.execute(text("ALTER TABLE osp_metrics RENAME TO osp_metrics_legacy"))
+    connection.execute(text("ALTER TABLE osp_metrics_legacy RENAME CONSTRAINT osp_metrics_pkey TO osp_metrics_legacy_pkey"))
+    connection.execute(text(f"""
+        CREATE TABLE osp_metrics (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL,
+            device_id VARCHAR(255),
+            metric_name VARCHAR(255),
+            metric_value FLOAT,
+            source VARCHAR(255),
+            PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """))
+    connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY osp_metrics.id"))
+
+    first, last = connection.execute(text('SELECT min("timestamp"), max("timestamp") FROM osp_metrics_legacy')).one()
+    now = datetime.now(timezone.utc)
+    ensure_monthly_partitions(connection, 'osp_metrics', first or now, max(last or now, now))
+    connection.execute(text("CREATE TABLE IF NOT EXISTS osp_metrics_default PARTITION OF osp_metrics DEFAULT"))
+    connection.execute(text(
+        'INSERT INTO osp_metrics (id, "timestamp", device_id, metric_name, metric_value, source)'
+        ' SELECT id, "timestamp", device_id, metric_name, metric_value, source'
+        ' FROM osp_metrics_legacy WHERE "timestamp" IS NOT NULL'
+    ))
+    leftover = connection.execute(text('SELECT count(*) FROM osp_metrics_legacy WHERE "timestamp" IS NULL')).scalar()
+    if leftover:
+        logger.warning(f"{leftover} osp_metrics rows without a timestamp were left in osp_metrics_legacy.")
+    else:
+        connection.execute(text("DROP TABLE osp_metrics_legacy"))
+
+
+# --- 3: secondary indexes ---
+SECONDARY_INDEXES = [
+    'ix_commits_authored_date', 'ix_commits_author_name_authored_date',
+    'ix_issues_created_date', 'ix_issues_status_created_date', 'ix_issues_type_created_date',
+    'ix_builds_job_name_number', 'ix_builds_job_name_start_time', 'ix_builds_status_start_time', 'ix_builds_start_time',
+    'ix_build_commits_commit_sha',
+    'ix_deployments_finish_time', 'ix_deployments_commit_sha',
+    'ix_incidents_created_date', 'ix_incidents_deployment_id',
+    'ix_vts_runs_test_plan_start_time',
+    'ix_osp_metrics_metric_name_timestamp', 'ix_osp_metrics_device_id_metric_name_timestamp',
+    'ix_code_reviews_created_date', 'ix_code_reviews_author_created_date', 'ix_code_reviews_repo_name_pr_number',
+]
+
+@migration(3, "secondary indexes")
+def _secondary_indexes(connection: Connection):
+    # On a partitioned osp_metrics, PostgreSQL creates each index on every partition.
+    create_model_indexes(connection, SECONDARY_INDEXES)
+
+
+# --- 4: osp_metrics rollups ---
+@migration(4, "osp_metrics rollups")
+def _osp_metric_rollups(connection: Connection):
+    for name in ('osp_metric_rollups', 'osp_metric_rollup_bins'):
+        Base.metadata.tables[name].create(connection, checkfirst=True)
+
+
+# --- 5: materialized DORA metrics ---
+@migration(5, "dora metrics")
+def _dora_metrics(connection: Connection):
+    for name in ('dora_daily_metrics', 'dora_lead_time_bins', 'dora_pending_days'):
+        Base.metadata.tables[name].create(connection, checkfirst=True)
+
+
+# --- 6: first deployment of each commit ---
+@migration(6, "commit deployments")
+def _commit_deployments(connection: Connection):
+    Base.metadata.tables['commit_deployments'].create(connection, checkfirst=True)
+
+
+# --- 7: incident attribution ---
+@migration(7, "incident attribution")
+def _incident_attribution(connection: Connection):
+    add_model_columns(connection, 'incidents', ['service', 'attributed_at'])
+    create_model_indexes(connection, ['ix_incidents_attributed_at'])
+
+
+# --- 8: diff stats of commits ---
+@migration(8, "commit diff stats")
+def _commit_diff_stats(connection: Connection):
+    # init.sql only runs on a new data directory, so existing databases get the columns here.
+    add_model_columns(connection, 'commits', ['lines_added', 'lines_deleted', 'files_changed'])
+
+
+def add_model_columns(connection: Connection, table: str, names: List[str]):
+    """Adds the named columns declared on the model of the table, unless they exist."""
+    existing = {column["name"] for column in inspect(connection).get_columns(table)}
+    for name in names:
+        if name not in existing:
+            column = Base.metadata.tables[table].c[name]
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+
+
+def create_model_indexes(connection: Connection, names: List[str]):
+    """Creates the named indexes declared on the models, unless they exist."""
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+
+def is_partitioned(connection: Connection, table: str) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}
+    ).first() is not None
+
+
+def _exists(connection: Connection, table: str) -> bool:
+    return connection.execute(text("SELECT to_regclass(:table)"), {"table": table}).scalar() is not None
+
+
+def monthly_partitions(table: str, start: datetime, end: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """(name, lower bound, upper bound) of the monthly partitions covering start..end, in UTC."""
+    start = start.astimezone(timezone.utc) if start.tzinfo else start.replace(tzinfo=timezone.utc)
+    end = end.astimezone(timezone.utc) if end.tzinfo else end.replace(tzinfo=timezone.utc)
+    month = datetime(start.year, start.month, 1, tzinfo=timezone.utc)
+    partitions = []
+    while month <= end:
+        following = datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=timezone.utc)
+        partitions.append((f"{table}_{month:%Y%m}", month, following))
+        month = following
+    return partitions
+
+
+def ensure_monthly_partitions(connection: Connection, table: str, start: datetime, end: datetime,
+                              column: str = "timestamp"):
+    """
+    Creates the missing monthly partitions of table covering start..end.
+    PostgreSQL refuses to create a partition for rows already in the default
+    partition, so when the default holds rows of the month it is detached,
+    the partition created, the rows moved into it and the default attached again.
+    """
+    default = f"{table}_default"
+    has_default = _exists(connection, default)
+    for name, lower, upper in monthly_partitions(table, start, end):
+        if _exists(connection, name):
+            continue
+        create = text(f"CREATE TABLE {name} PARTITION OF {table}"
+                      f" FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')")
+        in_month = f'"{column}" >= :lower AND "{column}" < :upper'
+        bounds = {"lower": lower, "upper": upper}
+        if not has_default or connection.execute(text(f"SELECT 1 FROM {default} WHERE {in_month} LIMIT 1"), bounds).first() is None:
+            connection.execute(create)
+            continue
+        connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+        connection.execute(create)
+        moved = connection.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_month}"), bounds).rowcount
+        connection.execute(text(f"DELETE FROM {default} WHERE {in_month}"), bounds)
+        connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+        logger.info(f"Moved {moved} rows of {name} out of {default}.")
+
+
+def drop_monthly_partitions_before(connection: Connection, table: str, cutoff: datetime) -> List[str]:
+    """Drops the monthly partitions of table that only hold rows older than cutoff, and returns their names."""
+    names = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+        " WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+    ), {"table": table}).scalars().all()
+    dropped = []
+    for name in names:
+        suffix = name[len(table) + 1:]
+        if not (name.startswith(f"{table}_") and len(suffix) == 6 and suffix.isdigit()):
+            continue  # the default partition
+        month = datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=timezone.utc)
+        if monthly_partitions(table, month, month)[0][2] <= cutoff:
+            connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def ensure_partitions(connection: Connection, settings: Settings = default_settings):
+    """
+    Creates the osp_metrics partitions of the coming OSP_METRICS_PARTITION_MONTHS_AHEAD
+    months, so new samples never land in the default partition. Runs with every
+    migrate() and as the osp_metrics_partitions maintenance task.
+    """
+    if connection.dialect.name != 'postgresql' or not is_partitioned(connection, 'osp_metrics'):
+        return
+    now = datetime.now(timezone.utc)
+    ahead = datetime(now.year + (now.month + settings.OSP_METRICS_PARTITION_MONTHS_AHEAD - 1) // 12,
+                     (now.month + settings.OSP_METRICS_PARTITION_MONTHS_AHEAD - 1) % 12 + 1, 1, tzinfo=timezone.utc)
+    ensure_monthly_partitions(connection, 'osp_metrics', now, ahead)
+
+
+def create_upcoming_partitions(session: Session, settings: Settings = default_settings):
+    """
+    Maintenance task running ensure_partitions(), since workers may stay up
+    longer than the months their migrate() created partitions for.
+    """
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    ensure_partitions(connection, settings)
+    session.commit()
+
+
+def applied_versions(connection: Connection) -> List[int]:
+    if not inspect(connection).has_table('schema_migrations'):
+        return []
+    return sorted(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def migrate(engine: Optional[Engine] = None, target: Optional[int] = None,
+            settings: Settings = default_settings) -> List[int]:
+    """Applies the pending migrations up to target (all by default) and returns their versions."""
+    engine = engine or get_engine(settings.DATABASE_URL, settings)
+    applied = []
+    with engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            # DDL is transactional on PostgreSQL: other workers wait here, then find nothing to do.
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        schema_migrations.create(connection, checkfirst=True)
+        done = set(applied_versions(connection))
+        for step in sorted(MIGRATIONS, key=lambda step: step.version):
+            if step.version in done or (target is not None and step.version > target):
+                continue
+            logger.info(f"Applying migration {step.version}: {step.name}.")
+            step.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=step.version, name=step.name, applied_at=datetime.now(timezone.utc)
+            ))
+            applied.append(step.version)
+        ensure_partitions(connection, settings)
+    if not applied:
+        logger.info("Database schema is up to date.")
+    return applied
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Applies pending schema migrations to DATABASE_URL.")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    args = parser.parse_args()
+    migrate(target=args.target)
+
+
+if __name__ == "__main__":
+    main()
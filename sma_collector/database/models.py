@@ -1,23 +1,35 @@
 import os
-import logging
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, BigInteger, ForeignKey, Float, Date
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, ForeignKey, Float, Date, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from sqlalchemy.dialects.postgresql import insert
 from..config import settings
+from .bulk_load import bulk_insert, bulk_upsert
+from .engines import get_engine
 
 Base = declarative_base()
 
 # --- Phase 1 Models ---
 class Commit(Base):
     __tablename__ = 'commits'
+    __table_args__ = (
+        Index('ix_commits_authored_date', 'authored_date'),
+        Index('ix_commits_author_name_authored_date', 'author_name', 'authored_date'),
+    )
     sha = Column(String(40), primary_key=True)
     author_name = Column(String(255))
     author_email = Column(String(255))
     authored_date = Column(DateTime(timezone=True))
     message = Column(String)
+    lines_added = Column(Integer)
+    lines_deleted = Column(Integer)
+    files_changed = Column(Integer)
 
 class Issue(Base):
     __tablename__ = 'issues'
+    __table_args__ = (
+        Index('ix_issues_created_date', 'created_date'),
+        Index('ix_issues_status_created_date', 'status', 'created_date'),
+        Index('ix_issues_type_created_date', 'type', 'created_date'),
+    )
     id = Column(String(255), primary_key=True)
     issue_key = Column(String(255), unique=True)
     type = Column(String(100))
@@ -30,6 +42,13 @@ class Issue(Base):
 
 class Build(Base):
     __tablename__ = 'builds'
+    __table_args__ = (
+        Index('ix_builds_job_name_number', 'job_name', 'number'),
+        Index('ix_builds_job_name_start_time', 'job_name', 'start_time'),
+        Index('ix_builds_status_start_time', 'status', 'start_time'),
+        # Builds arrive in start_time order, so a BRIN index stays tiny on PostgreSQL.
+        Index('ix_builds_start_time', 'start_time', postgresql_using='brin'),
+    )
     id = Column(String(255), primary_key=True)
     job_name = Column(String(255))
     number = Column(Integer)
@@ -41,12 +60,17 @@ class Build(Base):
 
 class BuildCommit(Base):
     __tablename__ = 'build_commits'
+    __table_args__ = (Index('ix_build_commits_commit_sha', 'commit_sha'),)
     build_id = Column(String(255), ForeignKey('builds.id'), primary_key=True)
     commit_sha = Column(String(40), ForeignKey('commits.sha'), primary_key=True)
     build = relationship("Build", back_populates="commits")
 
 class Deployment(Base):
     __tablename__ = 'deployments'
+    __table_args__ = (
+        Index('ix_deployments_finish_time', 'finish_time'),
+        Index('ix_deployments_commit_sha', 'commit_sha'),
+    )
     id = Column(String(255), ForeignKey('builds.id'), primary_key=True)
     commit_sha = Column(String(40), nullable=True)
     start_time = Column(DateTime(timezone=True))
@@ -54,14 +78,23 @@ class Deployment(Base):
 
 class Incident(Base):
     __tablename__ = 'incidents'
+    __table_args__ = (
+        Index('ix_incidents_created_date', 'created_date'),
+        Index('ix_incidents_deployment_id', 'deployment_id'),
+        Index('ix_incidents_attributed_at', 'attributed_at'),
+    )
     id = Column(String(255), ForeignKey('issues.id'), primary_key=True)
     deployment_id = Column(String(255), ForeignKey('deployments.id'), nullable=True)
     created_date = Column(DateTime(timezone=True))
     resolved_date = Column(DateTime(timezone=True), nullable=True)
+    # Jira component, matched against deployment services; NULL until attributed (sma_collector.incident_attribution).
+    service = Column(String(255), nullable=True)
+    attributed_at = Column(DateTime(timezone=True), nullable=True)
 
 # --- Phase 2 Models ---
 class VtsRun(Base):
     __tablename__ = 'vts_runs'
+    __table_args__ = (Index('ix_vts_runs_test_plan_start_time', 'test_plan', 'start_time'),)
     id = Column(String(255), primary_key=True)
     run_name = Column(String(255))
     test_plan = Column(String(255))
@@ -72,14 +105,45 @@ class VtsRun(Base):
     failed_tests = Column(Integer)
     pass_rate = Column(Float)
 
+# On PostgreSQL the table is range-partitioned by month on timestamp, so its
+# physical primary key is (id, timestamp); ids still come from one sequence.
+# The mapper identifies rows by that key on every database, while the DDL
+# keeps id alone: SQLite only autoincrements a single-column primary key.
 class OspMetric(Base):
     __tablename__ = 'osp_metrics'
+    __table_args__ = (
+        Index('ix_osp_metrics_metric_name_timestamp', 'metric_name', 'timestamp'),
+        Index('ix_osp_metrics_device_id_metric_name_timestamp', 'device_id', 'metric_name', 'timestamp'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     timestamp = Column(DateTime(timezone=True))
     device_id = Column(String(255))
     metric_name = Column(String(255))
     metric_value = Column(Float)
     source = Column(String(255))
+    __mapper_args__ = {"primary_key": [id, timestamp]}
+
+# Downsampled osp_metrics: one row per resolution (seconds), series and bucket.
+class OspMetricRollup(Base):
+    __tablename__ = 'osp_metric_rollups'
+    resolution = Column(Integer, primary_key=True)
+    metric_name = Column(String(255), primary_key=True)
+    device_id = Column(String(255), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    sample_count = Column(BigInteger)
+    value_sum = Column(Float)
+    value_min = Column(Float)
+    value_max = Column(Float)
+
+# Log-scale histogram of each rollup bucket, for percentiles; see sma_collector.osp_rollups.
+class OspMetricRollupBin(Base):
+    __tablename__ = 'osp_metric_rollup_bins'
+    resolution = Column(Integer, primary_key=True)
+    metric_name = Column(String(255), primary_key=True)
+    device_id = Column(String(255), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    sample_count = Column(BigInteger)
 
 # --- Phase 3 Models ---
 class TeamSurvey(Base):
@@ -91,6 +155,11 @@ class TeamSurvey(Base):
 
 class CodeReview(Base):
     __tablename__ = 'code_reviews'
+    __table_args__ = (
+        Index('ix_code_reviews_created_date', 'created_date'),
+        Index('ix_code_reviews_author_created_date', 'author', 'created_date'),
+        Index('ix_code_reviews_repo_name_pr_number', 'repo_name', 'pr_number'),
+    )
     id = Column(String(255), primary_key=True)
     repo_name = Column(String(255))
     pr_number = Column(Integer)
@@ -105,43 +174,67 @@ class CodeReview(Base):
 
 class CodeQualityMetric(Base):
     __tablename__ = 'code_quality_metrics'
+    __table_args__ = (UniqueConstraint('analysis_date', 'project_key', 'metric_name'),)
     id = Column(Integer, primary_key=True, autoincrement=True)
     analysis_date = Column(Date, nullable=False)
     project_key = Column(String(255), nullable=False)
     metric_name = Column(String(255), nullable=False)
     metric_value = Column(Float)
 
+# --- Materialized Metrics ---
+# DORA metrics per UTC day, team and repository, maintained by sma_collector.dora.
+# Every column is a count or a sum, so days add up to weeks, months and all teams.
+class DoraDailyMetric(Base):
+    __tablename__ = 'dora_daily_metrics'
+    day = Column(Date, primary_key=True)
+    team = Column(String(255), primary_key=True)
+    repo = Column(String(255), primary_key=True)
+    deployments = Column(Integer)
+    failed_deployments = Column(Integer)
+    lead_time_count = Column(Integer)
+    lead_time_minutes_sum = Column(Float)
+    incidents = Column(Integer)
+    restored_incidents = Column(Integer)
+    restore_minutes_sum = Column(Float)
+
+# Lead times as log-scale histogram bins (see sma_collector.osp_rollups.value_bin), for medians.
+class DoraLeadTimeBin(Base):
+    __tablename__ = 'dora_lead_time_bins'
+    day = Column(Date, primary_key=True)
+    team = Column(String(255), primary_key=True)
+    repo = Column(String(255), primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    commit_count = Column(Integer)
+
+# Days whose DORA metrics must be recomputed, marked with the data that changed them.
+class DoraPendingDay(Base):
+    __tablename__ = 'dora_pending_days'
+    day = Column(Date, primary_key=True)
+    marked_at = Column(DateTime(timezone=True))
+
+# The first deployment containing each commit, maintained by sma_collector.deployment_index
+# from the git history, so lead times count every commit once, even if it never was in a changeSet.
+class CommitDeployment(Base):
+    __tablename__ = 'commit_deployments'
+    __table_args__ = (
+        Index('ix_commit_deployments_deployment_id', 'deployment_id'),
+    )
+    sha = Column(String(40), primary_key=True)
+    deployment_id = Column(String(255))
+    deployed_at = Column(DateTime(timezone=True))
+    authored_date = Column(DateTime(timezone=True))
+
+# --- Collection State ---
+class CollectionWatermark(Base):
+    __tablename__ = 'collection_watermarks'
+    source = Column(String(100), primary_key=True)
+    watermark_key = Column(String(512), primary_key=True)
+    value = Column(String)
+    updated_at = Column(DateTime(timezone=True))
+
 # --- Database Session Management ---
-engine = create_engine(settings.DATABASE_URL)
+engine = get_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db_session():
     return SessionLocal()
-
-def bulk_upsert(session, model, records: list[dict]):
-    if not records:
-        return
-    
-    table = model.__table__
-    stmt = insert(table).values(records)
-    
-    primary_keys = [key.name for key in table.primary_key]
-    update_cols = {
-        col.name: col for col in stmt.excluded if not col.primary_key
-    }
-    
-    if not primary_keys:
-        logging.warning(f"Model {model.__name__} has no primary key for upsert. Skipping.")
-        return
-
-    if update_cols:
-        stmt = stmt.on_conflict_do_update(
-            index_elements=primary_keys,
-            set_=update_cols
-        )
-    else:
-        stmt = stmt.on_conflict_do_nothing(index_elements=primary_keys)
-
-    session.execute(stmt)
-    session.commit()
-
@@ -0,0 +1,220 @@
+"""
+Index of the first deployment containing each commit, built from the local
+git clones or mirrors of the collected repositories.
+
+A build's changeSet only lists the commits since the previous build of its
+job, so commits squashed, cherry-picked or batched into other builds have
+no deployment there. Instead, deployments are taken in order of their
+finish time, and each one is assigned the commits its deployed commit
+reaches that no earlier deployment reaches:
+
+    git log <deployed sha> ^<earlier deployed sha> ...
+
+The earlier deployments are represented by their frontier, the deployed
+commits that no other one reaches, kept small with `git merge-base
+--independent`; git answers these walks from the generation numbers of the
+repository's commit-graph, written before indexing. Every commit is walked
+once for the deployment that first contains it, and the answer is stored in
+commit_deployments, so "the first deployment containing commit X" is a
+primary key lookup (first_deployment()).
+
+Indexed deployments are recorded as watermarks (source 'deployment_index',
+key = deployment id, value = deployed sha), in the transaction of their
+commits. Each update only walks the deployments not indexed yet. A
+deployment that arrives after later ones takes over the commits it reached
+first, and the days whose lead times change are marked for the DORA
+refresh (see sma_collector.dora).
+"""
+import logging
+import os
+import subprocess
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+from git import GitCommandError
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings, settings as default_settings
+from sma_collector.connectors.collector import chunked
+from sma_collector.connectors.git_log import iter_git_log
+from sma_collector.database.models import CommitDeployment, CollectionWatermark, Deployment, DoraPendingDay, bulk_upsert
+from sma_collector.dora import LOOKUP_CHUNK, as_datetime, pending_days
+from sma_collector.git_mirrors import GitMirrorManager
+from sma_collector.sharding import repo_slug
+from sma_collector.watermarks import WatermarkStore
+
+logger = logging.getLogger(__name__)
+
+INDEX_SOURCE = "deployment_index"
+
+# Frontier size past which it is compacted with `git merge-base --independent`.
+FRONTIER_SIZE = 32
+
+
+def index_repo_dirs(settings: Settings = default_settings) -> List[str]:
+    """The mirrors (or clones) of the collected repositories that exist on this host; they are not fetched here."""
+    urls = ([settings.GIT_REPO_URL] if settings.GIT_REPO_URL else []) + list(settings.GIT_REPO_URLS)
+    if settings.GIT_MIRROR_DIR:
+        mirrors = GitMirrorManager.from_settings(settings)
+        paths = [mirrors.mirror_path(url) for url in urls]
+    else:
+        paths = [settings.GIT_REPO_PATH] + [os.path.join(settings.GIT_REPOS_DIR, repo_slug(url)) for url in settings.GIT_REPO_URLS]
+    return [path for path in dict.fromkeys(paths) if os.path.isdir(path)]
+
+
+def update_deployment_index(session: Session, settings: Settings = default_settings,
+                            repo_dirs: Optional[Sequence[str]] = None) -> int:
+    """
+    Indexes the deployments not indexed yet, or whose deployed commit
+    changed, in each repository that contains their commit, committing
+    after each deployment. Returns the number of deployments indexed.
+    """
+    repo_dirs = index_repo_dirs(settings) if repo_dirs is None else repo_dirs
+    if not repo_dirs:
+        logger.warning("No local git repository found. Skipping deployment index update.")
+        return 0
+    deployments = sorted(session.execute(
+        select(Deployment.id, Deployment.commit_sha, Deployment.finish_time)
+        .where(Deployment.commit_sha.isnot(None), Deployment.finish_time.isnot(None))
+    ).all(), key=lambda deployment: _order(deployment.finish_time, deployment.id))
+    watermarks = WatermarkStore(session)
+    indexed = 0
+    for repo_dir in repo_dirs:
+        try:
+            indexed += _index_repo(session, watermarks, repo_dir, deployments)
+        except (GitCommandError, OSError) as e:
+            session.rollback()
+            logger.error(f"Failed to index deployments in {repo_dir}: {e}")
+    return indexed
+
+
+def first_deployment(session: Session, sha: str) -> Optional[CommitDeployment]:
+    """The first indexed deployment containing the commit, or None."""
+    return session.get(CommitDeployment, sha)
+
+
+def indexed_lead_times(session: Session, deployments: Sequence[Any]) -> Dict[str, List[float]]:
+    """
+    Lead times in minutes of the commits each indexed deployment was the
+    first to contain, from authoring to the deployment's finish. Deployments
+    not indexed are left out.
+    """
+    indexed = set()
+    for ids in chunked([deployment.id for deployment in deployments], LOOKUP_CHUNK):
+        indexed.update(session.execute(
+            select(CollectionWatermark.watermark_key)
+            .where(CollectionWatermark.source == INDEX_SOURCE, CollectionWatermark.watermark_key.in_(ids))
+        ).scalars())
+
+    lead_times: Dict[str, List[float]] = {deployment_id: [] for deployment_id in indexed}
+    for ids in chunked(sorted(indexed), LOOKUP_CHUNK):
+        for deployment_id, deployed_at, authored_date in session.execute(
+            select(CommitDeployment.deployment_id, CommitDeployment.deployed_at, CommitDeployment.authored_date)
+            .where(CommitDeployment.deployment_id.in_(ids), CommitDeployment.authored_date.isnot(None))
+        ):
+            minutes = (as_datetime(deployed_at) - as_datetime(authored_date)).total_seconds() / 60
+            if minutes >= 0:
+                lead_times[deployment_id].append(minutes)
+    return lead_times
+
+
+def existing_commits(repo_dir: str, shas: Iterable[str]) -> Set[str]:
+    """The given shas that are commits of the repository, from one `git cat-file --batch-check`."""
+    shas = sorted(set(shas))
+    if not shas:
+        return set()
+    output = _git(repo_dir, ['cat-file', '--batch-check=%(objectname) %(objecttype)'], ''.join(f"{sha}\n" for sha in shas))
+    return {line.split()[0] for line in output.splitlines() if line.endswith(" commit")}
+
+
+def write_commit_graph(repo_dir: str):
+    """Adds the new commits to the commit-graph, whose generation numbers let git stop walks early."""
+    try:
+        _git(repo_dir, ['commit-graph', 'write', '--reachable', '--split'])
+    except GitCommandError as e:
+        logger.warning(f"Could not write the commit-graph of {repo_dir}, walks will be slower: {e}")
+
+
+class _Frontier:
+    """Deployed commits that no other of them reaches: excluding these excludes everything the deployments reach."""
+    def __init__(self, repo_dir: str):
+        self.repo_dir = repo_dir
+        self.tips: List[str] = []
+        self.limit = FRONTIER_SIZE
+
+    def add(self, sha: str):
+        if sha in self.tips:
+            return
+        self.tips.append(sha)
+        if len(self.tips) > self.limit:
+            self.tips = _git(self.repo_dir, ['merge-base', '--independent', *self.tips]).split()
+            # Many independent branches: compact less often rather than on every deployment.
+            self.limit = max(FRONTIER_SIZE, 2 * len(self.tips))
+
+
+def _index_repo(session: Session, watermarks: WatermarkStore, repo_dir: str, deployments: List[Any]) -> int:
+    done = watermarks.items(INDEX_SOURCE)
+    present = existing_commits(repo_dir, [deployment.commit_sha for deployment in deployments])
+    deployments = [deployment for deployment in deployments if deployment.commit_sha in present]
+    pending = [i for i, deployment in enumerate(deployments) if done.get(deployment.id) != deployment.commit_sha]
+    if not pending:
+        return 0
+
+    write_commit_graph(repo_dir)
+    frontier = _Frontier(repo_dir)
+    for deployment in deployments[:pending[0]]:
+        frontier.add(deployment.commit_sha)
+    for deployment in deployments[pending[0]:]:
+        if done.get(deployment.id) != deployment.commit_sha:
+            _index_deployment(session, watermarks, repo_dir, deployment, frontier.tips)
+        frontier.add(deployment.commit_sha)
+    logger.info(f"Indexed the commits of {len(pending)} deployments in {repo_dir}.")
+    return len(pending)
+
+
+def _index_deployment(session: Session, watermarks: WatermarkStore, repo_dir: str, deployment: Any, earlier: List[str]):
+    order = _order(deployment.finish_time, deployment.id)
+    commits = {
+        commit["sha"]: commit["authored_date"]
+        for commit in iter_git_log(repo_dir, deployment.commit_sha, numstat=False, extra_args=[f"^{sha}" for sha in earlier])
+    }
+
+    # Commits of a deployment indexed before with another deployed commit.
+    stale = session.execute(
+        select(CommitDeployment.deployed_at).where(CommitDeployment.deployment_id == deployment.id).distinct()
+    ).scalars().all()
+    if stale:
+        session.execute(delete(CommitDeployment).where(CommitDeployment.deployment_id == deployment.id))
+
+    # Commits already assigned to a deployment that finished later (it arrived first) are taken over.
+    previous = {}
+    for chunk in chunked(list(commits), LOOKUP_CHUNK):
+        for sha, deployment_id, deployed_at in session.execute(
+            select(CommitDeployment.sha, CommitDeployment.deployment_id, CommitDeployment.deployed_at)
+            .where(CommitDeployment.sha.in_(chunk))
+        ):
+            previous[sha] = _order(deployed_at, deployment_id)
+    taken = {sha: value for sha, value in previous.items() if value > order}
+    rows = [
+        {"sha": sha, "deployment_id": deployment.id, "deployed_at": deployment.finish_time, "authored_date": authored_date}
+        for sha, authored_date in commits.items() if sha not in previous or sha in taken
+    ]
+
+    days = list(stale) + [deployed_at for deployed_at, _ in taken.values()]
+    if rows:
+        days.append(deployment.finish_time)
+    bulk_upsert(session, DoraPendingDay, pending_days(days), commit=False)
+    bulk_upsert(session, CommitDeployment, rows, commit=False)
+    watermarks.set(INDEX_SOURCE, deployment.id, deployment.commit_sha, commit=False)
+    session.commit()
+
+
+def _order(finish_time: Any, deployment_id: str) -> tuple:
+    """Sort key of deployments in the order they reached production."""
+    return as_datetime(finish_time), deployment_id
+
+
+def _git(repo_dir: str, args: List[str], stdin: Optional[str] = None) -> str:
+    cmd = ['git', '-C', repo_dir, *args]
+    result = subprocess.run(cmd, input=stdin, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise GitCommandError(cmd, result.returncode, result.stderr)
+    return result.stdout
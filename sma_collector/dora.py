@@ -0,0 +1,311 @@
+"""
+DORA metrics (lead time for changes, deployment frequency, change failure
+rate and time to restore service), materialized per UTC day, team and
+repository in dora_daily_metrics.
+
+Processors mark the days their data touches in dora_pending_days, in the
+transaction that stores the data (see pending_days()); refresh_dora_metrics()
+recomputes just those days from builds, deployments, commits and incidents,
+so its cost follows the new data rather than the length of history.
+Dashboards and the API read the precomputed days through query_dora_metrics(),
+which adds them up into weeks or months.
+
+Lead times count each commit once, at the first deployment that contains
+it, as found by sma_collector.deployment_index.
+
+A deployment's team and repository come from DORA_SERVICE_MAP, matched
+against its Jenkins job name; incidents take those of the deployment they
+are attributed to by sma_collector.incident_attribution.
+"""
+import logging
+import re
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, delete, select, text
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings, settings as default_settings
+from sma_collector.connectors.collector import chunked
+from sma_collector.database.models import (
+    Build, BuildCommit, Commit, Deployment, DoraDailyMetric, DoraLeadTimeBin, DoraPendingDay, Incident
+)
+from sma_collector.osp_rollups import quantile, value_bin
+
+logger = logging.getLogger(__name__)
+
+UNASSIGNED = "unassigned"
+
+# Arbitrary key of the advisory lock that keeps refreshes from recomputing the same days at once.
+REFRESH_LOCK_KEY = 0x444F5241
+
+# Bound parameters per IN (...) list, below SQLite's limit.
+LOOKUP_CHUNK = 500
+
+PERIODS = ("day", "week", "month")
+
+
+def service_dimensions(job_name: Optional[str], settings: Settings = default_settings) -> Tuple[str, str]:
+    """(team, repo) of a deployment job, from the first DORA_SERVICE_MAP pattern that matches it."""
+    for pattern, dimensions in settings.DORA_SERVICE_MAP.items():
+        if job_name and re.search(pattern, job_name):
+            return dimensions.get("team", UNASSIGNED), dimensions.get("repo", UNASSIGNED)
+    return UNASSIGNED, UNASSIGNED
+
+
+def deployment_service(job_name: Optional[str], settings: Settings = default_settings) -> Optional[str]:
+    """Service of a deployment job that incidents name as their Jira component: the "service" of its DORA_SERVICE_MAP entry, or the job name."""
+    for pattern, dimensions in settings.DORA_SERVICE_MAP.items():
+        if job_name and re.search(pattern, job_name):
+            return dimensions.get("service", job_name)
+    return job_name
+
+
+def as_datetime(value: Any) -> Optional[datetime]:
+    """Datetimes as stored by the processors (datetimes or ISO 8601 strings), in UTC; naive ones are UTC."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def pending_days(timestamps: Iterable[Any]) -> List[Dict[str, Any]]:
+    """dora_pending_days records for the UTC days of the timestamps, to upsert with the data they come from."""
+    now = datetime.now(timezone.utc)
+    days = {as_datetime(timestamp).date() for timestamp in timestamps if timestamp is not None}
+    return [{"day": day, "marked_at": now} for day in sorted(days)]
+
+
+def minutes_between(start: Any, end: Any) -> Optional[int]:
+    start, end = as_datetime(start), as_datetime(end)
+    if start is None or end is None or end < start:
+        return None
+    return int((end - start).total_seconds() // 60)
+
+
+def deployment_lead_times(session: Session, deployments: Sequence[Any]) -> Dict[str, List[float]]:
+    """
+    Lead times in minutes of the commits each deployment delivered, from
+    authoring to the deployment's finish. Deployments in the deployment
+    index count the commits they were the first to contain; the others
+    fall back to their build's changeSet commits and the deployed commit.
+    """
+    # Imported here, the deployment index builds on this module.
+    from sma_collector.deployment_index import indexed_lead_times
+    lead_times = indexed_lead_times(session, deployments)
+    deployments = [deployment for deployment in deployments if deployment.id not in lead_times]
+
+    shas: Dict[str, set] = {deployment.id: {deployment.commit_sha} - {None} for deployment in deployments}
+    for ids in chunked(list(shas), LOOKUP_CHUNK):
+        for build_id, sha in session.execute(
+            select(BuildCommit.build_id, BuildCommit.commit_sha).where(BuildCommit.build_id.in_(ids))
+        ):
+            shas[build_id].add(sha)
+
+    authored: Dict[str, datetime] = {}
+    for chunk in chunked(list(set().union(*shas.values())), LOOKUP_CHUNK):
+        for sha, authored_date in session.execute(select(Commit.sha, Commit.authored_date).where(Commit.sha.in_(chunk))):
+            if authored_date is not None:
+                authored[sha] = as_datetime(authored_date)
+
+    for deployment in deployments:
+        finished = as_datetime(deployment.finish_time)
+        lead_times[deployment.id] = [
+            (finished - authored[sha]).total_seconds() / 60
+            for sha in shas[deployment.id] if sha in authored and authored[sha] <= finished
+        ]
+    return lead_times
+
+
+def compute_days(session: Session, first: date, last: date,
+                 settings: Settings = default_settings) -> Tuple[Dict[tuple, Dict[str, float]], Counter]:
+    """
+    DORA components of the days first..last, keyed by (day, team, repo), and
+    lead-time bin counts keyed by (day, team, repo, bin). Deployments count
+    on the day they finished, incidents on the day they were created.
+    """
+    start = datetime.combine(first, time(), timezone.utc)
+    end = datetime.combine(last + timedelta(days=1), time(), timezone.utc)
+    metrics: Dict[tuple, Dict[str, float]] = defaultdict(Counter)
+    bins: Counter = Counter()
+
+    deployments = session.execute(
+        select(Deployment.id, Deployment.commit_sha, Deployment.finish_time, Build.job_name)
+        .outerjoin(Build, Build.id == Deployment.id)
+        .where(Deployment.finish_time >= start, Deployment.finish_time < end)
+    ).all()
+    failed = set()
+    for ids in chunked([deployment.id for deployment in deployments], LOOKUP_CHUNK):
+        failed.update(session.execute(
+            select(Incident.deployment_id).where(Incident.deployment_id.in_(ids)).distinct()
+        ).scalars())
+    lead_times = deployment_lead_times(session, deployments)
+    for deployment in deployments:
+        key = (as_datetime(deployment.finish_time).date(),) + service_dimensions(deployment.job_name, settings)
+        row = metrics[key]
+        row["deployments"] += 1
+        row["failed_deployments"] += deployment.id in failed
+        for minutes in lead_times.get(deployment.id, []):
+            row["lead_time_count"] += 1
+            row["lead_time_minutes_sum"] += minutes
+            bins[key + (value_bin(minutes),)] += 1
+
+    incidents = session.execute(
+        select(Incident.created_date, Incident.resolved_date, Build.job_name)
+        .outerjoin(Build, Build.id == Incident.deployment_id)
+        .where(Incident.created_date >= start, Incident.created_date < end)
+    ).all()
+    for created, resolved, job_name in incidents:
+        row = metrics[(as_datetime(created).date(),) + service_dimensions(job_name, settings)]
+        row["incidents"] += 1
+        restore_minutes = minutes_between(created, resolved)
+        if restore_minutes is not None:
+            row["restored_incidents"] += 1
+            row["restore_minutes_sum"] += restore_minutes
+    return metrics, bins
+
+
+def refresh_dora_metrics(session: Session, settings: Settings = default_settings,
+                         days: Optional[Iterable[date]] = None) -> int:
+    """
+    Recomputes the pending days (or the given ones), replaces their rows in
+    dora_daily_metrics and dora_lead_time_bins, and commits. A day marked
+    again while it was being recomputed stays pending. Returns the number
+    of days recomputed.
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": REFRESH_LOCK_KEY})
+    marks = []
+    if days is None:
+        marks = session.execute(select(DoraPendingDay.day, DoraPendingDay.marked_at)).all()
+        days = [day for day, _ in marks]
+    days = sorted(set(days))
+
+    for first, last in _day_ranges(days):
+        metrics, bins = compute_days(session, first, last, settings)
+        in_range = set(_dates(first, last)) & set(days)
+        for model in (DoraDailyMetric, DoraLeadTimeBin):
+            for chunk in chunked(sorted(in_range), LOOKUP_CHUNK):
+                session.execute(delete(model).where(model.day.in_(chunk)))
+        rows = [dict(zip(("day", "team", "repo"), key), **_metric_columns(values))
+                for key, values in sorted(metrics.items()) if key[0] in in_range]
+        bin_rows = [dict(zip(("day", "team", "repo", "bin"), key), commit_count=count)
+                    for key, count in sorted(bins.items()) if key[0] in in_range]
+        if rows:
+            session.execute(DoraDailyMetric.__table__.insert(), rows)
+        if bin_rows:
+            session.execute(DoraLeadTimeBin.__table__.insert(), bin_rows)
+
+    if marks:
+        # Only the marks read above: a day marked again since then keeps its newer mark.
+        pending = DoraPendingDay.__table__
+        session.execute(
+            delete(pending).where(pending.c.day == bindparam("mark_day"), pending.c.marked_at == bindparam("mark_at")),
+            [{"mark_day": day, "mark_at": marked_at} for day, marked_at in marks],
+        )
+    session.commit()
+    if days:
+        logger.info(f"Refreshed DORA metrics of {len(days)} days ({days[0]} to {days[-1]}).")
+    return len(days)
+
+
+def rebuild_dora_metrics(session: Session, first: date, last: date, settings: Settings = default_settings) -> int:
+    """Recomputes every day from first to last, e.g. after changing DORA_SERVICE_MAP."""
+    return refresh_dora_metrics(session, settings, _dates(first, last))
+
+
+def query_dora_metrics(session: Session, first: date, last: date, period: str = "week",
+                       team: Optional[str] = None, repo: Optional[str] = None,
+                       group_by: Sequence[str] = ("team", "repo")) -> List[Dict[str, Any]]:
+    """
+    DORA metrics of the days first..last per period ("day", "week" starting
+    on Monday, or "month") and per the dimensions in group_by ("team",
+    "repo"); the others are summed up and reported as "*". Only the
+    precomputed days are read.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {PERIODS}")
+
+    def filtered(model):
+        query = select(model).where(model.day >= first, model.day <= last)
+        if team is not None:
+            query = query.where(model.team == team)
+        if repo is not None:
+            query = query.where(model.repo == repo)
+        return query
+
+    def group(row) -> tuple:
+        return (_period_start(row.day, period),
+                row.team if "team" in group_by else "*",
+                row.repo if "repo" in group_by else "*")
+
+    totals: Dict[tuple, Counter] = defaultdict(Counter)
+    for row in session.execute(filtered(DoraDailyMetric)).scalars():
+        totals[group(row)].update({name: getattr(row, name) or 0 for name in _METRIC_COLUMNS})
+    bins: Dict[tuple, Counter] = defaultdict(Counter)
+    for row in session.execute(filtered(DoraLeadTimeBin)).scalars():
+        bins[group(row)][row.bin] += row.commit_count
+
+    results = []
+    for key in sorted(totals):
+        period_start, group_team, group_repo = key
+        values = totals[key]
+        days = (min(_period_end(period_start, period), last) - max(period_start, first)).days + 1
+        results.append({
+            "period_start": period_start,
+            "team": group_team,
+            "repo": group_repo,
+            "deployments": values["deployments"],
+            "deployments_per_day": values["deployments"] / days,
+            "lead_time_median_minutes": quantile(bins[key], 0.5),
+            "lead_time_mean_minutes": _ratio(values["lead_time_minutes_sum"], values["lead_time_count"]),
+            "change_failure_rate": _ratio(values["failed_deployments"], values["deployments"]),
+            "incidents": values["incidents"],
+            "mttr_minutes": _ratio(values["restore_minutes_sum"], values["restored_incidents"]),
+        })
+    return results
+
+
+_METRIC_COLUMNS = (
+    "deployments", "failed_deployments", "lead_time_count", "lead_time_minutes_sum",
+    "incidents", "restored_incidents", "restore_minutes_sum",
+)
+
+
+def _metric_columns(values: Dict[str, float]) -> Dict[str, float]:
+    return {name: values.get(name, 0) for name in _METRIC_COLUMNS}
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return numerator / denominator if denominator else None
+
+
+def _dates(first: date, last: date) -> List[date]:
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def _day_ranges(days: List[date], max_days: int = 31) -> List[Tuple[date, date]]:
+    """Sorted days grouped into runs of consecutive days, at most max_days long, so each run is read at once."""
+    ranges = []
+    for day in days:
+        if ranges and (day - ranges[-1][1]).days == 1 and (day - ranges[-1][0]).days < max_days:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def _period_start(day: date, period: str) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _period_end(start: date, period: str) -> date:
+    if period == "week":
+        return start + timedelta(days=6)
+    if period == "month":
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1) - timedelta(days=1)
+    return start
@@ -0,0 +1,152 @@
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+from git import GitCommandError
+from sma_collector.config import Settings, settings as default_settings
+from sma_collector.sharding import repo_slug
+
+try:
+    import fcntl
+except ImportError:  # Windows: mirrors are still locked per process, just not across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class GitMirrorManager:
+    """
+    Keeps bare mirrors (`git clone --mirror`) of many repositories under one
+    directory and refreshes them with `git fetch --prune`.
+
+    Mirrors never have a working tree, so neither cloning nor refreshing
+    checks files out. With a partial clone filter ("blob:none" or "tree:0")
+    the first clone only transfers commits (and trees), and git fetches
+    missing objects lazily when a command needs them. A mirror fetched less
+    than max_age_seconds ago is not fetched again. Each mirror is guarded by
+    a lock file, so worker processes sharing mirror_dir never fetch the same
+    repository at once.
+    """
+    def __init__(self, mirror_dir: str, clone_filter: Optional[str] = None, max_workers: int = 8,
+                 max_age_seconds: float = 0, timeout_seconds: Optional[float] = None):
+        self.mirror_dir = mirror_dir
+        self.clone_filter = clone_filter
+        self.max_workers = max_workers
+        self.max_age_seconds = max_age_seconds
+        self.timeout_seconds = timeout_seconds
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "GitMirrorManager":
+        return cls(
+            settings.GIT_MIRROR_DIR,
+            clone_filter=settings.GIT_MIRROR_FILTER,
+            max_workers=settings.GIT_MIRROR_FETCH_WORKERS,
+            max_age_seconds=settings.GIT_MIRROR_MAX_AGE_SECONDS,
+            timeout_seconds=settings.GIT_MIRROR_TIMEOUT_SECONDS,
+        )
+
+    def mirror_path(self, url: str) -> str:
+        return os.path.join(self.mirror_dir, f"{repo_slug(url)}.git")
+
+    def ensure(self, url: str) -> str:
+        """Clones the mirror if it is missing, fetches it if it is stale, and returns its path."""
+        path = self.mirror_path(url)
+        with self._lock(path):
+            if os.path.isdir(path):
+                if self._is_fresh(path):
+                    logger.debug(f"Mirror {path} is fresh, skipping fetch.")
+                else:
+                    self._fetch(path)
+            else:
+                self._clone(url, path)
+        return path
+
+    def sync_all(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Ensures mirrors of all repositories, max_workers at a time.
+        Returns url -> mirror path, or None for repositories that failed.
+        """
+        urls = list(dict.fromkeys(urls))
+
+        def sync(url):
+            try:
+                return self.ensure(url)
+            except (GitCommandError, OSError, subprocess.TimeoutExpired) as e:
+                logger.error(f"Failed to sync mirror of {url}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix="sma-mirror") as pool:
+            paths = list(pool.map(sync, urls))
+        synced = sum(path is not None for path in paths)
+        logger.info(f"Synced {synced}/{len(urls)} git mirrors under {self.mirror_dir}.")
+        return dict(zip(urls, paths))
+
+    def _clone(self, url: str, path: str):
+        # Clone next to the final path and rename, so a failed clone never leaves a half-populated mirror.
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        cmd = ['git', 'clone', '--mirror', '--quiet']
+        if self.clone_filter:
+            cmd.append(f'--filter={self.clone_filter}')
+        logger.info(f"Cloning mirror of {url} into {path}.")
+        try:
+            self._run(cmd + [url, tmp_path])
+            os.rename(tmp_path, path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _fetch(self, path: str):
+        logger.info(f"Fetching mirror {path}.")
+        self._run(['git', '-C', path, 'fetch', '--prune', '--quiet', 'origin'])
+
+    def _is_fresh(self, path: str) -> bool:
+        if self.max_age_seconds <= 0:
+            return False
+        fetch_head = os.path.join(path, 'FETCH_HEAD')
+        marker = fetch_head if os.path.exists(fetch_head) else path
+        return time.time() - os.path.getmtime(marker) < self.max_age_seconds
+
+    def _run(self, cmd: List[str]):
+        # Never wait for a credential prompt on a worker.
+        env = {**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
+        result = subprocess.run(cmd, capture_output=True, env=env, timeout=self.timeout_seconds)
+        if result.returncode != 0:
+            raise GitCommandError(cmd, result.returncode, result.stderr)
+
+    @contextmanager
+    def _lock(self, path: str):
+        with self._locks_guard:
+            lock = self._locks.setdefault(path, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.mirror_dir, exist_ok=True)
+            with open(f"{path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def main():
+    """Clones or refreshes the mirrors of every configured repository, e.g. from cron before dispatching jobs."""
+    logging.basicConfig(level=logging.INFO)
+    if not default_settings.GIT_MIRROR_DIR:
+        logger.error("GIT_MIRROR_DIR is not set.")
+        return
+    urls = list(default_settings.GIT_REPO_URLS)
+    if default_settings.GIT_REPO_URL:
+        urls.insert(0, default_settings.GIT_REPO_URL)
+    GitMirrorManager.from_settings(default_settings).sync_all(urls)
+
+
+if __name__ == "__main__":
+    main()
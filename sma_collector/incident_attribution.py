@@ -0,0 +1,131 @@
+"""
+Attribution of incidents to the deployment that was live when they were
+created, which fills Incident.deployment_id for the change failure rate.
+
+A deployment is live from its start until the next deployment of the same
+service starts. DeploymentIntervals keeps the deployments of each service
+(and of all services, for incidents of no known service) sorted by start,
+so an incident is resolved by binary search: building the index is
+O(n log n) for n deployments and resolving m incidents O(m log n).
+
+Each run only resolves the incidents whose window may have changed:
+incidents not attributed yet (the Jira processor resets attributed_at when
+it stores a new one or one whose created_date or service changed) and incidents created since the earliest start of the
+deployments that are new or moved since the last run. Deployments seen
+are recorded as watermarks (source 'incident_attribution', key =
+deployment id, value = their service and start), in the transaction of
+the attributions. Only incidents whose deployment changed are written,
+and the days whose DORA metrics change are marked for the refresh.
+"""
+import json
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, or_, select, text, update
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings, settings as default_settings
+from sma_collector.database.models import Build, Deployment, DoraPendingDay, Incident, bulk_upsert
+from sma_collector.dora import as_datetime, deployment_service, pending_days
+from sma_collector.watermarks import WatermarkStore
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTION_SOURCE = "incident_attribution"
+
+# Arbitrary key of the advisory lock that keeps attribution runs from overwriting each other.
+ATTRIBUTION_LOCK_KEY = 0x494E4344
+
+
+class DeploymentIntervals:
+    """
+    Deployments as sorted, non-overlapping live intervals per service: each
+    one is live from its start until the next one of its service starts.
+    """
+    def __init__(self, deployments: Iterable[Tuple[str, Optional[str], datetime]]):
+        by_service: Dict[Optional[str], List[Tuple[datetime, str]]] = defaultdict(list)
+        for deployment_id, service, start in deployments:
+            by_service[service].append((start, deployment_id))
+            if service is not None:
+                by_service[None].append((start, deployment_id))
+        self._starts: Dict[Optional[str], List[datetime]] = {}
+        self._ids: Dict[Optional[str], List[str]] = {}
+        for service, intervals in by_service.items():
+            intervals.sort()
+            self._starts[service] = [start for start, _ in intervals]
+            self._ids[service] = [deployment_id for _, deployment_id in intervals]
+
+    def live(self, when: datetime, service: Optional[str] = None) -> Optional[str]:
+        """The deployment live at `when` among those of the service, or of every service if it has none."""
+        key = service if service in self._starts else None
+        starts = self._starts.get(key)
+        if not starts:
+            return None
+        position = bisect_right(starts, when) - 1
+        return self._ids[key][position] if position >= 0 else None
+
+
+def attribute_incidents(session: Session, settings: Settings = default_settings) -> int:
+    """
+    Attributes the incidents whose window may have changed to the
+    deployment live when they were created, and commits. Returns the
+    number of incidents whose deployment changed.
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ATTRIBUTION_LOCK_KEY})
+
+    deployments = {}
+    finished = {}
+    for deployment_id, start_time, finish_time, job_name in session.execute(
+        select(Deployment.id, Deployment.start_time, Deployment.finish_time, Build.job_name)
+        .outerjoin(Build, Build.id == Deployment.id)
+    ):
+        start = as_datetime(start_time or finish_time)
+        if start is not None:
+            deployments[deployment_id] = (deployment_service(job_name, settings), start)
+            finished[deployment_id] = finish_time
+    intervals = DeploymentIntervals((deployment_id, service, start) for deployment_id, (service, start) in deployments.items())
+
+    watermarks = WatermarkStore(session)
+    seen = watermarks.items(ATTRIBUTION_SOURCE)
+    current = {deployment_id: json.dumps([service, start.isoformat()]) for deployment_id, (service, start) in deployments.items()}
+    changed = {deployment_id: value for deployment_id, value in current.items() if seen.get(deployment_id) != value}
+    # A moved deployment changes the windows at its old start as well as at its new one.
+    starts = [as_datetime(json.loads(value)[1]) for value in changed.values()]
+    starts += [as_datetime(json.loads(seen[deployment_id])[1]) for deployment_id in changed if deployment_id in seen]
+
+    condition = Incident.attributed_at.is_(None)
+    if starts:
+        condition = or_(condition, Incident.created_date >= min(starts))
+    incidents = session.execute(
+        select(Incident.id, Incident.service, Incident.created_date, Incident.deployment_id, Incident.attributed_at).where(condition)
+    ).all()
+
+    now = datetime.now(timezone.utc)
+    updates = []
+    days = []
+    reassigned = 0
+    for incident_id, service, created_date, deployment_id, attributed_at in incidents:
+        created = as_datetime(created_date)
+        live = intervals.live(created, service) if created else None
+        if live != deployment_id or attributed_at is None:
+            updates.append({"incident_id": incident_id, "live_deployment": live, "attributed": now})
+        if live != deployment_id:
+            reassigned += 1
+            days += [created, finished.get(deployment_id), finished.get(live)]
+
+    if updates:
+        table = Incident.__table__
+        session.execute(
+            update(table).where(table.c.id == bindparam("incident_id"))
+            .values(deployment_id=bindparam("live_deployment"), attributed_at=bindparam("attributed")),
+            updates,
+        )
+    bulk_upsert(session, DoraPendingDay, pending_days(days), commit=False)
+    watermarks.set_many(ATTRIBUTION_SOURCE, changed, commit=False)
+    session.commit()
+
+    logger.info(f"Resolved {len(incidents)} incidents against {len(deployments)} deployments "
+                f"({len(changed)} new or moved); {reassigned} changed deployment.")
+    return reassigned
@@ -0,0 +1,84 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class SourceExecutor:
+    """
+    Runs collection jobs on one bounded thread pool per source.
+
+    Each source gets its own pool sized by its concurrency limit, so a slow
+    source (e.g. a large Jira crawl) can only occupy its own slots and never
+    delays jobs for other sources. With jobs_per_slot, try_submit() also
+    refuses jobs once a source has limit × jobs_per_slot jobs queued or
+    running, so one source cannot hoard the jobs the worker has taken on.
+    """
+    def __init__(self, source_limits: Dict[str, int], default_limit: int = 1, jobs_per_slot: Optional[int] = None):
+        self.source_limits = dict(source_limits)
+        self.default_limit = max(1, default_limit)
+        self.jobs_per_slot = jobs_per_slot
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, source: str) -> int:
+        """Returns the maximum number of concurrent jobs for a source."""
+        return max(1, self.source_limits.get(source, self.default_limit))
+
+    def capacity(self, sources: Iterable[str]) -> int:
+        """Returns how many jobs can run at once across the given sources."""
+        return sum(self.limit_for(source) for source in set(sources))
+
+    def _pool_for(self, source: str) -> ThreadPoolExecutor:
+        with self._lock:
+            pool = self._pools.get(source)
+            if pool is None:
+                pool = ThreadPoolExecutor(
+                    max_workers=self.limit_for(source),
+                    thread_name_prefix=f"sma-{source}"
+                )
+                self._pools[source] = pool
+            return pool
+
+    def pending(self, source: str) -> int:
+        """Returns the number of jobs of a source that are queued or running."""
+        with self._lock:
+            return self._pending.get(source, 0)
+
+    def submit(self, source: str, fn: Callable, *args, **kwargs) -> Future:
+        """Schedules fn on the pool of the given source."""
+        with self._lock:
+            self._pending[source] = self._pending.get(source, 0) + 1
+        return self._schedule(source, fn, *args, **kwargs)
+
+    def try_submit(self, source: str, fn: Callable, *args, **kwargs) -> Optional[Future]:
+        """Schedules fn like submit(), or returns None if the source already has its share of jobs."""
+        with self._lock:
+            pending = self._pending.get(source, 0)
+            if self.jobs_per_slot is not None and pending >= self.limit_for(source) * max(1, self.jobs_per_slot):
+                return None
+            self._pending[source] = pending + 1
+        return self._schedule(source, fn, *args, **kwargs)
+
+    def _schedule(self, source: str, fn: Callable, *args, **kwargs) -> Future:
+        try:
+            future = self._pool_for(source).submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(source)
+            raise
+        future.add_done_callback(lambda _: self._release(source))
+        return future
+
+    def _release(self, source: str):
+        with self._lock:
+            self._pending[source] -= 1
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting jobs and optionally waits for running jobs to finish."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.shutdown(wait=wait)
@@ -2,6 +2,7 @@ import pika
 import json
 import logging
 from sma_collector.config import settings
+from sma_collector.sharding import plan_jobs
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,12 +24,8 @@ def main():
         logger.error(f"Failed to connect to RabbitMQ: {e}")
         return
 
-    # Define the jobs to be dispatched
-    jobs = [
-        {'source': 'git'},
-        {'source': 'github'},
-        {'source': 'jira'}
-    ]
+    # Split the collection into small shard jobs so that workers can run them independently
+    jobs = plan_jobs(settings)
 
     for job in jobs:
         message = json.dumps(job)
@@ -42,7 +39,7 @@ def main():
         logger.info(f" [x] Sent job: {message}")
 
     connection.close()
-    logger.info("All collection jobs have been dispatched.")
+    logger.info(f"All {len(jobs)} collection jobs have been dispatched.")
     logger.info("=================================================")
 
 
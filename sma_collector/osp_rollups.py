@@ -0,0 +1,352 @@
+"""
+Downsampled rollups of the osp_metrics time series.
+
+Every sample is aggregated into 1-minute, 1-hour and 1-day buckets per
+device and metric: count, sum, min and max in osp_metric_rollups, and a
+log-scale histogram in osp_metric_rollup_bins for percentiles. All of these
+merge by addition (or min/max), so update_rollups() folds new samples into
+existing buckets with one upsert per row, in the transaction that stores
+the raw samples, and concurrent writers never lose each other's counts.
+Deleted samples are taken back out the same way by subtract_rollups().
+"""
+import logging
+import math
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings, settings as default_settings
+from sma_collector.database.dialects import upsert_insert
+from sma_collector.database.migrations import drop_monthly_partitions_before, is_partitioned
+from sma_collector.database.models import OspMetric, OspMetricRollup, OspMetricRollupBin
+
+logger = logging.getLogger(__name__)
+
+# Rollup resolutions in seconds, finest first.
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+# Percentiles are within 1% of the true value. Changing this invalidates stored bins.
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Bins of positive values are offset so that bin numbers sort like the values they hold:
+# negative values get negative bins, zero (and anything smaller than MIN_VALUE) gets bin 0.
+_BIN_OFFSET = 1 << 20
+MIN_VALUE = 1e-9
+
+WRITE_CHUNK = 1000
+
+
+def value_bin(value: float) -> int:
+    """Histogram bin of a value: bin k holds magnitudes in (gamma^(k-1), gamma^k]."""
+    magnitude = abs(value)
+    if magnitude < MIN_VALUE:
+        return 0
+    index = math.ceil(math.log(magnitude) / _LOG_GAMMA) + _BIN_OFFSET
+    return index if value > 0 else -index
+
+
+def bin_value(bin_number: int) -> float:
+    """The value a bin stands for, within RELATIVE_ACCURACY of anything it holds."""
+    if bin_number == 0:
+        return 0.0
+    index = abs(bin_number) - _BIN_OFFSET
+    value = 2 * _GAMMA ** index / (_GAMMA + 1)
+    return value if bin_number > 0 else -value
+
+
+def quantile(bins: Dict[int, int], q: float) -> Optional[float]:
+    """The q-quantile (0..1) of the samples counted in bins."""
+    total = sum(bins.values())
+    if not total:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for bin_number in sorted(bins):
+        seen += bins[bin_number]
+        if seen > rank:
+            return bin_value(bin_number)
+    return bin_value(max(bins))
+
+
+def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    """Start of the resolution-aligned bucket of a timestamp, in UTC; naive timestamps are UTC."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    seconds = int(timestamp.timestamp())
+    return datetime.fromtimestamp(seconds - seconds % resolution, timezone.utc)
+
+
+def aggregate(samples: Iterable[Dict[str, Any]]) -> Tuple[Dict[tuple, List[float]], Counter]:
+    """
+    Aggregates samples (dicts with timestamp, device_id, metric_name and
+    metric_value) into rollup rows and histogram bin counts keyed by
+    (resolution, metric_name, device_id, bucket_start).
+    """
+    rollups: Dict[tuple, List[float]] = {}
+    bins: Counter = Counter()
+    for sample in samples:
+        value = sample.get("metric_value")
+        if value is None or sample.get("timestamp") is None:
+            continue
+        value = float(value)
+        bin_number = value_bin(value)
+        for resolution in RESOLUTIONS.values():
+            key = (resolution, sample["metric_name"], sample["device_id"], bucket_start(sample["timestamp"], resolution))
+            row = rollups.get(key)
+            if row is None:
+                rollups[key] = [1, value, value, value]
+            else:
+                row[0] += 1
+                row[1] += value
+                row[2] = min(row[2], value)
+                row[3] = max(row[3], value)
+            bins[key + (bin_number,)] += 1
+    return rollups, bins
+
+
+def update_rollups(session: Session, samples: Iterable[Dict[str, Any]]) -> int:
+    """
+    Folds samples into the stored rollups, without committing, and returns
+    the number of rollup buckets touched. Call it in the transaction that
+    stores the same samples in osp_metrics so that each sample is counted once.
+    """
+    rollups, bins = aggregate(samples)
+    return merge_rollups(session, rollups, bins)
+
+
+def merge_rollups(session: Session, rollups: Dict[tuple, List[float]], bins: Counter) -> int:
+    """
+    Adds the output of aggregate() to the stored rollups, without committing.
+    Aggregation can thus run elsewhere, e.g. in the processes that parse
+    profiling files, with only the much smaller aggregates sent back.
+    """
+    if not rollups:
+        return 0
+    dialect = session.get_bind().dialect.name
+    insert = upsert_insert(dialect)
+    least, greatest = (func.least, func.greatest) if dialect == 'postgresql' else (func.min, func.max)
+    keys = ['resolution', 'metric_name', 'device_id', 'bucket_start']
+
+    table = OspMetricRollup.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=keys, set_={
+        'sample_count': table.c.sample_count + stmt.excluded.sample_count,
+        'value_sum': table.c.value_sum + stmt.excluded.value_sum,
+        'value_min': least(table.c.value_min, stmt.excluded.value_min),
+        'value_max': greatest(table.c.value_max, stmt.excluded.value_max),
+    })
+    rows = [dict(zip(keys, key), sample_count=count, value_sum=total, value_min=low, value_max=high)
+            for key, (count, total, low, high) in sorted(rollups.items())]
+    for start in range(0, len(rows), WRITE_CHUNK):
+        session.execute(stmt, rows[start:start + WRITE_CHUNK])
+
+    bin_table = OspMetricRollupBin.__table__
+    bin_stmt = insert(bin_table)
+    bin_stmt = bin_stmt.on_conflict_do_update(index_elements=keys + ['bin'], set_={
+        'sample_count': bin_table.c.sample_count + bin_stmt.excluded.sample_count,
+    })
+    bin_rows = [dict(zip(keys + ['bin'], key), sample_count=count) for key, count in sorted(bins.items())]
+    for start in range(0, len(bin_rows), WRITE_CHUNK):
+        session.execute(bin_stmt, bin_rows[start:start + WRITE_CHUNK])
+    return len(rows)
+
+
+def subtract_rollups(session: Session, rollups: Dict[tuple, List[float]], bins: Counter,
+                     settings: Settings = default_settings, now: Optional[datetime] = None) -> int:
+    """
+    Takes the output of aggregate() over deleted samples back out of the
+    stored rollups, without committing; call it once the samples are gone
+    from osp_metrics. Counts, sums and bins are subtracted and emptied
+    buckets deleted. Only buckets whose min or max was a deleted value get
+    new extremes: from the remaining raw samples while the whole bucket is
+    within OSP_METRICS_RAW_RETENTION_DAYS, else from the remaining bins.
+    Returns the number of rollup buckets touched.
+    """
+    if not rollups:
+        return 0
+    now = now or datetime.now(timezone.utc)
+    raw_retention = settings.OSP_METRICS_RAW_RETENTION_DAYS
+    raw_cutoff = now - timedelta(days=raw_retention) if raw_retention else None
+
+    stored: Dict[tuple, OspMetricRollup] = {}
+    series: Dict[tuple, List[datetime]] = {}
+    for key in rollups:
+        series.setdefault(key[:3], []).append(key[3])
+    for (resolution, metric_name, device_id), starts in series.items():
+        for row in session.execute(select(OspMetricRollup).where(
+            OspMetricRollup.resolution == resolution, OspMetricRollup.metric_name == metric_name,
+            OspMetricRollup.device_id == device_id,
+            OspMetricRollup.bucket_start >= min(starts), OspMetricRollup.bucket_start <= max(starts),
+        )).scalars():
+            key = (resolution, metric_name, device_id, _utc(row.bucket_start))
+            if key in rollups:
+                stored[key] = row
+
+    bin_table = OspMetricRollupBin.__table__
+    bin_keys = ['resolution', 'metric_name', 'device_id', 'bucket_start', 'bin']
+    # Bound parameters cannot share the names of the columns an UPDATE sets.
+    in_bin = [bin_table.c[column] == bindparam(f"b_{column}") for column in bin_keys]
+    bin_rows = [dict(zip([f"b_{column}" for column in bin_keys], key), removed=count)
+                for key, count in sorted(bins.items()) if key[:4] in stored]
+    for start in range(0, len(bin_rows), WRITE_CHUNK):
+        rows = bin_rows[start:start + WRITE_CHUNK]
+        session.execute(update(bin_table).where(*in_bin)
+                        .values(sample_count=bin_table.c.sample_count - bindparam("removed")), rows)
+        session.execute(delete(bin_table).where(*in_bin, bin_table.c.sample_count <= 0), rows)
+
+    for key, row in stored.items():
+        count, total, low, high = rollups[key]
+        if row.sample_count <= count:
+            session.delete(row)
+            continue
+        row.sample_count -= count
+        row.value_sum -= total
+        if low > row.value_min and high < row.value_max:
+            continue
+        resolution, metric_name, device_id, start = key
+        end = start + timedelta(seconds=resolution)
+        extremes = (None, None)
+        if raw_cutoff is None or start >= raw_cutoff:
+            extremes = session.execute(select(func.min(OspMetric.metric_value), func.max(OspMetric.metric_value)).where(
+                OspMetric.metric_name == metric_name, OspMetric.device_id == device_id,
+                OspMetric.timestamp >= start, OspMetric.timestamp < end,
+            )).one()
+        if extremes[0] is None:
+            # The raw samples are gone: the remaining bins bound the extremes within RELATIVE_ACCURACY.
+            extremes = session.execute(select(func.min(OspMetricRollupBin.bin), func.max(OspMetricRollupBin.bin)).where(
+                OspMetricRollupBin.resolution == resolution, OspMetricRollupBin.metric_name == metric_name,
+                OspMetricRollupBin.device_id == device_id, OspMetricRollupBin.bucket_start == start,
+            )).one()
+            if extremes[0] is None:
+                continue
+            extremes = (max(row.value_min, bin_value(extremes[0])), min(row.value_max, bin_value(extremes[1])))
+        row.value_min, row.value_max = extremes
+    # Flushed now: later upserts of the same buckets must add to the subtracted values.
+    session.flush()
+    return len(stored)
+
+
+def rebuild_rollups(session: Session, start: datetime, end: datetime, batch_size: int = 50_000,
+                    commit: bool = True) -> int:
+    """
+    Recomputes the rollups of the days overlapping start..end from the raw
+    samples still in osp_metrics, e.g. after enabling rollups on existing
+    data or deleting samples. Returns the number of samples read.
+    """
+    day = RESOLUTIONS["1d"]
+    start = bucket_start(start, day)
+    end = bucket_start(end, day) + timedelta(seconds=day)
+    for model in (OspMetricRollup, OspMetricRollupBin):
+        session.execute(delete(model).where(model.bucket_start >= start, model.bucket_start < end))
+
+    query = (
+        select(OspMetric.timestamp, OspMetric.device_id, OspMetric.metric_name, OspMetric.metric_value)
+        .where(OspMetric.timestamp >= start, OspMetric.timestamp < end)
+        .execution_options(yield_per=batch_size)
+    )
+    count = 0
+    for partition in session.execute(query).mappings().partitions():
+        update_rollups(session, partition)
+        count += len(partition)
+    if commit:
+        session.commit()
+    logger.info(f"Rebuilt osp_metrics rollups from {start} to {end} out of {count} samples.")
+    return count
+
+
+def choose_resolution(start: datetime, end: datetime, max_points: int,
+                      settings: Settings = default_settings, now: Optional[datetime] = None) -> int:
+    """
+    The finest resolution that covers start..end in at most max_points
+    buckets, among those whose retention still reaches back to start;
+    the coarsest retained one if none is fine enough.
+    """
+    now = now or datetime.now(timezone.utc)
+    start, end = _utc(start), _utc(end)
+    span = (end - start).total_seconds()
+    retained = [
+        seconds for name, seconds in RESOLUTIONS.items()
+        if name not in settings.OSP_ROLLUP_RETENTION_DAYS
+        or start >= now - timedelta(days=settings.OSP_ROLLUP_RETENTION_DAYS[name])
+    ] or [max(RESOLUTIONS.values())]
+    for seconds in retained:
+        if span / seconds <= max_points:
+            return seconds
+    return retained[-1]
+
+
+def query_series(session: Session, device_id: str, metric_name: str, start: datetime, end: datetime,
+                 max_points: Optional[int] = None, quantiles: Sequence[float] = (0.5, 0.9, 0.99),
+                 settings: Settings = default_settings) -> Dict[str, Any]:
+    """
+    Reads one device's metric between start and end from the rollup chosen
+    by choose_resolution. Each point has the bucket's count, avg, min, max
+    and the requested percentiles (keys like "p90").
+    """
+    start, end = _utc(start), _utc(end)
+    resolution = choose_resolution(start, end, max_points or settings.OSP_ROLLUP_MAX_POINTS, settings)
+    first = bucket_start(start, resolution)
+
+    def in_range(model):
+        return (model.resolution == resolution, model.device_id == device_id, model.metric_name == metric_name,
+                model.bucket_start >= first, model.bucket_start < end)
+
+    bins: Dict[datetime, Dict[int, int]] = {}
+    for bucket, bin_number, count in session.execute(
+        select(OspMetricRollupBin.bucket_start, OspMetricRollupBin.bin, OspMetricRollupBin.sample_count)
+        .where(*in_range(OspMetricRollupBin))
+    ):
+        bins.setdefault(_utc(bucket), {})[bin_number] = count
+
+    points = []
+    for row in session.execute(select(OspMetricRollup).where(*in_range(OspMetricRollup))
+                               .order_by(OspMetricRollup.bucket_start)).scalars():
+        bucket = _utc(row.bucket_start)
+        point = {
+            "bucket_start": bucket,
+            "count": row.sample_count,
+            "avg": row.value_sum / row.sample_count if row.sample_count else None,
+            "min": row.value_min,
+            "max": row.value_max,
+        }
+        for q in quantiles:
+            value = quantile(bins.get(bucket, {}), q)
+            # Bins are approximate; the exact extremes bound them.
+            point[f"p{q * 100:g}"] = min(max(value, row.value_min), row.value_max) if value is not None else None
+        points.append(point)
+    return {"resolution": resolution, "points": points}
+
+
+def apply_retention(session: Session, settings: Settings = default_settings,
+                    now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Deletes raw samples older than OSP_METRICS_RAW_RETENTION_DAYS (dropping
+    whole monthly partitions on PostgreSQL) and rollups older than their
+    OSP_ROLLUP_RETENTION_DAYS. Returns the rows deleted per table.
+    """
+    now = now or datetime.now(timezone.utc)
+    deleted: Dict[str, int] = {}
+    if settings.OSP_METRICS_RAW_RETENTION_DAYS:
+        cutoff = now - timedelta(days=settings.OSP_METRICS_RAW_RETENTION_DAYS)
+        connection = session.connection()
+        if connection.dialect.name == 'postgresql' and is_partitioned(connection, 'osp_metrics'):
+            dropped = drop_monthly_partitions_before(connection, 'osp_metrics', cutoff)
+            if dropped:
+                logger.info(f"Dropped osp_metrics partitions {', '.join(dropped)}.")
+        deleted['osp_metrics'] = session.execute(delete(OspMetric).where(OspMetric.timestamp < cutoff)).rowcount
+
+    for name, days in settings.OSP_ROLLUP_RETENTION_DAYS.items():
+        cutoff = now - timedelta(days=days)
+        for model in (OspMetricRollup, OspMetricRollupBin):
+            result = session.execute(delete(model).where(model.resolution == RESOLUTIONS[name], model.bucket_start < cutoff))
+            deleted[f"{model.__tablename__}:{name}"] = result.rowcount
+    session.commit()
+    logger.info(f"Applied osp_metrics retention: {deleted}.")
+    return deleted
+
+
+def _utc(timestamp: datetime) -> datetime:
+    # Naive timestamps are UTC, like the naive datetimes SQLite returns for timezone-aware columns.
+    return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp.astimezone(timezone.utc)
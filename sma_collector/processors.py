@@ -1,14 +1,49 @@
+import hashlib
+import json
 import logging
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from sqlalchemy import delete, func, select, text
 from sqlalchemy.orm import Session
-from sma_collector.database.models import Commit, CodeReview, Issue, bulk_upsert
+from sma_collector.config import settings
+from sma_collector.database.models import (
+    Build, BuildCommit, Commit, CodeQualityMetric, CodeReview, Deployment, DoraPendingDay, Incident, Issue, OspMetric,
+    VtsRun, bulk_insert, bulk_upsert
+)
+from sma_collector.dora import as_datetime, minutes_between, pending_days
+from sma_collector.connectors.profiling_connector import SAMPLE_COLUMNS
+from sma_collector.connectors.review_activity import REVIEW_ACTIVITY_FIELDS
+from sma_collector.osp_rollups import aggregate, merge_rollups, subtract_rollups
+from sma_collector.watermarks import WatermarkStore
 
 logger = logging.getLogger(__name__)
 
+def process_batches(session: Session, processor_function: Callable, batches: Iterable[List[Dict[str, Any]]]) -> int:
+    """
+    Feeds each collected batch to a processor as soon as it arrives.
+
+    Every process_*_data function accepts a list of records, so the same
+    processors store one bounded batch at a time. Returns the record count.
+    """
+    total = 0
+    for batch in batches:
+        processor_function(session, batch)
+        total += len(batch)
+    return total
+
+def _counts(result) -> str:
+    return f"{result.inserted} new, {result.updated} changed, {result.unchanged} unchanged"
+
 def process_git_data(session: Session, data):
     """Processes and stores commit data."""
     if data:
-        bulk_upsert(session, Commit, data)
-        logger.info(f"Upserted {len(data)} commits.")
+        # Deployments of commits collected after them only now get their lead time.
+        shas = [commit["sha"] for commit in data]
+        deployed = [row[0] for row in session.query(Deployment.finish_time).filter(Deployment.commit_sha.in_(shas))]
+        if deployed:
+            bulk_upsert(session, DoraPendingDay, pending_days(deployed), commit=False)
+        result = bulk_upsert(session, Commit, data)
+        logger.info(f"Upserted {len(data)} commits ({_counts(result)}).")
 
 def process_github_data(session: Session, data):
     """Processes and stores pull request data."""
@@ -22,10 +57,17 @@ def process_github_data(session: Session, data):
                 "author": pr["author"],
                 "created_date": pr["created_date"],
                 "merged_date": pr["merged_date"],
+                # Pull requests whose review activity could not be fetched keep the stored values.
+                **{field: pr[field] for field in REVIEW_ACTIVITY_FIELDS if field in pr},
             } for pr in data
         ]
-        bulk_upsert(session, CodeReview, pr_data)
-        logger.info(f"Upserted {len(pr_data)} pull requests as code reviews.")
+        # Upserted apart, since bulk_upsert would write NULL into a column the others carry.
+        for has_activity in (True, False):
+            rows = [row for row in pr_data if (REVIEW_ACTIVITY_FIELDS[0] in row) == has_activity]
+            if rows:
+                result = bulk_upsert(session, CodeReview, rows, commit=False)
+                logger.info(f"Upserted {len(rows)} pull requests as code reviews ({_counts(result)}).")
+        session.commit()
 
 def process_jira_data(session: Session, data):
     """Processes and stores issue data."""
@@ -39,7 +81,164 @@ def process_jira_data(session: Session, data):
                 "title": issue["summary"],
                 "created_date": issue["created"],
                 "resolved_date": issue["resolved"],
+                "lead_time_minutes": minutes_between(issue["created"], issue["resolved"]),
             } for issue in data
         ]
-        bulk_upsert(session, Issue, issue_data)
-        logger.info(f"Upserted {len(issue_data)} issues.")
+        result = bulk_upsert(session, Issue, issue_data)
+        logger.info(f"Upserted {len(issue_data)} issues ({_counts(result)}).")
+
+        # Issues of the incident types are the incidents of the DORA metrics.
+        incident_data = [
+            {
+                "id": issue["key"],
+                "created_date": as_datetime(issue["created"]),
+                "resolved_date": as_datetime(issue["resolved"]),
+                "service": (issue.get("components") or [None])[0],
+            } for issue in data if issue["issue_type"] in settings.INCIDENT_ISSUE_TYPES
+        ]
+        if incident_data:
+            # Only incidents that are new or whose created_date or service changed are attributed
+            # again by the next 'incident_attribution' task; the others keep their attribution.
+            stored = {
+                incident_id: ((as_datetime(created_date), service), attributed_at)
+                for incident_id, created_date, service, attributed_at in session.execute(
+                    select(Incident.id, Incident.created_date, Incident.service, Incident.attributed_at)
+                    .where(Incident.id.in_([incident["id"] for incident in incident_data]))
+                )
+            }
+            for incident in incident_data:
+                attributed_on, attributed_at = stored.get(incident["id"], (None, None))
+                unchanged = attributed_on == (incident["created_date"], incident["service"])
+                incident["attributed_at"] = attributed_at if unchanged else None
+            bulk_upsert(session, DoraPendingDay, pending_days(incident["created_date"] for incident in incident_data), commit=False)
+            result = bulk_upsert(session, Incident, incident_data)
+            logger.info(f"Upserted {len(incident_data)} incidents ({_counts(result)}).")
+
+def process_jenkins_data(session: Session, data):
+    """Processes and stores Jenkins builds and the commits they contain."""
+    if data:
+        build_data = [
+            {
+                "id": build["id"],
+                "job_name": build["job_name"],
+                "number": build["number"],
+                "status": build["status"],
+                "start_time": build["start_time"],
+                "finish_time": build["finish_time"],
+                "duration_millis": build["duration_millis"],
+            } for build in data
+        ]
+        result = bulk_upsert(session, Build, build_data)
+        logger.info(f"Upserted {len(build_data)} builds ({_counts(result)}).")
+
+        # build_commits references commits, so only link commits that have already been collected.
+        shas = {sha for build in data for sha in build.get("commit_shas", [])}
+        known_shas = set()
+        if shas:
+            known_shas = {row[0] for row in session.query(Commit.sha).filter(Commit.sha.in_(shas))}
+        build_commit_data = [
+            {"build_id": build["id"], "commit_sha": sha}
+            for build in data for sha in build.get("commit_shas", []) if sha in known_shas
+        ]
+        if build_commit_data:
+            bulk_upsert(session, BuildCommit, build_commit_data)
+            logger.info(f"Upserted {len(build_commit_data)} build commits.")
+
+        # Successful runs of deployment jobs are deployments of their newest commit.
+        deployment_data = [
+            {
+                "id": build["id"],
+                "commit_sha": build["commit_shas"][-1] if build.get("commit_shas") else None,
+                "start_time": build["start_time"],
+                "finish_time": build["finish_time"],
+            } for build in data if build.get("is_deployment") and build["status"] == "SUCCESS"
+        ]
+        if deployment_data:
+            bulk_upsert(session, DoraPendingDay, pending_days(deployment["finish_time"] for deployment in deployment_data), commit=False)
+            bulk_upsert(session, Deployment, deployment_data)
+            logger.info(f"Upserted {len(deployment_data)} deployments.")
+
+def seed_jenkins_watermark(session: Session, job_name: Optional[str] = None, job_pattern: Optional[str] = None, **params) -> Optional[str]:
+    """
+    Starting point for a Jenkins job without a stored watermark: the highest
+    build number already in the builds table, so a new or reset watermark
+    store does not re-fetch every build. Multi-job collections get a JSON
+    object of job name -> build number, like their watermark.
+    """
+    query = session.query(Build.job_name, func.max(Build.number)).group_by(Build.job_name)
+    if job_name:
+        row = query.filter(Build.job_name == job_name).first()
+        return str(row[1]) if row and row[1] is not None else None
+    latest = {name: number for name, number in query if number is not None and (not job_pattern or re.search(job_pattern, name))}
+    return json.dumps(latest, sort_keys=True) if latest else None
+
+def process_sonarqube_data(session: Session, data):
+    """Processes and stores SonarQube quality metrics."""
+    if data:
+        result = bulk_upsert(session, CodeQualityMetric, data, index_elements=["analysis_date", "project_key", "metric_name"])
+        logger.info(f"Upserted {len(data)} code quality metrics ({_counts(result)}).")
+
+def process_profiling_data(session: Session, chunk):
+    """
+    Stores one ProfilingChunk (see connectors/profiling_connector.py): its
+    samples, their rollups and the file's new cursor, in one transaction, so
+    a chunk is either fully ingested or ingested again by the next run.
+
+    Runs of the profiling job may overlap, so the file is locked for the
+    transaction and the chunk is skipped unless the stored cursor is still
+    the one it continues from: another run ingested those bytes already.
+    """
+    watermarks = WatermarkStore(session)
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _lock_key('profiling', chunk.path)})
+    if watermarks.get('profiling', chunk.path) != chunk.previous:
+        session.rollback()
+        logger.warning(f"{chunk.path} [{chunk.start}:{chunk.end}] was ingested by another run. Skipping it.")
+        return
+    if chunk.replaced:
+        # The old samples are taken out of the rollups by their own aggregates: rebuilding the buckets
+        # from osp_metrics would also drop the samples of other files already purged by the raw retention.
+        old_samples = (
+            select(OspMetric.timestamp, OspMetric.device_id, OspMetric.metric_name, OspMetric.metric_value)
+            .where(OspMetric.source == chunk.path)
+            .execution_options(yield_per=50_000)
+        )
+        old_rollups, old_bins = aggregate(session.execute(old_samples).mappings())
+        deleted = session.execute(delete(OspMetric).where(OspMetric.source == chunk.path)).rowcount
+        subtract_rollups(session, old_rollups, old_bins)
+        logger.warning(f"Deleted {deleted} samples of the earlier version of {chunk.path}.")
+    if chunk.rows:
+        bulk_insert(session, OspMetric, SAMPLE_COLUMNS, chunk.rows, commit=False)
+        merge_rollups(session, chunk.rollups, chunk.bins)
+    watermarks.set('profiling', chunk.path, chunk.cursor, commit=False)
+    session.commit()
+    logger.info(f"Inserted {len(chunk.rows)} samples from {chunk.path} [{chunk.start}:{chunk.end}].")
+
+def _lock_key(source: str, key: str) -> int:
+    """Advisory lock key (a signed 64-bit integer) of one watermark."""
+    return int.from_bytes(hashlib.sha1(f"{source}:{key}".encode()).digest()[:8], "big", signed=True)
+
+def _file_cursors(session: Session, source: str) -> Optional[str]:
+    """The per-file cursors of a file-based source, as a JSON object of path -> cursor."""
+    cursors = WatermarkStore(session).items(source)
+    cursors.pop('*', None)
+    return json.dumps(cursors, sort_keys=True) if cursors else None
+
+def seed_profiling_watermark(session: Session, **params) -> Optional[str]:
+    return _file_cursors(session, 'profiling')
+
+def process_vts_data(session: Session, data):
+    """
+    Stores VTS run summaries and the cursors of the files they were parsed
+    from in one transaction, so a file is never skipped before its run is stored.
+    """
+    if data:
+        runs = [record["run"] for record in data if record["run"]]
+        if runs:
+            result = bulk_upsert(session, VtsRun, runs, commit=False)
+            logger.info(f"Upserted {len(runs)} VTS runs ({_counts(result)}).")
+        WatermarkStore(session).set_many('vts', {record["path"]: record["cursor"] for record in data}, commit=False)
+        session.commit()
+
+def seed_vts_watermark(session: Session, **params) -> Optional[str]:
+    return _file_cursors(session, 'vts')
@@ -3,6 +3,8 @@ from sma_collector.connectors.collector import BaseCollector
 
 CONNECTOR_REGISTRY: Dict[str, Type[BaseCollector]] = {}
 PROCESSOR_REGISTRY: Dict[str, Callable] = {}
+WATERMARK_SEED_REGISTRY: Dict[str, Callable] = {}
+TASK_REGISTRY: Dict[str, Callable] = {}
 
 def register_connector(source: str, connector_class: Type[BaseCollector]):
     """Registers a connector class for a given source."""
@@ -11,3 +13,11 @@ def register_connector(source: str, connector_class: Type[BaseCollector]):
 def register_processor(source: str, processor_function: Callable):
     """Registers a data processing function for a given source."""
     PROCESSOR_REGISTRY[source] = processor_function
+
+def register_watermark_seed(source: str, seed_function: Callable):
+    """Registers a function that derives a starting watermark from stored data for a given source."""
+    WATERMARK_SEED_REGISTRY[source] = seed_function
+
+def register_task(name: str, task_function: Callable):
+    """Registers a maintenance task, run by workers for jobs that carry a 'task' instead of collecting."""
+    TASK_REGISTRY[name] = task_function
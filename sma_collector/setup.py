@@ -17,8 +17,10 @@ setup(
         "pydantic-settings",
         "GitPython",
         "PyGithub",
-        "atlassian-python-api",
+        "aiohttp",
         "jira",
+        "python-jenkins",
+        "python-sonarqube-api",
         "requests",
         "SQLAlchemy",
         "fastapi",
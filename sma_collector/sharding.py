@@ -0,0 +1,157 @@
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from sma_collector.config import Settings
+
+# A job message is a dict with:
+#   source   - registry key of the connector/processor pair
+#   shard    - human readable shard name (for logs only)
+#   settings - optional Settings overrides used to build the connector
+#   params   - optional keyword arguments passed to connector.collect()
+
+def repo_slug(repo_url: str) -> str:
+    """Builds a filesystem-safe 'owner_repo' name from a repository URL."""
+    parts = repo_url.rstrip('/').replace(':', '/').split('/')
+    return '_'.join(parts[-2:]).replace('.git', '')
+
+def plan_git_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """One job per repository in GIT_REPO_URLS, or a single job for GIT_REPO_PATH."""
+    if not settings.GIT_REPO_URLS:
+        return [{'source': 'git'}]
+    return [
+        {
+            'source': 'git',
+            'shard': repo_slug(url),
+            'settings': {
+                'GIT_REPO_URL': url,
+                'GIT_REPO_PATH': os.path.join(settings.GIT_REPOS_DIR, repo_slug(url)),
+            },
+        }
+        for url in settings.GIT_REPO_URLS
+    ]
+
+def plan_github_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """One job per GitHub repository."""
+    if not settings.GIT_REPO_URLS:
+        return [{'source': 'github'}]
+    return [
+        {'source': 'github', 'shard': repo_slug(url), 'settings': {'GIT_REPO_URL': url}}
+        for url in settings.GIT_REPO_URLS
+        if "github.com" in url
+    ]
+
+def jira_windows(start: date, end: date, window_days: int) -> List[Dict[str, Optional[str]]]:
+    """
+    Splits [start, end] into created-date windows.
+
+    The first window is open to the past and the last one to the future,
+    so together the windows always cover every issue of the project.
+    """
+    bounds = []
+    current = start
+    while current <= end:
+        bounds.append(current)
+        current += timedelta(days=window_days)
+
+    windows = []
+    previous = None
+    for bound in bounds + [None]:
+        windows.append({
+            'created_after': previous.isoformat() if previous else None,
+            'created_before': bound.isoformat() if bound else None,
+        })
+        previous = bound
+    return windows
+
+def plan_jira_jobs(settings: Settings, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """One job per created-date window, or a single job when windowing is disabled."""
+    if settings.JIRA_SHARD_WINDOW_DAYS <= 0 or not settings.JIRA_SHARD_START_DATE:
+        return [{'source': 'jira'}]
+    today = today or date.today()
+    return [
+        {
+            'source': 'jira',
+            'shard': f"{window['created_after'] or '*'}..{window['created_before'] or '*'}",
+            'params': window,
+        }
+        for window in jira_windows(settings.JIRA_SHARD_START_DATE, today, settings.JIRA_SHARD_WINDOW_DAYS)
+    ]
+
+def plan_jenkins_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """
+    One job per Jenkins job name, plus one job for the jobs matching
+    DEPLOYMENT_JOB_NAME_PATTERN, which the worker resolves and collects in parallel.
+    """
+    if not settings.JENKINS_HOST:
+        return []
+    job_names = list(settings.JENKINS_JOB_NAMES)
+    if settings.JENKINS_JOB_NAME and settings.JENKINS_JOB_NAME not in job_names:
+        job_names.insert(0, settings.JENKINS_JOB_NAME)
+    jobs = [
+        {'source': 'jenkins', 'shard': name, 'params': {'job_name': name}}
+        for name in job_names
+    ]
+    if settings.DEPLOYMENT_JOB_NAME_PATTERN:
+        pattern = settings.DEPLOYMENT_JOB_NAME_PATTERN
+        jobs.append({'source': 'jenkins', 'shard': f'pattern:{pattern}', 'params': {'job_pattern': pattern}})
+    return jobs
+
+def plan_sonarqube_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """One job per SonarQube project."""
+    if not (settings.SONARQUBE_HOST and settings.SONARQUBE_TOKEN):
+        return []
+    project_keys = list(settings.SONARQUBE_PROJECT_KEYS)
+    if settings.SONARQUBE_PROJECT_KEY and settings.SONARQUBE_PROJECT_KEY not in project_keys:
+        project_keys.insert(0, settings.SONARQUBE_PROJECT_KEY)
+    return [
+        {'source': 'sonarqube', 'shard': key, 'params': {'project_key': key}}
+        for key in project_keys
+    ]
+
+def plan_profiling_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """
+    One job for all profiling files: the connector already parses them in
+    parallel processes and keeps a cursor per file.
+    """
+    if not settings.PROFILING_DATA_PATH:
+        return []
+    return [{'source': 'profiling'}]
+
+def plan_vts_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """One job for all VTS result files, which the connector spreads over parsing processes."""
+    if not settings.VTS_RESULTS_PATH:
+        return []
+    return [{'source': 'vts'}]
+
+def plan_maintenance_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """
+    The creation of the coming osp_metrics partitions, when profiling data
+    (their only source) is collected; retention of osp_metrics samples and
+    rollups, when any is configured; and the update of the deployment index,
+    the attribution of incidents and the refresh of the DORA metrics days
+    changed by collection, when Jenkins (the source of deployments) is. Days changed by jobs still running are
+    refreshed by the next dispatch.
+    """
+    jobs = []
+    if settings.PROFILING_DATA_PATH:
+        jobs.append({'source': 'maintenance', 'task': 'osp_metrics_partitions'})
+    if settings.OSP_METRICS_RAW_RETENTION_DAYS or settings.OSP_ROLLUP_RETENTION_DAYS:
+        jobs.append({'source': 'maintenance', 'task': 'osp_metrics_retention'})
+    if settings.JENKINS_HOST:
+        jobs.append({'source': 'maintenance', 'task': 'deployment_index'})
+        jobs.append({'source': 'maintenance', 'task': 'incident_attribution'})
+        jobs.append({'source': 'maintenance', 'task': 'dora_metrics'})
+    return jobs
+
+def plan_jobs(settings: Settings) -> List[Dict[str, Any]]:
+    """Splits collection into independent shard jobs for all configured sources."""
+    return (
+        plan_git_jobs(settings)
+        + plan_github_jobs(settings)
+        + plan_jira_jobs(settings)
+        + plan_jenkins_jobs(settings)
+        + plan_sonarqube_jobs(settings)
+        + plan_profiling_jobs(settings)
+        + plan_vts_jobs(settings)
+        + plan_maintenance_jobs(settings)
+    )
@@ -1,15 +1,15 @@
 import logging
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
 from sma_collector.config import settings
+from sma_collector.database.engines import get_engine
 from sma_collector.models.models import Base
 
 logger = logging.getLogger(__name__)
 
 class Database:
     def __init__(self, db_url: str = settings.DATABASE_URL):
-        self.engine = create_engine(db_url)
+        self.engine = get_engine(db_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
 
     def init_db(self):
@@ -0,0 +1,46 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from sma_collector.database.models import CollectionWatermark, bulk_upsert
+
+logger = logging.getLogger(__name__)
+
+class WatermarkStore:
+    """
+    Persists per-source collection cursors (last commit sha, last updated
+    timestamp, last build number, ...) so that each run only fetches deltas.
+    Values are stored as strings; each collector decides how to interpret them.
+    """
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get(self, source: str, key: str) -> Optional[str]:
+        row = self.session.get(CollectionWatermark, (source, key))
+        return row.value if row else None
+
+    def items(self, source: str) -> Dict[str, str]:
+        """All of a source's stored values by key, e.g. per-file cursors."""
+        rows = self.session.query(CollectionWatermark.watermark_key, CollectionWatermark.value)
+        return dict(rows.filter(CollectionWatermark.source == source))
+
+    def set(self, source: str, key: str, value: str, commit: bool = True):
+        """Stores a value; with commit=False it is part of the caller's transaction, e.g. with the data it covers."""
+        bulk_upsert(self.session, CollectionWatermark, [{
+            "source": source,
+            "watermark_key": key,
+            "value": str(value),
+            "updated_at": datetime.now(timezone.utc),
+        }], commit=commit)
+        logger.info(f"Watermark {source}/{key} advanced to {value}.")
+
+    def set_many(self, source: str, values: Dict[str, str], commit: bool = True):
+        """Stores many keys of one source with a single upsert, e.g. the cursors of a batch of files."""
+        if not values:
+            return
+        now = datetime.now(timezone.utc)
+        bulk_upsert(self.session, CollectionWatermark, [
+            {"source": source, "watermark_key": key, "value": str(value), "updated_at": now}
+            for key, value in values.items()
+        ], commit=commit)
+        logger.info(f"Stored {len(values)} {source} watermarks.")
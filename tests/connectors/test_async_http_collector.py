@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+import pytest
+from aiohttp import web
+from sma_collector.connectors.async_http_collector import AsyncHTTPCollector
+from sma_collector.connectors.http_cache import ResponseCache
+from sma_collector.connectors.rate_limiter import RateLimiter
+
+class EchoCollector(AsyncHTTPCollector):
+    def collect(self):
+        return []
+
+@pytest.fixture
+def slow_server():
+    """Runs a local HTTP server whose pages take 0.2s each."""
+    state = {'connections': set(), 'full_responses': 0}
+
+    async def page(request):
+        state['connections'].add(request.transport.get_extra_info('peername'))
+        await asyncio.sleep(0.2)
+        start = int(request.query.get('start', 0))
+        return web.json_response({'start': start, 'isLastPage': start >= 300})
+
+    async def versioned(request):
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304, headers={'ETag': '"v1"'})
+        state['full_responses'] += 1
+        return web.json_response({'project': request.query['project']}, headers={'ETag': '"v1"'})
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get('/pages', page)
+    app.router.add_get('/versioned', versioned)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{port}", state
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=1)
+
+def test_fetch_all_runs_requests_concurrently(slow_server):
+    """Test that N requests take about one round trip, not N."""
+    base_url, _ = slow_server
+    collector = EchoCollector(base_url, max_concurrency=8)
+
+    started = time.monotonic()
+    pages = collector.run(collector.fetch_all([('/pages', {'start': i}) for i in range(8)]))
+    elapsed = time.monotonic() - started
+    collector.close()
+
+    assert [p['start'] for p in pages] == list(range(8))
+    assert elapsed < 1.0
+
+def test_iter_offset_pages_stops_at_last_page_and_reuses_connections(slow_server):
+    """Test windowed offset paging over a pooled keep-alive session."""
+    base_url, state = slow_server
+    collector = EchoCollector(base_url, max_connections=4, max_concurrency=4)
+
+    async def read_pages():
+        return [page async for page in collector.iter_offset_pages(
+            '/pages', {}, page_size=100, is_last_page=lambda page: page['isLastPage'], window=2)]
+
+    pages = collector.run(read_pages())
+    collector.close()
+
+    assert [p['start'] for p in pages] == [0, 100, 200, 300]
+    assert len(state['connections']) <= 2
+
+def test_fetch_json_revalidates_cached_responses(slow_server, tmp_path):
+    """Test that unchanged documents are served from the cache after a 304."""
+    base_url, state = slow_server
+    cache = ResponseCache(str(tmp_path / "http.sqlite"))
+    collector = EchoCollector(base_url, auth=('user', 'token'), response_cache=cache)
+
+    first = collector.run(collector.fetch_json('/versioned', {'project': 'a b'}))
+    second = collector.run(collector.fetch_json('/versioned', {'project': 'a b'}))
+    collector.close()
+
+    assert first == second == {'project': 'a b'}
+    assert state['full_responses'] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_rate_limit_slot_is_awaited_before_taking_a_concurrency_slot(slow_server):
+    """Test that requests waiting for their rate-limit slot do not hold one of max_concurrency."""
+    base_url, _ = slow_server
+    collector = EchoCollector(base_url, max_concurrency=1)
+    held = []
+
+    class RecordingLimiter(RateLimiter):
+        def reserve(self, key):
+            held.append(collector._semaphore.locked())
+            return super().reserve(key)
+
+    collector.rate_limiter = RecordingLimiter()
+    collector.run(collector.fetch_all([('/pages', {'start': i}) for i in range(3)]))
+    collector.close()
+
+    assert held == [False, False, False]
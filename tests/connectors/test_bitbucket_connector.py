@@ -1,57 +1,137 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock
+from datetime import datetime, timezone
+from sma_collector.config import Settings
 from sma_collector.connectors.bitbucket_connector import BitbucketConnector
 
 class TestBitbucketConnector(unittest.TestCase):
 
-    @patch('sma_collector.connectors.bitbucket_connector.Bitbucket')
-    def test_collect_pull_requests_success(self, mock_bitbucket):
+    @patch.object(BitbucketConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_pull_requests_success(self, mock_fetch_json):
         # Mock the Bitbucket API response
-        mock_api = MagicMock()
-        mock_bitbucket.return_value = mock_api
-        mock_api.get_pull_requests.return_value = [
-            {
-                "id": 1,
-                "title": "Test PR 1",
-                "author": {"user": {"displayName": "User1"}},
-                "createdDate": "2023-01-01T12:00:00Z",
-                "mergedDate": "2023-01-02T12:00:00Z",
-                "state": "MERGED"
-            },
-            {
-                "id": 2,
-                "title": "Test PR 2",
-                "author": {"user": {"displayName": "User2"}},
-                "createdDate": "2023-01-03T12:00:00Z",
-                "mergedDate": None,
-                "state": "OPEN"
-            }
-        ]
+        mock_fetch_json.return_value = {
+            "isLastPage": True,
+            "values": [
+                {
+                    "id": 1,
+                    "title": "Test PR 1",
+                    "author": {"user": {"displayName": "User1"}},
+                    "createdDate": 1672574400000,
+                    "closedDate": 1672660800000,
+                    "state": "MERGED"
+                },
+                {
+                    "id": 2,
+                    "title": "Test PR 2",
+                    "author": {"user": {"displayName": "User2"}},
+                    "createdDate": 1672747200000,
+                    "state": "OPEN"
+                }
+            ]
+        }
 
         # Initialize the connector and collect data
-        connector = BitbucketConnector()
+        connector = BitbucketConnector(Settings(HTTP_PAGE_WINDOW=1))
         reviews = connector.collect_pull_requests(project_key="PROJ", repository_slug="repo")
+        connector.close()
 
         # Assertions
         self.assertEqual(len(reviews), 2)
         self.assertEqual(reviews[0]['pr_number'], 1)
         self.assertEqual(reviews[0]['author'], 'User1')
+        self.assertEqual(reviews[0]['created_date'], datetime(2023, 1, 1, 12, 0, tzinfo=timezone.utc))
+        self.assertEqual(reviews[0]['merged_date'], datetime(2023, 1, 2, 12, 0, tzinfo=timezone.utc))
         self.assertEqual(reviews[1]['state'], 'OPEN')
-        mock_api.get_pull_requests.assert_called_once_with("PROJ", "repo", state="ALL")
+        self.assertIsNone(reviews[1]['merged_date'])
+        mock_fetch_json.assert_called_once_with(
+            "/rest/api/1.0/projects/PROJ/repos/repo/pull-requests", {"state": "ALL", "start": 0, "limit": 100}
+        )
+
+    @patch.object(BitbucketConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_pull_requests_fetches_page_window(self, mock_fetch_json):
+        # Three pages exist; a window of four is requested at once and the fourth is ignored
+        def page(start, last):
+            return {"isLastPage": last, "values": [{
+                "id": start, "title": "PR", "author": {"user": {"displayName": "User"}},
+                "createdDate": 0, "state": "OPEN"
+            }]}
+
+        async def fake_fetch_json(path, params):
+            start = params["start"]
+            return page(start, last=start >= 200)
+
+        mock_fetch_json.side_effect = fake_fetch_json
 
-    @patch('sma_collector.connectors.bitbucket_connector.Bitbucket')
-    def test_collect_pull_requests_api_error(self, mock_bitbucket):
+        connector = BitbucketConnector(Settings(HTTP_PAGE_WINDOW=4))
+        reviews = connector.collect_pull_requests(project_key="PROJ", repository_slug="repo")
+        connector.close()
+
+        self.assertEqual([r['pr_number'] for r in reviews], [0, 100, 200])
+        self.assertEqual(mock_fetch_json.call_count, 4)
+
+    @patch.object(BitbucketConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_pull_requests_api_error(self, mock_fetch_json):
         # Mock the Bitbucket API to raise an exception
-        mock_api = MagicMock()
-        mock_bitbucket.return_value = mock_api
-        mock_api.get_pull_requests.side_effect = Exception("API Error")
+        import aiohttp
+        mock_fetch_json.side_effect = aiohttp.ClientError("API Error")
 
         # Initialize the connector and collect data
         connector = BitbucketConnector()
         reviews = connector.collect_pull_requests(project_key="PROJ", repository_slug="repo")
+        connector.close()
 
         # Assertions
         self.assertEqual(len(reviews), 0)
 
+    @patch.object(BitbucketConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_review_activity_only_for_updated_pull_requests_with_activity(self, mock_fetch_json):
+        # PR 1 has comments, PR 2 has neither comments nor reviews, PR 3 was not updated since the last run
+        def pr(pr_id, updated, comment_count=0, reviewer_status="UNAPPROVED"):
+            return {"id": pr_id, "title": "PR", "author": {"user": {"displayName": "Author"}},
+                    "createdDate": 1672574400000, "updatedDate": updated, "state": "OPEN",
+                    "properties": {"commentCount": comment_count}, "reviewers": [{"status": reviewer_status}]}
+
+        activities = {"isLastPage": True, "values": [
+            {"action": "COMMENTED", "createdDate": 1672578000000, "user": {"displayName": "Author"}},
+            {"action": "APPROVED", "createdDate": 1672581600000, "user": {"displayName": "Reviewer"}},
+            {"action": "COMMENTED", "createdDate": 1672585200000, "user": {"displayName": "Reviewer"}},
+        ]}
+
+        async def fake_fetch_json(path, params):
+            if path.endswith("/activities"):
+                return activities
+            return {"isLastPage": True, "values": [
+                pr(1, 1672700000000, comment_count=2), pr(2, 1672700000000), pr(3, 1672600000000, reviewer_status="APPROVED"),
+            ]}
+
+        mock_fetch_json.side_effect = fake_fetch_json
+
+        connector = BitbucketConnector(Settings(HTTP_PAGE_WINDOW=1, BITBUCKET_REPOSITORIES=["PROJ/repo"]))
+        reviews = connector.collect(since="2023-01-02T00:00:00+00:00")
+        connector.close()
+
+        self.assertEqual([r['pr_number'] for r in reviews], [1, 2])
+        activity_paths = [c.args[0] for c in mock_fetch_json.call_args_list if c.args[0].endswith("/activities")]
+        self.assertEqual(activity_paths, ["/rest/api/1.0/projects/PROJ/repos/repo/pull-requests/1/activities"])
+        self.assertEqual(reviews[0]['first_comment_date'], datetime(2023, 1, 1, 15, 0, tzinfo=timezone.utc))
+        self.assertEqual(reviews[0]['time_to_first_review_minutes'], 120)
+        self.assertEqual(reviews[0]['comment_count'], 2)
+        self.assertEqual((reviews[1]['comment_count'], reviews[1]['time_to_first_review_minutes']), (0, None))
+        self.assertEqual(connector.watermark, "2023-01-02T22:53:20+00:00")
+
+    @patch.object(BitbucketConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_pull_requests_of_one_repository_keeps_server_watermark(self, mock_fetch_json):
+        mock_fetch_json.return_value = {"isLastPage": True, "values": [
+            {"id": 1, "title": "PR", "author": {"user": {"displayName": "Author"}}, "createdDate": 1672574400000,
+             "updatedDate": 1672700000000, "state": "OPEN", "properties": {}, "reviewers": []},
+        ]}
+
+        connector = BitbucketConnector(Settings())
+        reviews = connector.collect_pull_requests("PROJ", "repo")
+        connector.close()
+
+        self.assertEqual(len(reviews), 1)
+        self.assertIsNone(connector.watermark)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+import threading
+import pytest
+from sma_collector.connectors.collector import BaseCollector, chunked, prefetch_batches
+
+class ListCollector(BaseCollector):
+    def __init__(self, records):
+        self.records = records
+
+    def collect(self):
+        return self.records
+
+def test_default_iter_batches_adapts_collect():
+    """Test that collectors implementing only collect() still stream in batches."""
+    collector = ListCollector([{"id": i} for i in range(5)])
+
+    batches = list(collector.iter_batches(batch_size=2))
+
+    assert batches == [[{"id": 0}, {"id": 1}], [{"id": 2}, {"id": 3}], [{"id": 4}]]
+
+def test_chunked_empty():
+    """Test that an empty source yields no batches."""
+    assert list(chunked([], 10)) == []
+
+def test_prefetch_batches_preserves_order():
+    """Test that prefetching yields every batch in order."""
+    batches = [[{"id": i}] for i in range(10)]
+
+    assert list(prefetch_batches(iter(batches), depth=2)) == batches
+
+def test_prefetch_batches_reraises_source_errors():
+    """Test that an error in the source surfaces in the consumer."""
+    def failing_batches():
+        yield [{"id": 1}]
+        raise RuntimeError("source failed")
+
+    consumed = []
+    with pytest.raises(RuntimeError, match="source failed"):
+        for batch in prefetch_batches(failing_batches()):
+            consumed.append(batch)
+    assert consumed == [[{"id": 1}]]
+
+def test_prefetch_batches_closes_source_when_consumer_stops_early():
+    """Test that a consumer stopping early stops the producer and closes the source."""
+    closed = threading.Event()
+
+    def endless_batches():
+        try:
+            i = 0
+            while True:
+                yield [{"id": i}]
+                i += 1
+        finally:
+            closed.set()
+
+    prefetched = prefetch_batches(endless_batches(), depth=2)
+    first = next(prefetched)
+    prefetched.close()
+
+    assert first == [{"id": 0}]
+    assert closed.wait(timeout=1)
@@ -0,0 +1,105 @@
+import subprocess
+from unittest.mock import patch
+import pytest
+from git import GitCommandError
+from sma_collector.config import Settings
+from sma_collector.connectors.diff_stat_cache import DiffStatCache, iter_git_log_cached
+from sma_collector.connectors.git_log import iter_git_log, iter_numstat, parse_log_record
+from sma_collector.connectors.local_git_connector import LocalGitConnector
+
+def git(repo_dir, *args):
+    subprocess.run(['git', '-C', str(repo_dir), *args], check=True, capture_output=True)
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """Creates a small repository with a text change, a deletion and a binary file."""
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    git(repo_dir, 'init', '-q', '-b', 'main')
+    git(repo_dir, 'config', 'user.name', 'Test Author')
+    git(repo_dir, 'config', 'user.email', 'test@example.com')
+
+    (repo_dir / "a.txt").write_text("one\ntwo\nthree\n")
+    git(repo_dir, 'add', '.')
+    git(repo_dir, 'commit', '-q', '-m', 'Add a.txt')
+
+    (repo_dir / "a.txt").write_text("one\n2\n")
+    (repo_dir / "image.bin").write_bytes(b"\x00\x01\x02")
+    git(repo_dir, 'add', '.')
+    git(repo_dir, 'commit', '-q', '-m', 'Edit a.txt\n\nWith a body line.')
+    return repo_dir
+
+def test_iter_git_log_streams_commits_with_numstat(git_repo):
+    """Test that commits come newest first with their diff stats."""
+    commits = list(iter_git_log(str(git_repo), 'HEAD'))
+
+    assert [c['message'] for c in commits] == ['Edit a.txt\n\nWith a body line.', 'Add a.txt']
+    assert (commits[0]['lines_added'], commits[0]['lines_deleted'], commits[0]['files_changed']) == (1, 2, 2)
+    assert (commits[1]['lines_added'], commits[1]['lines_deleted'], commits[1]['files_changed']) == (3, 0, 1)
+    assert commits[0]['author_email'] == 'test@example.com'
+    assert commits[0]['authored_date'].tzinfo is not None
+
+def test_iter_git_log_respects_max_count_and_ranges(git_repo):
+    """Test that max_count and since..head ranges are passed through to git log."""
+    first, second = [c['sha'] for c in iter_git_log(str(git_repo), 'HEAD')][::-1]
+
+    assert [c['sha'] for c in iter_git_log(str(git_repo), 'HEAD', max_count=1)] == [second]
+    assert [c['sha'] for c in iter_git_log(str(git_repo), f'{first}..{second}')] == [second]
+
+def test_iter_git_log_raises_on_git_errors(git_repo):
+    """Test that a failing git log surfaces as GitCommandError."""
+    with pytest.raises(GitCommandError):
+        list(iter_git_log(str(git_repo), 'no-such-branch'))
+
+def test_parse_log_record_handles_commits_without_files():
+    """Test that merge and empty commits parse with zero stats."""
+    record = "abc\x1fName\x1fname@example.com\x1f2025-01-01T12:00:00+09:00\x1fMerge branch 'x'\n\x1f\n"
+
+    commit = parse_log_record(record)
+
+    assert commit['sha'] == 'abc'
+    assert (commit['lines_added'], commit['lines_deleted'], commit['files_changed']) == (0, 0, 0)
+
+def test_local_git_connector_uses_cli_backend(git_repo):
+    """Test that LocalGitConnector fills diff stats with the default backend."""
+    connector = LocalGitConnector(Settings(GIT_REPO_PATH=str(git_repo)))
+
+    commits = connector.collect()
+
+    assert len(commits) == 2
+    assert commits[0]['files_changed'] == 2
+    assert connector.watermark == commits[0]['sha']
+
+def test_diff_stat_cache_only_diffs_unseen_commits(git_repo, tmp_path):
+    """Test that cached commits are not diffed again and totals match the uncached backend."""
+    # Arrange
+    cache = DiffStatCache(str(tmp_path / "stats.sqlite"))
+    expected = list(iter_git_log(str(git_repo), 'HEAD'))
+
+    # Act
+    first = list(iter_git_log_cached(str(git_repo), 'HEAD', None, cache))
+    with patch('sma_collector.connectors.diff_stat_cache.iter_numstat') as mock_numstat:
+        second = list(iter_git_log_cached(str(git_repo), 'HEAD', None, cache))
+
+    # Assert
+    assert first == expected
+    assert second == expected
+    mock_numstat.assert_not_called()
+    assert cache.stats() == {"hits": 2, "misses": 2, "commits": 2}
+    assert cache.file_stats(expected[0]['sha']) == [("a.txt", 1, 2), ("image.bin", None, None)]
+
+def test_diff_stat_cache_survives_rewritten_history(git_repo, tmp_path):
+    """Test that after a force-push only the new commit is diffed, and the stats stay per sha."""
+    # Arrange
+    cache = DiffStatCache(str(tmp_path / "stats.sqlite"))
+    list(iter_git_log_cached(str(git_repo), 'HEAD', None, cache))
+    git(git_repo, 'commit', '-q', '--amend', '-m', 'Rewritten')
+
+    # Act
+    with patch('sma_collector.connectors.diff_stat_cache.iter_numstat', wraps=iter_numstat) as spy:
+        commits = list(iter_git_log_cached(str(git_repo), 'HEAD', None, cache))
+
+    # Assert
+    assert spy.call_args[0][1] == [commits[0]['sha']]
+    assert (commits[0]['lines_added'], commits[0]['files_changed']) == (1, 2)
+    assert cache.stats()['commits'] == 3
@@ -1,6 +1,10 @@
 import pytest
+import requests
 from unittest.mock import MagicMock, patch
-# from sma_collector.connectors.github_connector import GitHubConnector
+from datetime import datetime, timezone
+from github import Auth, Github, GithubException, UnknownObjectException
+from sma_collector.connectors.github_connector import CONNECTION_CLASS_ATTRIBUTE, GitHubConnector, _install_connector_adapter
+from sma_collector.connectors.http_cache import CachingHTTPAdapter
 from sma_collector.config import Settings
 
 @pytest.fixture
@@ -21,6 +25,7 @@ def test_github_connector_collect(mock_github, mock_settings):
     mock_pr.user.login = "testuser"
     mock_pr.created_at = "2025-01-01T12:00:00Z"
     mock_pr.merged_at = "2025-01-01T13:00:00Z"
+    mock_pr.updated_at = datetime(2025, 1, 1, 13, 0, tzinfo=timezone.utc)
     mock_pr.state = "closed"
 
     mock_repo = MagicMock()
@@ -29,6 +34,7 @@ def test_github_connector_collect(mock_github, mock_settings):
 
     mock_github_instance = MagicMock()
     mock_github_instance.get_repo.return_value = mock_repo
+    mock_github_instance.requester.graphql_query.return_value = ({}, {"data": {"repository": {"pr1": None}}})
     mock_github.return_value = mock_github_instance
 
     connector = GitHubConnector(mock_settings)
@@ -43,3 +49,100 @@ def test_github_connector_collect(mock_github, mock_settings):
     assert pull_requests[0]['author'] == "testuser"
     mock_github_instance.get_repo.assert_called_once_with("fake/repo")
     mock_repo.get_pulls.assert_called_once_with(state='all', sort='created', direction='desc')
+
+def make_pull(number, author="author", created="2025-01-01T12:00:00Z", merged=None):
+    pr = MagicMock()
+    pr.number = number
+    pr.user.login = author
+    pr.created_at = datetime.fromisoformat(created.replace("Z", "+00:00"))
+    pr.merged_at = merged
+    pr.updated_at = pr.created_at
+    return pr
+
+@patch('sma_collector.connectors.github_connector.Github')
+def test_review_activity_is_fetched_in_graphql_batches(mock_github):
+    """Test that comments and reviews of many pull requests are fetched per GraphQL query and summarized."""
+    # Arrange
+    pulls = [make_pull(1, merged=datetime(2025, 1, 2, 12, 0, tzinfo=timezone.utc)), make_pull(2), make_pull(3)]
+    mock_repo = MagicMock()
+    mock_repo.get_pulls.return_value = pulls
+    client = mock_github.return_value
+    client.get_repo.return_value = mock_repo
+    client.requester.graphql_query.side_effect = [
+        ({}, {"data": {"repository": {
+            "pr1": {
+                "comments": {"totalCount": 3, "nodes": [
+                    {"createdAt": "2025-01-01T12:10:00Z", "author": {"login": "author"}},
+                    {"createdAt": "2025-01-01T13:00:00Z", "author": {"login": "reviewer"}},
+                    {"createdAt": "2025-01-01T14:00:00Z", "author": None},
+                ]},
+                "reviews": {"nodes": [
+                    {"submittedAt": "2025-01-01T12:30:00Z", "author": {"login": "reviewer"}, "comments": {"totalCount": 2}},
+                    {"submittedAt": None, "author": {"login": "other"}, "comments": {"totalCount": 0}},
+                ]},
+            },
+            "pr2": {"comments": {"totalCount": 0, "nodes": []}, "reviews": {"nodes": []}},
+        }}}),
+        ({}, {"data": {"repository": {"pr3": None}}}),
+    ]
+    connector = GitHubConnector(Settings(GIT_REPO_URL="https://github.com/fake/repo.git", GITHUB_TOKEN="fake_token",
+                                         GITHUB_REVIEW_ACTIVITY_BATCH=2))
+
+    # Act
+    first_batch = next(connector.iter_batches(batch_size=3))
+    client.requester.graphql_query.side_effect = GithubException(502, {"message": "Bad Gateway"}, {})
+    failed_batch = next(connector.iter_batches(batch_size=3))
+
+    # Assert
+    assert client.requester.graphql_query.call_count == 4
+    query = client.requester.graphql_query.call_args_list[0][0][0]
+    assert "pr1: pullRequest(number: 1)" in query and "pr2: pullRequest(number: 2)" in query and "pr3" not in query
+    pr1, pr2, pr3 = first_batch
+    assert pr1["first_comment_date"] == datetime(2025, 1, 1, 13, 0, tzinfo=timezone.utc)
+    assert (pr1["time_to_first_review_minutes"], pr1["time_to_merge_minutes"], pr1["comment_count"]) == (30, 1440, 5)
+    assert (pr2["first_comment_date"], pr2["time_to_first_review_minutes"], pr2["comment_count"]) == (None, None, 0)
+    assert "comment_count" not in pr3
+    assert "comment_count" not in failed_batch[0]
+
+@patch('sma_collector.connectors.github_connector.Github')
+def test_review_activity_keeps_partial_results_of_failed_queries(mock_github):
+    """Test that a deleted pull request or a transport error only leaves the pull requests it concerns without activity."""
+    # Arrange
+    mock_repo = MagicMock()
+    mock_repo.get_pulls.return_value = [make_pull(1, created="2025-01-03T12:00:00Z"), make_pull(2, created="2025-01-02T12:00:00Z"),
+                                        make_pull(3, created="2025-01-01T12:00:00Z")]
+    client = mock_github.return_value
+    client.get_repo.return_value = mock_repo
+    empty = {"comments": {"totalCount": 1, "nodes": []}, "reviews": {"nodes": []}}
+    client.requester.graphql_query.side_effect = [
+        UnknownObjectException(404, {"data": {"repository": {"pr1": empty, "pr2": None}},
+                                     "errors": [{"type": "NOT_FOUND", "message": "Could not resolve to a PullRequest"}]}, {}),
+        requests.ConnectionError("connection reset"),
+    ]
+    connector = GitHubConnector(Settings(GIT_REPO_URL="https://github.com/fake/repo.git", GITHUB_TOKEN="fake_token",
+                                         GITHUB_REVIEW_ACTIVITY_BATCH=2))
+
+    # Act
+    (pr1, pr2, pr3), = list(connector.iter_batches(batch_size=3))
+
+    # Assert
+    assert pr1["comment_count"] == 1
+    assert "comment_count" not in pr2
+    assert "comment_count" not in pr3
+    # pr3's query failed, so the next run reads again from its updated_at.
+    assert connector.watermark == "2025-01-01T12:00:00+00:00"
+
+def test_connector_adapter_is_mounted_on_pygithub_connections(tmp_path):
+    """Guards the PyGithub pin: the private connection class attribute replaced per client must still exist and be used."""
+    # Arrange
+    client = Github(auth=Auth.Token("fake_token"))
+    settings = Settings(HTTP_CACHE_PATH=str(tmp_path / "cache"))
+
+    # Act
+    _install_connector_adapter(client, settings)
+    connection_class = getattr(client.requester, CONNECTION_CLASS_ATTRIBUTE)
+    connection = connection_class("api.github.com", 443, retry=None, pool_size=None, timeout=15)
+
+    # Assert
+    assert isinstance(connection.session.get_adapter("https://api.github.com/repos"), CachingHTTPAdapter)
+    assert getattr(Github(auth=Auth.Token("fake_token")).requester, CONNECTION_CLASS_ATTRIBUTE) is not connection_class
@@ -0,0 +1,94 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from sma_collector.connectors.http_cache import ResponseCache, mount_response_cache
+
+@pytest.fixture
+def etag_server():
+    """Runs a local HTTP server that honours If-None-Match for /doc."""
+    state = {'full_responses': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.send_header('ETag', '"v1"')
+                self.send_header('X-RateLimit-Remaining', '4999')
+                self.end_headers()
+                return
+            state['full_responses'] += 1
+            body = b'{"value": 1}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', '"v1"')
+            self.send_header('X-RateLimit-Remaining', '5000')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", state
+    server.shutdown()
+
+def test_caching_adapter_serves_304_from_cache(etag_server, tmp_path):
+    """Test that a revalidated response returns the cached body with fresh headers."""
+    # Arrange
+    base_url, state = etag_server
+    cache = ResponseCache(str(tmp_path / "http.sqlite"))
+    session = requests.Session()
+    mount_response_cache(session, cache)
+
+    # Act
+    first = session.get(f"{base_url}/doc")
+    second = session.get(f"{base_url}/doc")
+
+    # Assert
+    assert first.json() == second.json() == {"value": 1}
+    assert second.status_code == 200
+    assert second.headers['X-RateLimit-Remaining'] == '4999'
+    assert state['full_responses'] == 1
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_cache_keys_include_credentials(etag_server, tmp_path):
+    """Test that responses fetched with one credential are not revalidated with another."""
+    base_url, state = etag_server
+    cache = ResponseCache(str(tmp_path / "http.sqlite"))
+    session = requests.Session()
+    mount_response_cache(session, cache)
+
+    session.get(f"{base_url}/doc", auth=('alice', 'secret'))
+    session.get(f"{base_url}/doc", auth=('bob', 'secret'))
+
+    assert state['full_responses'] == 2
+    assert cache.hits == 0
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    """Test that the cache stays within max_bytes by dropping the oldest entries."""
+    # Arrange
+    cache = ResponseCache(str(tmp_path / "http.sqlite"), max_bytes=10)
+    cache.put("a", "http://x/a", {"ETag": '"a"'}, b"12345")
+    cache.put("b", "http://x/b", {"ETag": '"b"'}, b"12345")
+    cache.record_hit("a")
+
+    # Act
+    cache.put("c", "http://x/c", {"ETag": '"c"'}, b"12345")
+
+    # Assert
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.evictions == 1
+    assert cache.stats()["bytes"] == 10
+
+def test_cache_skips_responses_without_validators(tmp_path):
+    """Test that responses that cannot be revalidated are not stored."""
+    cache = ResponseCache(str(tmp_path / "http.sqlite"))
+
+    cache.put("a", "http://x/a", {"Content-Type": "application/json"}, b"{}")
+
+    assert cache.get("a") is None
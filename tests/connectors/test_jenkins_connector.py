@@ -0,0 +1,150 @@
+import json
+import jenkins
+import pytest
+from unittest.mock import patch
+from sma_collector.connectors.jenkins_connector import JenkinsConnector
+from sma_collector.config import Settings
+
+@pytest.fixture
+def mock_settings():
+    """Fixture for mock settings with Jenkins configuration."""
+    return Settings(
+        JENKINS_HOST="https://jenkins.example.com",
+        JENKINS_JOB_NAME="build",
+        DEPLOYMENT_JOB_NAME_PATTERN="^deploy",
+    )
+
+def build_info(number, building=False, commits=()):
+    return {
+        "number": number,
+        "url": f"https://jenkins.example.com/job/build/{number}/",
+        "result": None if building else "SUCCESS",
+        "building": building,
+        "timestamp": 1735689600000,
+        "duration": 60000,
+        "changeSet": {"items": [{"commitId": sha} for sha in commits]},
+    }
+
+@patch('sma_collector.connectors.jenkins_connector.jenkins.Jenkins')
+def test_collect_uses_single_tree_query(mock_jenkins, mock_settings):
+    """Test that builds and their commits come from one projected job query."""
+    # Arrange
+    server = mock_jenkins.return_value
+    server.server = "https://jenkins.example.com/"
+    server.jenkins_open.return_value = json.dumps({"builds": [build_info(3, building=True), build_info(2, commits=["abc"]), build_info(1)]})
+
+    # Act
+    connector = JenkinsConnector(mock_settings)
+    builds = connector.collect(job_name="build", since="1")
+
+    # Assert
+    url = server.jenkins_open.call_args[0][0].url
+    assert url.startswith("https://jenkins.example.com/job/build/api/json?tree=builds[number,url,result,building")
+    assert '{0,100}' in url
+    server.get_build_info.assert_not_called()
+    assert [build["number"] for build in builds] == [3, 2]
+    assert builds[1]["commit_shas"] == ["abc"]
+    assert builds[1]["is_deployment"] is False
+    # Build 3 is still running, so the next run starts after build 2.
+    assert connector.watermark == "2"
+
+@patch('sma_collector.connectors.jenkins_connector.jenkins.Jenkins')
+def test_collect_falls_back_to_per_build_requests(mock_jenkins, mock_settings):
+    """Test that a failing tree query falls back to concurrent per-build requests."""
+    # Arrange
+    server = mock_jenkins.return_value
+    server.server = "https://jenkins.example.com/"
+    server.jenkins_open.side_effect = jenkins.JenkinsException("tree not supported")
+    server.get_job_info.return_value = {"builds": [{"number": 2}, {"number": 1}]}
+    server.get_build_info.side_effect = lambda job_name, number: build_info(number)
+
+    # Act
+    connector = JenkinsConnector(mock_settings)
+    builds = connector.collect(job_name="build")
+
+    # Assert
+    assert sorted(call.args[1] for call in server.get_build_info.call_args_list) == [1, 2]
+    assert [build["number"] for build in builds] == [2, 1]
+    assert connector.watermark == "2"
+
+@patch('sma_collector.connectors.jenkins_connector.jenkins.Jenkins')
+def test_collect_job_pattern_fans_out_with_per_job_watermarks(mock_jenkins, mock_settings):
+    """Test that pattern jobs are collected together and tracked per job."""
+    # Arrange
+    server = mock_jenkins.return_value
+    server.get_all_jobs.return_value = [
+        {"fullname": "build", "color": "blue"},
+        {"fullname": "deploy-prod", "color": "blue"},
+        {"fullname": "deploy-stage", "color": "red"},
+        {"fullname": "deploy-folder"},
+    ]
+    server.server = "https://jenkins.example.com/"
+    builds_by_job = {"deploy-prod": [build_info(5, commits=["old", "new"])], "deploy-stage": []}
+    server.jenkins_open.side_effect = lambda request: json.dumps(
+        {"builds": builds_by_job[request.url.split('/')[4]]}
+    )
+
+    # Act
+    connector = JenkinsConnector(mock_settings)
+    builds = connector.collect(job_pattern="^deploy", since=json.dumps({"deploy-stage": 7}))
+
+    # Assert
+    assert connector.watermark_key(job_pattern="^deploy") == "pattern:^deploy"
+    assert server.jenkins_open.call_count == 2
+    assert [(build["job_name"], build["number"], build["is_deployment"]) for build in builds] == [("deploy-prod", 5, True)]
+    assert json.loads(connector.watermark) == {"deploy-prod": 5, "deploy-stage": 7}
+
+@patch('sma_collector.connectors.jenkins_connector.jenkins.Jenkins')
+def test_tree_query_url_quotes_folder_segments(mock_jenkins, mock_settings):
+    """Test that jobs in folders get one quoted job/ segment per level."""
+    # Arrange
+    server = mock_jenkins.return_value
+    server.server = "https://jenkins.example.com/ci"
+    server.jenkins_open.return_value = json.dumps({"builds": []})
+
+    # Act
+    JenkinsConnector(mock_settings).collect(job_name="team a/deploy#1")
+
+    # Assert
+    url = server.jenkins_open.call_args[0][0].url
+    assert url.startswith("https://jenkins.example.com/ci/job/team%20a/job/deploy%231/api/json?tree=")
+
+@patch('sma_collector.connectors.jenkins_connector.jenkins.Jenkins')
+def test_tree_query_pages_back_to_the_watermark(mock_jenkins, mock_settings):
+    """Test that more builds than max_builds since the watermark are all collected, one range per query."""
+    # Arrange
+    server = mock_jenkins.return_value
+    server.server = "https://jenkins.example.com/"
+    newest_first = [build_info(number) for number in range(10, 0, -1)]
+    def jenkins_open(request):
+        start, end = map(int, request.url.rsplit('{', 1)[1].rstrip('}').split(','))
+        return json.dumps({"builds": newest_first[start:end]})
+    server.jenkins_open.side_effect = jenkins_open
+
+    # Act
+    connector = JenkinsConnector(mock_settings)
+    builds = connector.collect(job_name="build", max_builds=3, since="3")
+
+    # Assert
+    assert [build["number"] for build in builds] == [10, 9, 8, 7, 6, 5, 4]
+    assert server.jenkins_open.call_count == 3
+    assert connector.watermark == "10"
+
+@patch('sma_collector.connectors.jenkins_connector.jenkins.Jenkins')
+def test_per_build_requests_read_all_builds_back_to_the_watermark(mock_jenkins, mock_settings):
+    """Test that allBuilds is listed when the job's newest builds do not reach the watermark."""
+    # Arrange
+    server = mock_jenkins.return_value
+    mock_settings.JENKINS_FETCH_MODE = "per_build"
+    server.get_job_info.side_effect = lambda name, fetch_all_builds=False: {
+        "builds": [{"number": number} for number in range(10, 0 if fetch_all_builds else 7, -1)]
+    }
+    server.get_build_info.side_effect = lambda job_name, number: build_info(number)
+
+    # Act
+    connector = JenkinsConnector(mock_settings)
+    builds = connector.collect(job_name="build", max_builds=2, since="5")
+
+    # Assert
+    assert sorted(build["number"] for build in builds) == [6, 7, 8, 9, 10]
+    assert connector.watermark == "10"
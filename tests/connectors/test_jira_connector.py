@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import MagicMock, patch
 from jira.exceptions import JIRAError
-from sma_collector.connectors.jira_connector import JiraCollector
+from sma_collector.connectors.jira_connector import JiraCollector, JIRA_FIELDS
 from sma_collector.config import Settings
 
 @pytest.fixture
@@ -67,4 +67,100 @@ def test_collect_jira_issues_api_error(mock_jira_client, mock_settings):
     collector = JiraCollector(mock_settings)
     issues = collector.collect()
 
-    assert len(issues) == 0
\ No newline at end of file
+    assert len(issues) == 0
+
+@patch('sma_collector.connectors.jira_connector.JIRA')
+def test_collect_jira_issues_since_watermark(mock_jira_client, mock_settings):
+    """
+    Test that a watermark restricts the JQL to recently updated issues and
+    that the newest updated timestamp becomes the next watermark.
+    """
+    mock_jira_instance = mock_jira_client.return_value
+    mock_jira_instance.myself.return_value = {'timeZone': 'UTC'}
+
+    mock_issue1 = MagicMock()
+    mock_issue1.key = 'PROJ-1'
+    mock_issue1.fields.updated = '2025-01-02T10:00:00.000+0000'
+    mock_issue2 = MagicMock()
+    mock_issue2.key = 'PROJ-2'
+    mock_issue2.fields.updated = '2025-01-03T09:30:00.000+0000'
+    mock_jira_instance.search_issues.side_effect = [[mock_issue1, mock_issue2], []]
+
+    collector = JiraCollector(mock_settings)
+    issues = collector.collect(since='2025-01-01T12:00:00.000+0000')
+
+    jql = mock_jira_instance.search_issues.call_args_list[0][0][0]
+    assert jql == 'project = PROJ AND updated >= "2025-01-01 12:00" ORDER BY updated ASC'
+    assert len(issues) == 2
+    assert collector.watermark == '2025-01-03T09:30:00.000+0000'
+
+@patch('sma_collector.connectors.jira_connector.JIRA')
+def test_collect_jira_issues_parallel_projected(mock_jira_client):
+    """
+    Test that parallel mode reads the total from the first page, fetches the
+    remaining page ranges with projected fields and keeps page order.
+    """
+    settings = Settings(JIRA_PROJECT_KEY='PROJ', JIRA_FETCH_MODE='parallel', JIRA_PAGE_SIZE=2, JIRA_FETCH_WORKERS=2)
+    mock_jira_instance = mock_jira_client.return_value
+
+    def raw_issue(n):
+        return {"key": f"PROJ-{n}", "fields": {
+            "summary": f"Issue {n}", "status": {"name": "Done"}, "issuetype": {"name": "Bug"},
+            "reporter": {"displayName": "Reporter"}, "assignee": None,
+            "created": "2025-01-01T00:00:00.000+0000", "updated": f"2025-01-0{n}T00:00:00.000+0000",
+            "resolutiondate": None,
+        }}
+
+    def search_issues(jql, startAt, maxResults, **kwargs):
+        return {"total": 5, "issues": [raw_issue(n) for n in range(startAt + 1, min(startAt + maxResults, 5) + 1)]}
+
+    mock_jira_instance.search_issues.side_effect = search_issues
+
+    collector = JiraCollector(settings)
+    issues = collector.collect()
+
+    assert [issue['key'] for issue in issues] == ['PROJ-1', 'PROJ-2', 'PROJ-3', 'PROJ-4', 'PROJ-5']
+    assert issues[0]['assignee'] == 'N/A'
+    assert sorted(c.kwargs['startAt'] for c in mock_jira_instance.search_issues.call_args_list) == [0, 2, 4]
+    for c in mock_jira_instance.search_issues.call_args_list:
+        assert c.kwargs['fields'] == JIRA_FIELDS
+        assert c.kwargs['json_result'] is True
+        assert 'description' not in c.kwargs['fields']
+    assert collector.watermark == '2025-01-05T00:00:00.000+0000'
+
+@patch('sma_collector.connectors.jira_connector.JIRA')
+def test_incremental_pages_requery_from_last_updated(mock_jira_client):
+    """
+    Test that an incremental crawl re-queries from the last updated time
+    instead of paging by offset, so an issue updated mid-crawl cannot
+    shift another one out of the pages.
+    """
+    settings = Settings(JIRA_PROJECT_KEY='PROJ', JIRA_FETCH_MODE='parallel', JIRA_PAGE_SIZE=2)
+    mock_jira_instance = mock_jira_client.return_value
+    mock_jira_instance.myself.return_value = {'timeZone': 'UTC'}
+
+    def raw_issue(key, updated):
+        return {"key": key, "fields": {"summary": key, "status": {"name": "Open"}, "issuetype": {"name": "Bug"},
+                                       "created": "2025-01-01T00:00:00.000+0000", "updated": updated}}
+
+    issues_by_updated = [raw_issue(f"PROJ-{n}", f"2025-01-0{n}T00:00:00.000+0000") for n in range(1, 5)]
+
+    def search_issues(jql, startAt, maxResults, **kwargs):
+        lower = jql.split('updated >= "')[1][:16]
+        matching = [raw for raw in issues_by_updated if raw["fields"]["updated"][:16].replace('T', ' ') >= lower]
+        page = matching[startAt:startAt + maxResults]
+        if len(mock_jira_instance.search_issues.call_args_list) == 1:
+            # PROJ-1 is updated after the first page was read: it moves to the end.
+            issues_by_updated.append(raw_issue("PROJ-1", "2025-01-09T00:00:00.000+0000"))
+            del issues_by_updated[0]
+        return {"issues": page}
+
+    mock_jira_instance.search_issues.side_effect = search_issues
+
+    collector = JiraCollector(settings)
+    issues = collector.collect(since='2025-01-01T00:00:00.000+0000')
+
+    assert [issue['key'] for issue in issues] == ['PROJ-1', 'PROJ-2', 'PROJ-3', 'PROJ-4', 'PROJ-1']
+    assert all(c.kwargs['startAt'] == 0 for c in mock_jira_instance.search_issues.call_args_list)
+    assert collector.watermark == '2025-01-09T00:00:00.000+0000'
+    mock_jira_instance.myself.assert_called_once()
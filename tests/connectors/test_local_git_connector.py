@@ -5,10 +5,11 @@ from sma_collector.config import Settings
 
 @pytest.fixture
 def mock_settings():
-    """Fixture for mock settings."""
+    """Fixture for mock settings using the GitPython backend."""
     return Settings(
         GIT_REPO_PATH="/fake/repo",
-        GIT_REPO_URL="https://github.com/fake/repo.git"
+        GIT_REPO_URL="https://github.com/fake/repo.git",
+        GIT_LOG_BACKEND="gitpython"
     )
 
 @patch('sma_collector.connectors.local_git_connector.Repo')
@@ -37,3 +38,69 @@ def test_local_git_connector_collect(mock_repo, mock_settings):
     assert commits[0]['sha'] == "12345"
     assert commits[0]['author_name'] == "Test Author"
     mock_repo_instance.iter_commits.assert_called_once_with('HEAD', max_count=1000)
+
+@patch('sma_collector.connectors.local_git_connector.Repo')
+def test_local_git_connector_iter_batches(mock_repo, mock_settings):
+    """Test that iter_batches streams commits in bounded batches."""
+    # Arrange
+    mock_commits = []
+    for i in range(5):
+        mock_commit = MagicMock()
+        mock_commit.hexsha = f"sha{i}"
+        mock_commit.message = "Test commit"
+        mock_commits.append(mock_commit)
+
+    mock_repo_instance = MagicMock()
+    mock_repo_instance.iter_commits.return_value = iter(mock_commits)
+    mock_repo.return_value = mock_repo_instance
+
+    connector = LocalGitConnector(mock_settings)
+
+    # Act
+    batches = list(connector.iter_batches(batch_size=2))
+
+    # Assert
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[2][0]['sha'] == "sha4"
+
+@patch('sma_collector.connectors.local_git_connector.Repo')
+def test_local_git_connector_collects_only_new_commits(mock_repo, mock_settings):
+    """Test that a stored watermark limits collection to commits after it."""
+    # Arrange
+    mock_commit = MagicMock()
+    mock_commit.hexsha = "newsha"
+    mock_commit.message = "New commit"
+
+    mock_repo_instance = MagicMock()
+    mock_repo_instance.commit.return_value.hexsha = "newsha"
+    mock_repo_instance.is_ancestor.return_value = True
+    mock_repo_instance.iter_commits.return_value = [mock_commit]
+    mock_repo.return_value = mock_repo_instance
+
+    connector = LocalGitConnector(mock_settings)
+
+    # Act
+    commits = connector.collect(since="oldsha")
+
+    # Assert
+    assert [c['sha'] for c in commits] == ["newsha"]
+    mock_repo_instance.iter_commits.assert_called_once_with("oldsha..newsha", max_count=None)
+    assert connector.watermark == "newsha"
+
+@patch('sma_collector.connectors.local_git_connector.Repo')
+def test_local_git_connector_full_walk_after_force_push(mock_repo, mock_settings):
+    """Test that an unreachable watermark falls back to a full walk."""
+    # Arrange
+    mock_repo_instance = MagicMock()
+    mock_repo_instance.commit.return_value.hexsha = "newsha"
+    mock_repo_instance.is_ancestor.return_value = False
+    mock_repo_instance.iter_commits.return_value = []
+    mock_repo.return_value = mock_repo_instance
+
+    connector = LocalGitConnector(mock_settings)
+
+    # Act
+    connector.collect(since="rewrittensha")
+
+    # Assert
+    mock_repo_instance.iter_commits.assert_called_once_with('HEAD', max_count=1000)
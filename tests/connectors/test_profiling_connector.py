@@ -0,0 +1,166 @@
+import json
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings
+from sma_collector.connectors.profiling_connector import ProfilingConnector, line_ranges
+from sma_collector.database.migrations import migrate
+from sma_collector.database.models import OspMetric, OspMetricRollup, OspMetricRollupBin
+from sma_collector.processors import process_batches, process_profiling_data, seed_profiling_watermark
+
+CSV_HEADER = "timestamp,device_id,metric_name,metric_value\n"
+
+def csv_lines(start, count):
+    return "".join(f"2025-03-01T00:{i // 60:02d}:{i % 60:02d}Z,dev-1,cpu,{i}\n" for i in range(start, start + count))
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sma.db'}")
+    migrate(engine)
+    with Session(engine) as session:
+        yield session
+
+def run(session, connector):
+    """What the worker does for a profiling job."""
+    return process_batches(session, process_profiling_data, connector.iter_batches(since=seed_profiling_watermark(session)))
+
+def test_line_ranges_end_after_newlines_and_leave_partial_line():
+    # Arrange
+    data = b"aaaa\nbb\ncccccccccc\ndd\npartial"
+
+    # Act
+    ranges = line_ranges(data, 0, len(data), 6)
+
+    # Assert
+    assert ranges == [(0, 5), (5, 8), (8, 19), (19, 22)]
+
+def test_ingests_new_bytes_of_each_file_once(session, tmp_path):
+    # Arrange
+    root = tmp_path / "profiling"
+    (root / "dev-2").mkdir(parents=True)
+    (root / "run.csv").write_text(CSV_HEADER + csv_lines(0, 100) + "2025-03-01T01:00:00Z,dev-1,cpu")
+    (root / "dev-2" / "trace.jsonl").write_text("\n".join(json.dumps(
+        {"timestamp": 1740787200 + i, "device_id": "dev-2", "metric_name": "fps", "metric_value": 60}
+    ) for i in range(10)) + "\nnot json\n")
+    (root / "notes.txt").write_text("ignored")
+    connector = ProfilingConnector(Settings(PROFILING_DATA_PATH=str(root), PROFILING_CHUNK_BYTES=1000, PROFILING_PARSE_WORKERS=0))
+
+    # Act
+    first = run(session, connector)
+    second = run(session, connector)
+    with open(root / "run.csv", "a") as f:
+        f.write(",0.5\n" + csv_lines(100, 20))
+    third = run(session, connector)
+
+    # Assert
+    assert (first, second, third) == (110, 0, 21)
+    assert session.scalar(select(func.count()).select_from(OspMetric)) == 131
+    rollup = session.execute(select(OspMetricRollup).where(
+        OspMetricRollup.resolution == 3600, OspMetricRollup.device_id == "dev-1",
+        OspMetricRollup.bucket_start == datetime(2025, 3, 1))).scalar_one()
+    assert rollup.sample_count == 120 and rollup.value_max == 119
+    cursors = json.loads(seed_profiling_watermark(session))
+    assert set(cursors) == {"run.csv", "dev-2/trace.jsonl"}
+    assert json.loads(cursors["run.csv"])["offset"] == (root / "run.csv").stat().st_size
+
+def test_rewritten_file_replaces_its_samples(session, tmp_path):
+    # Arrange
+    root = tmp_path / "profiling"
+    root.mkdir()
+    (root / "run.csv").write_text(CSV_HEADER + csv_lines(0, 10))
+    connector = ProfilingConnector(Settings(PROFILING_DATA_PATH=str(root), PROFILING_PARSE_WORKERS=0))
+    run(session, connector)
+
+    # Act
+    (root / "run.csv").write_text(CSV_HEADER + csv_lines(50, 5))
+    count = run(session, connector)
+
+    # Assert
+    assert count == 5
+    values = session.scalars(select(OspMetric.metric_value).order_by(OspMetric.metric_value)).all()
+    assert values == [50, 51, 52, 53, 54]
+    rollups = session.execute(select(OspMetricRollup.resolution, OspMetricRollup.sample_count, OspMetricRollup.value_min)
+                              .order_by(OspMetricRollup.resolution)).all()
+    assert rollups == [(60, 5, 50), (3600, 5, 50), (86400, 5, 50)]
+
+def test_rewritten_file_keeps_rollups_of_samples_purged_from_raw_storage(session, tmp_path):
+    # Arrange
+    root = tmp_path / "profiling"
+    root.mkdir()
+    (root / "a.csv").write_text(CSV_HEADER + csv_lines(0, 10))
+    (root / "b.csv").write_text(CSV_HEADER + "".join(f"2025-03-01T00:00:0{i}Z,dev-1,cpu,{100 + i}\n" for i in range(5)))
+    connector = ProfilingConnector(Settings(PROFILING_DATA_PATH=str(root), PROFILING_PARSE_WORKERS=0))
+    run(session, connector)
+    # What the raw retention leaves of b.csv: its rollups only.
+    session.execute(OspMetric.__table__.delete().where(OspMetric.source == "b.csv"))
+    session.commit()
+
+    # Act
+    (root / "a.csv").write_text(CSV_HEADER + csv_lines(50, 5))
+    run(session, connector)
+
+    # Assert
+    rollups = session.execute(select(OspMetricRollup.resolution, OspMetricRollup.sample_count, OspMetricRollup.value_sum,
+                                     OspMetricRollup.value_min, OspMetricRollup.value_max)
+                              .order_by(OspMetricRollup.resolution)).all()
+    assert rollups == [(60, 10, 770, 50, 104), (3600, 10, 770, 50, 104), (86400, 10, 770, 50, 104)]
+    bin_counts = session.execute(select(OspMetricRollupBin.resolution, func.sum(OspMetricRollupBin.sample_count))
+                                 .group_by(OspMetricRollupBin.resolution)).all()
+    assert sorted(bin_counts) == [(60, 10), (3600, 10), (86400, 10)]
+    assert session.scalar(select(func.min(OspMetricRollupBin.sample_count))) > 0
+
+def test_file_rewritten_with_only_its_header_is_emptied_once(session, tmp_path):
+    # Arrange
+    root = tmp_path / "profiling"
+    root.mkdir()
+    (root / "run.csv").write_text(CSV_HEADER + csv_lines(0, 10))
+    connector = ProfilingConnector(Settings(PROFILING_DATA_PATH=str(root), PROFILING_PARSE_WORKERS=0))
+    run(session, connector)
+
+    # Act
+    (root / "run.csv").write_text(CSV_HEADER)
+    emptied = list(connector.iter_batches(since=seed_profiling_watermark(session)))
+    process_batches(session, process_profiling_data, emptied)
+    again = list(connector.iter_batches(since=seed_profiling_watermark(session)))
+
+    # Assert
+    assert [(len(chunk), chunk.replaced) for chunk in emptied] == [(0, True)]
+    assert again == []
+    assert session.scalar(select(func.count()).select_from(OspMetric)) == 0
+    assert session.scalar(select(func.count()).select_from(OspMetricRollup)) == 0
+
+def test_overlapping_runs_ingest_each_chunk_once(session, tmp_path):
+    # Arrange
+    root = tmp_path / "profiling"
+    root.mkdir()
+    (root / "run.csv").write_text(CSV_HEADER + csv_lines(0, 100))
+    connector = ProfilingConnector(Settings(PROFILING_DATA_PATH=str(root), PROFILING_CHUNK_BYTES=1000, PROFILING_PARSE_WORKERS=0))
+    since = seed_profiling_watermark(session)
+    first, second = list(connector.iter_batches(since=since)), list(connector.iter_batches(since=since))
+
+    # Act
+    process_batches(session, process_profiling_data, first)
+    process_batches(session, process_profiling_data, second)
+
+    # Assert
+    assert len(first) > 1
+    assert session.scalar(select(func.count()).select_from(OspMetric)) == 100
+    assert json.loads(seed_profiling_watermark(session)) == {"run.csv": first[-1].cursor}
+
+def test_parses_ranges_in_worker_processes(tmp_path):
+    # Arrange
+    root = tmp_path / "profiling"
+    root.mkdir()
+    for name in ("a.csv", "b.csv"):
+        (root / name).write_text(CSV_HEADER + csv_lines(0, 200))
+    connector = ProfilingConnector(Settings(PROFILING_DATA_PATH=str(root), PROFILING_CHUNK_BYTES=2000, PROFILING_PARSE_WORKERS=2))
+
+    # Act
+    chunks = list(connector.iter_batches())
+
+    # Assert
+    assert len(chunks) > 2
+    assert [chunk.path for chunk in chunks] == sorted(chunk.path for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) == 400
+    assert chunks[0].rows[0][:4] == (datetime(2025, 3, 1, tzinfo=timezone.utc), "dev-1", "cpu", 0.0)
@@ -0,0 +1,116 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from sma_collector.connectors.http_cache import mount_response_cache
+from sma_collector.connectors.rate_limiter import RateLimiter, SqliteBucketStore, bucket_key
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+KEY = "api.github.com|anonymous"
+
+def test_unknown_hosts_are_not_throttled():
+    """Test that buckets are unlimited until the server reports limits."""
+    limiter = RateLimiter(clock=FakeClock())
+
+    assert [limiter.reserve(KEY) for _ in range(50)] == [0.0] * 50
+
+def test_remaining_quota_is_spread_until_reset():
+    """Test that X-RateLimit-Remaining/Reset turn into evenly spaced slots after the burst."""
+    # Arrange
+    clock = FakeClock()
+    limiter = RateLimiter(burst=2, clock=clock)
+
+    # Act: 100 requests left for the next 100 seconds
+    limiter.update(KEY, {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "100",
+                         "X-RateLimit-Reset": str(int(clock.now) + 100)}, 200)
+    delays = [limiter.reserve(KEY) for _ in range(4)]
+
+    # Assert
+    assert delays == pytest.approx([0.0, 0.0, 1.0, 2.0])
+
+def test_exhausted_quota_blocks_until_reset():
+    """Test that callers wait for the reset instead of sending doomed requests."""
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+
+    limiter.update(KEY, {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "0",
+                         "X-RateLimit-Reset": str(int(clock.now) + 30)}, 403)
+
+    assert limiter.reserve(KEY) >= 30
+
+def test_retry_after_blocks_bucket():
+    """Test that Retry-After on a 429 delays the next slot."""
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+
+    limiter.update(KEY, {"Retry-After": "7"}, 429)
+
+    assert limiter.reserve(KEY) == pytest.approx(7.0)
+    clock.now += 10
+    assert limiter.reserve(KEY) == 0.0
+
+def test_not_modified_responses_give_their_token_back():
+    """Test that a 304 revalidation does not use up a slot of the bucket."""
+    clock = FakeClock()
+    limiter = RateLimiter(burst=1, host_rates={"api.github.com": 1.0}, clock=clock)
+
+    first = limiter.reserve(KEY)
+    limiter.update(KEY, {}, 304)
+    second = limiter.reserve(KEY)
+    limiter.update(KEY, {}, 200)
+
+    assert (first, second, limiter.reserve(KEY)) == pytest.approx((0.0, 0.0, 1.0))
+
+def test_sqlite_store_shares_buckets_between_limiters(tmp_path):
+    """Test that limiters in different processes see the same bucket through the state file."""
+    # Arrange
+    clock = FakeClock()
+    path = str(tmp_path / "buckets.sqlite")
+    first = RateLimiter(SqliteBucketStore(path), burst=1, host_rates={"api.github.com": 1.0}, clock=clock)
+    second = RateLimiter(SqliteBucketStore(path), burst=1, host_rates={"api.github.com": 1.0}, clock=clock)
+
+    # Act
+    delays = [first.reserve(KEY), second.reserve(KEY), first.reserve(KEY)]
+
+    # Assert
+    assert delays == pytest.approx([0.0, 1.0, 2.0])
+
+def test_adapter_retries_after_429():
+    """Test that the adapter waits out Retry-After and retries the request."""
+    # Arrange
+    state = {"requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["requests"] += 1
+            status = 429 if state["requests"] == 1 else 200
+            self.send_response(status)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    session = requests.Session()
+    limiter = RateLimiter()
+    mount_response_cache(session, None, limiter)
+
+    # Act
+    url = f"http://127.0.0.1:{server.server_address[1]}/doc"
+    response = session.get(url)
+    server.shutdown()
+
+    # Assert
+    assert response.status_code == 200
+    assert state["requests"] == 2
+    assert bucket_key(url) == f"127.0.0.1:{server.server_address[1]}|anonymous"
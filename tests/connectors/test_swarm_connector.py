@@ -1,75 +1,122 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock
+import aiohttp
+from sma_collector.config import Settings
 from sma_collector.connectors.swarm_connector import SwarmConnector
-import requests
 
 class TestSwarmConnector(unittest.TestCase):
 
-    @patch('sma_collector.connectors.swarm_connector.requests.Session')
-    def test_collect_reviews_success(self, mock_session):
-        # Mock the Swarm API response
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
-            "reviews": [
-                {
-                    "id": 101,
-                    "projectName": "MyProject",
-                    "description": "Review 101",
-                    "author": "SwarmUser1",
-                    "created": "2023-02-01T10:00:00Z",
-                    "state": "needsReview"
-                },
-                {
-                    "id": 102,
-                    "projectName": "MyProject",
-                    "description": "Review 102",
-                    "author": "SwarmUser2",
-                    "created": "2023-02-02T11:00:00Z",
-                    "state": "approved"
-                }
-            ]
-        }
-        mock_response.raise_for_status.return_value = None
-
-        mock_api = MagicMock()
-        mock_api.get.return_value = mock_response
-        mock_session.return_value = mock_api
+    @patch.object(SwarmConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_reviews_success(self, mock_fetch_json):
+        # Mock the Swarm API responses: connection test, then one page of reviews
+        mock_fetch_json.side_effect = [
+            {"reviews": []},
+            {
+                "lastSeen": 102,
+                "reviews": [
+                    {
+                        "id": 101,
+                        "projectName": "MyProject",
+                        "description": "Review 101\nDetails",
+                        "author": "SwarmUser1",
+                        "created": "2023-02-01T10:00:00Z",
+                        "state": "needsReview"
+                    },
+                    {
+                        "id": 102,
+                        "projectName": "MyProject",
+                        "description": "Review 102",
+                        "author": "SwarmUser2",
+                        "created": "2023-02-02T11:00:00Z",
+                        "state": "approved"
+                    }
+                ]
+            },
+            {"lastSeen": None, "reviews": []},
+        ]
 
         # Initialize the connector and collect data
         connector = SwarmConnector()
         reviews = connector.collect_reviews()
+        connector.close()
 
         # Assertions
         self.assertEqual(len(reviews), 2)
         self.assertEqual(reviews[0]['pr_number'], 101)
+        self.assertEqual(reviews[0]['title'], 'Review 101')
         self.assertEqual(reviews[0]['author'], 'SwarmUser1')
         self.assertEqual(reviews[1]['state'], 'approved')
+        self.assertEqual(mock_fetch_json.call_args_list[2][0][1]['after'], 102)
 
-    @patch('sma_collector.connectors.swarm_connector.requests.Session')
-    def test_collect_reviews_api_error(self, mock_session):
-        # Mock the Swarm API to raise an exception during review collection
-        # but succeed during initialization.
-        mock_api = MagicMock()
-
-        # Successful connection test response
-        mock_init_response = MagicMock()
-        mock_init_response.raise_for_status.return_value = None
-
-        # Set up side_effect to handle multiple calls to get()
-        mock_api.get.side_effect = [
-            mock_init_response,  # First call in __init__
-            requests.exceptions.RequestException("API Error")  # Second call in collect_reviews
+    @patch.object(SwarmConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_reviews_api_error(self, mock_fetch_json):
+        # Succeed during initialization, then fail during review collection.
+        mock_fetch_json.side_effect = [
+            {"reviews": []},  # First call in __init__
+            aiohttp.ClientError("API Error")  # Second call in collect_reviews
         ]
-        mock_session.return_value = mock_api
 
         # Initialize the connector
         connector = SwarmConnector()
 
         # Collect data, which should now trigger the exception
         reviews = connector.collect_reviews()
+        connector.close()
 
         # Assertions
         self.assertEqual(len(reviews), 0)
 
+    @patch.object(SwarmConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_reviews_fetches_projects_concurrently(self, mock_fetch_json):
+        # Each project follows its own cursor chain
+        async def fake_fetch_json(path, params):
+            project = params.get("project[]")
+            if project is None:
+                return {"reviews": []}
+            return {"lastSeen": None, "reviews": [{"id": len(project), "projectName": project}]}
+
+        mock_fetch_json.side_effect = fake_fetch_json
+
+        connector = SwarmConnector(Settings(SWARM_PROJECTS=["alpha", "beta-project"]))
+        reviews = connector.collect_reviews()
+        connector.close()
+
+        self.assertEqual(sorted(r['repo_name'] for r in reviews), ["alpha", "beta-project"])
+
+    @patch.object(SwarmConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_collect_reviews_fetches_comments_of_updated_reviews(self, mock_fetch_json):
+        # Review 1 has comments, review 2 has none, review 3 was not updated since the last run
+        async def fake_fetch_json(path, params):
+            if path == "/api/v9/comments":
+                return {"comments": {
+                    "7": {"user": "author", "time": 1700000600},
+                    "8": {"user": "reviewer", "time": 1700003600},
+                }}
+            return {"lastSeen": None, "reviews": [
+                {"id": 1, "author": "author", "created": 1700000000, "updated": 1700005000, "comments": [1, 1]},
+                {"id": 2, "author": "author", "created": 1700000000, "updated": 1700005000, "comments": [0, 0]},
+                {"id": 3, "author": "author", "created": 1600000000, "updated": 1600000000, "comments": [4, 0]},
+            ]}
+
+        mock_fetch_json.side_effect = fake_fetch_json
+
+        connector = SwarmConnector()
+        reviews = connector.collect_reviews(since="2023-11-14T00:00:00+00:00")
+        connector.close()
+
+        self.assertEqual([r['pr_number'] for r in reviews], [1, 2])
+        comment_calls = [c.args[1] for c in mock_fetch_json.call_args_list if c.args[0] == "/api/v9/comments"]
+        self.assertEqual(comment_calls, [{"topic": "reviews/1", "max": 1000}])
+        self.assertEqual(reviews[0]['time_to_first_review_minutes'], 60)
+        self.assertEqual(reviews[0]['comment_count'], 2)
+        self.assertEqual(reviews[1]['comment_count'], 0)
+
+    @patch.object(SwarmConnector, 'fetch_json', new_callable=AsyncMock)
+    def test_connection_failure_raises(self, mock_fetch_json):
+        mock_fetch_json.side_effect = aiohttp.ClientError("Connection refused")
+
+        with self.assertRaises(aiohttp.ClientError):
+            SwarmConnector()
+
 if __name__ == '__main__':
     unittest.main()
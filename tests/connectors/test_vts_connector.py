@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings
+from sma_collector.connectors.vts_connector import VtsConnector, parse_result_file
+from sma_collector.database.migrations import migrate
+from sma_collector.database.models import VtsRun
+from sma_collector.processors import process_batches, process_vts_data, seed_vts_watermark
+
+def result_xml(start, passed, failed, plan="vts"):
+    tests = "".join(f'<Test result="pass" name="t{i}" />' for i in range(passed))
+    tests += "".join(f'<Test result="fail" name="f{i}"><Failure message="boom" /></Test>' for i in range(failed))
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<Result start="{start}" end="{start + 60000}" suite_plan="{plan}" devices="serial-1">'
+        f'<Build build_fingerprint="fp" /><Summary pass="{passed}" failed="{failed}" />'
+        f'<Module name="VtsHalTest" abi="arm64-v8a"><TestCase name="Case">{tests}</TestCase></Module>'
+        f'</Result>'
+    )
+
+def write(root, run_dir, content):
+    path = root / run_dir / "test_result.xml"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return path
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sma.db'}")
+    migrate(engine)
+    with Session(engine) as session:
+        yield session
+
+def run(session, connector):
+    """What the worker does for a vts job."""
+    return process_batches(session, process_vts_data, connector.iter_batches(since=seed_vts_watermark(session)))
+
+def test_parse_result_file_streams_counts_and_falls_back_to_summary(tmp_path):
+    # Arrange
+    write(tmp_path, "full", result_xml(1740823200000, 40, 10))
+    write(tmp_path, "summary-only", '<Result start="1740823200000" suite_plan="vts"><Summary pass="7" failed="3" /></Result>')
+
+    # Act
+    full = parse_result_file(str(tmp_path), "full/test_result.xml", 0, 0)
+    summary_only = parse_result_file(str(tmp_path), "summary-only/test_result.xml", 0, 0)
+    missing = parse_result_file(str(tmp_path), "missing/test_result.xml", 0, 0)
+
+    # Assert
+    assert (full["run"]["passed_tests"], full["run"]["failed_tests"], full["run"]["pass_rate"]) == (40, 10, 0.8)
+    assert full["run"]["id"] == "vts:serial-1:1740823200000"
+    assert len(full["cursor"]["sha256"]) == 64
+    assert (summary_only["run"]["total_tests"], summary_only["run"]["end_time"]) == (10, None)
+    assert "error" in missing
+
+def test_ingests_new_files_and_skips_known_ones(session, tmp_path):
+    # Arrange
+    root = tmp_path / "results"
+    write(root, "2025.03.01_10.00.00", result_xml(1740823200000, 3, 1))
+    broken = write(root, "2025.03.02_10.00.00", result_xml(1740909600000, 5, 0)[:-20])
+    connector = VtsConnector(Settings(VTS_RESULTS_PATH=str(root), VTS_PARSE_WORKERS=0))
+
+    # Act
+    first = run(session, connector)
+    second = run(session, connector)
+    broken.write_text(result_xml(1740909600000, 5, 0))
+    third = run(session, connector)
+
+    # Assert
+    assert (first, second, third) == (1, 0, 1)
+    runs = {run.run_name: run for run in session.scalars(select(VtsRun))}
+    assert set(runs) == {"2025.03.01_10.00.00", "2025.03.02_10.00.00"}
+    first_run = runs["2025.03.01_10.00.00"]
+    assert (first_run.total_tests, first_run.passed_tests, first_run.failed_tests, first_run.pass_rate) == (4, 3, 1, 0.75)
+    assert first_run.test_plan == "vts"
+    assert first_run.start_time.replace(tzinfo=timezone.utc) == datetime(2025, 3, 1, 10, 0, tzinfo=timezone.utc)
+
+def test_touched_file_is_read_again_but_only_stored_if_changed(session, tmp_path):
+    # Arrange
+    root = tmp_path / "results"
+    path = write(root, "run-1", result_xml(1740823200000, 2, 0))
+    connector = VtsConnector(Settings(VTS_RESULTS_PATH=str(root), VTS_PARSE_WORKERS=2))
+    run(session, connector)
+
+    # Act
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+    touched = list(connector.iter_results(seed_vts_watermark(session)))
+    run(session, connector)
+    unchanged = list(connector.iter_results(seed_vts_watermark(session)))
+    write(root, "run-1", result_xml(1740823200000, 2, 2))
+    write(root, "run-2", result_xml(1740909600000, 1, 0))
+    changed = list(connector.iter_results(seed_vts_watermark(session)))
+
+    # Assert
+    assert [record["run"] for record in touched] == [None]
+    assert unchanged == []
+    assert sorted(record["run"]["failed_tests"] for record in changed) == [0, 2]
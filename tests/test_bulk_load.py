@@ -0,0 +1,147 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from sma_collector.database.bulk_load import bulk_insert, bulk_upsert
+from sma_collector.database.dialects import apply_sqlite_pragmas
+from sma_collector.database.models import Commit, OspMetric
+
+def make_session(dialect):
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = dialect
+    return session
+
+def compiled(call):
+    return str(call.args[0].compile(dialect=postgresql.dialect()))
+
+@pytest.fixture
+def sqlite_session():
+    engine = apply_sqlite_pragmas(create_engine("sqlite://"), {"synchronous": "OFF"})
+    Commit.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+def test_bulk_upsert_executemany_on_sqlite(sqlite_session):
+    """SQLite upserts insert new rows and update only the loaded columns of existing ones."""
+    # Arrange
+    bulk_upsert(sqlite_session, Commit, [{"sha": "a" * 40, "author_name": "Alice", "message": "first"}])
+    records = [{"sha": f"{i:040x}", "message": f"commit {i}"} for i in range(6)] + [{"sha": "a" * 40, "message": "amended"}]
+
+    # Act
+    result = bulk_upsert(sqlite_session, Commit, records, chunk_size=4)
+
+    # Assert
+    assert result.method == "executemany"
+    assert result.rows == 7
+    assert sqlite_session.query(Commit).count() == 7
+    amended = sqlite_session.get(Commit, "a" * 40)
+    assert (amended.author_name, amended.message) == ("Alice", "amended")
+
+def test_bulk_upsert_chunks_executemany_calls():
+    """Each chunk is sent as an insert of new rows, then a guarded upsert of the rest, and committed once."""
+    # Arrange
+    session = make_session('postgresql')
+    records = [{"sha": f"{i:040x}", "message": f"commit {i}"} for i in range(25)]
+
+    # Act
+    result = bulk_upsert(session, Commit, records, chunk_size=10, copy_threshold=100)
+
+    # Assert
+    assert [len(call.args[1]) for call in session.execute.call_args_list] == [10, 10, 10, 10, 5, 5]
+    assert session.commit.call_count == 1
+    assert result.method == "executemany"
+    assert compiled(session.execute.call_args_list[0]).endswith("ON CONFLICT (sha) DO NOTHING RETURNING commits.sha")
+    assert compiled(session.execute.call_args_list[1]).endswith(
+        "ON CONFLICT (sha) DO UPDATE SET message = excluded.message"
+        " WHERE commits.message IS DISTINCT FROM excluded.message RETURNING commits.sha"
+    )
+
+def test_bulk_upsert_counts_and_skips_unchanged_rows(sqlite_session):
+    """Re-loading identical rows writes nothing; only changed rows are updated."""
+    # Arrange
+    records = [{"sha": f"{i:040x}", "message": f"commit {i}", "lines_added": i} for i in range(5)]
+    first = bulk_upsert(sqlite_session, Commit, records)
+    records[1] = {**records[1], "message": "reworded"}
+    records[3] = {**records[3], "lines_added": None}
+    records.append({"sha": "f" * 40, "message": "new", "lines_added": 1})
+
+    # Act
+    second = bulk_upsert(sqlite_session, Commit, records, chunk_size=2)
+    third = bulk_upsert(sqlite_session, Commit, records)
+
+    # Assert
+    assert (first.inserted, first.updated, first.unchanged) == (5, 0, 0)
+    assert (second.inserted, second.updated, second.unchanged) == (1, 2, 3)
+    assert (third.inserted, third.updated, third.unchanged) == (0, 0, 6)
+    assert sqlite_session.get(Commit, f"{3:040x}").lines_added is None
+
+def test_bulk_upsert_keeps_last_record_per_key(sqlite_session):
+    """A key repeated within a batch would make ON CONFLICT update one row twice."""
+    # Arrange
+    records = [{"sha": "a" * 40, "message": "old"}, {"sha": "b" * 40, "message": "b"}, {"sha": "a" * 40, "message": "new"}]
+
+    # Act
+    result = bulk_upsert(sqlite_session, Commit, records)
+
+    # Assert
+    assert result.rows == 2
+    assert sqlite_session.get(Commit, "a" * 40).message == "new"
+
+def test_bulk_upsert_copies_large_batches_into_staging_table():
+    """On PostgreSQL, large batches are COPYed into a staging table and merged with one statement."""
+    # Arrange
+    session = make_session('postgresql')
+    cursor = session.connection.return_value.connection.cursor.return_value
+    copied = []
+    cursor.copy_expert.side_effect = lambda sql, buffer: copied.append((sql, buffer.read()))
+    session.execute.return_value.one.return_value = (1, 2)
+    authored = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+    records = [
+        {"sha": "a" * 40, "message": "tab\there\nand a \\ backslash", "authored_date": authored},
+        {"sha": "b" * 40, "message": None, "authored_date": authored},
+    ]
+
+    # Act
+    result = bulk_upsert(session, Commit, records, copy_threshold=2)
+
+    # Assert
+    assert result.method == "copy"
+    sql, data = copied[0]
+    assert sql.startswith('COPY "_stage_commits_') and '("sha", "authored_date", "message")' in sql
+    assert data.splitlines() == [
+        f"{'a' * 40}\t2025-01-01T12:00:00+00:00\ttab\\there\\nand a \\\\ backslash",
+        f"{'b' * 40}\t2025-01-01T12:00:00+00:00\t\\N",
+    ]
+    statements = [compiled(call) for call in session.execute.call_args_list]
+    assert statements[0].startswith('CREATE TEMPORARY TABLE "_stage_commits_')
+    assert statements[-1].startswith('DROP TABLE "_stage_commits_')
+    merge = statements[1]
+    assert merge.startswith("WITH merged AS \n(INSERT INTO commits (sha, authored_date, message) SELECT")
+    assert "WHERE commits.authored_date IS DISTINCT FROM excluded.authored_date" in merge
+    assert (result.inserted, result.updated, result.unchanged) == (1, 1, 0)
+    session.commit.assert_called_once()
+
+def test_bulk_insert_copies_rows_straight_into_table():
+    """Append-only rows need no staging table: they are COPYed into the table itself."""
+    # Arrange
+    session = make_session('postgresql')
+    cursor = session.connection.return_value.connection.cursor.return_value
+    copied = []
+    cursor.copy_expert.side_effect = lambda sql, buffer: copied.append((sql, buffer.read()))
+    at = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+    rows = [(at, "dev-1", "cpu", 0.5), (at, "dev-1", "fps", None)]
+
+    # Act
+    result = bulk_insert(session, OspMetric, ["timestamp", "device_id", "metric_name", "metric_value"], rows,
+                         copy_threshold=2, commit=False)
+
+    # Assert
+    assert (result.method, result.inserted) == ("copy", 2)
+    assert copied == [(
+        'COPY "osp_metrics" ("timestamp", "device_id", "metric_name", "metric_value") FROM STDIN',
+        "2025-01-01T12:00:00+00:00\tdev-1\tcpu\t0.5\n2025-01-01T12:00:00+00:00\tdev-1\tfps\t\\N\n",
+    )]
+    session.execute.assert_not_called()
+    session.commit.assert_not_called()
@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from sma_collector.connector_cache import ConnectorCache
+
+def test_lease_reuses_connector_for_same_key():
+    """Test that a returned connector is reused and refreshed for the next job."""
+    cache = ConnectorCache(ttl_seconds=60)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    with cache.lease('git', {'GIT_REPO_URL': 'a'}, factory) as first:
+        pass
+    with cache.lease('git', {'GIT_REPO_URL': 'a'}, factory) as second:
+        pass
+
+    assert first is second
+    assert factory.call_count == 1
+    second.refresh.assert_called_once()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_lease_separates_keys_by_settings():
+    """Test that different settings overrides get different connectors."""
+    cache = ConnectorCache(ttl_seconds=60)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    with cache.lease('git', {'GIT_REPO_URL': 'a'}, factory) as first:
+        pass
+    with cache.lease('git', {'GIT_REPO_URL': 'b'}, factory) as second:
+        pass
+
+    assert first is not second
+
+def test_concurrent_leases_never_share_a_connector():
+    """Test that a leased connector is not handed to a second job."""
+    cache = ConnectorCache(ttl_seconds=60)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    with cache.lease('jira', {}, factory) as first:
+        with cache.lease('jira', {}, factory) as second:
+            assert first is not second
+
+def test_failed_job_discards_connector():
+    """Test that a connector used by a failing job is closed and not reused."""
+    cache = ConnectorCache(ttl_seconds=60)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    with pytest.raises(RuntimeError):
+        with cache.lease('jira', {}, factory) as first:
+            raise RuntimeError("boom")
+    with cache.lease('jira', {}, factory) as second:
+        pass
+
+    first.close.assert_called_once()
+    assert first is not second
+
+def test_unhealthy_connector_is_replaced():
+    """Test that a cached connector failing its health check is replaced."""
+    cache = ConnectorCache(ttl_seconds=60)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    with cache.lease('jira', {}, factory) as first:
+        first.is_healthy.return_value = False
+    with cache.lease('jira', {}, factory) as second:
+        pass
+
+    first.close.assert_called_once()
+    assert first is not second
+
+@patch('sma_collector.connector_cache.time.monotonic')
+def test_expired_connector_is_evicted(mock_monotonic):
+    """Test that connectors older than the TTL are closed instead of reused."""
+    cache = ConnectorCache(ttl_seconds=60)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    mock_monotonic.return_value = 0
+    with cache.lease('git', {}, factory) as first:
+        pass
+    mock_monotonic.return_value = 61
+    cache.evict_expired()
+
+    first.close.assert_called_once()
+    with cache.lease('git', {}, factory) as second:
+        pass
+    assert first is not second
@@ -0,0 +1,97 @@
+import os
+import subprocess
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sma_collector import deployment_index
+from sma_collector.database.migrations import migrate
+from sma_collector.database.models import Build, CommitDeployment, Deployment, DoraPendingDay, bulk_upsert
+from sma_collector.deployment_index import first_deployment, update_deployment_index
+from sma_collector.dora import deployment_lead_times
+
+T0 = datetime(2025, 3, 3, 12, 0, tzinfo=timezone.utc)
+
+def git(repo_dir, *args, authored=None):
+    env = {**os.environ, "GIT_AUTHOR_DATE": authored.isoformat()} if authored else None
+    return subprocess.run(['git', '-C', str(repo_dir), *args], check=True, capture_output=True, text=True, env=env).stdout.strip()
+
+def commit(repo_dir, message, authored):
+    git(repo_dir, 'commit', '-q', '--allow-empty', '-m', message, authored=authored)
+    return git(repo_dir, 'rev-parse', 'HEAD')
+
+@pytest.fixture
+def repo(tmp_path):
+    """main: a - b - merge(c, d) - e, where c and d were committed on a branch and merged without a changeSet of their own."""
+    path = tmp_path / "repo"
+    path.mkdir()
+    git(path, 'init', '-q', '-b', 'main')
+    git(path, 'config', 'user.name', 'Test Author')
+    git(path, 'config', 'user.email', 'test@example.com')
+    shas = {"a": commit(path, "a", T0 - timedelta(hours=3)), "b": commit(path, "b", T0 - timedelta(hours=1))}
+    git(path, 'checkout', '-q', '-b', 'feature')
+    shas["c"] = commit(path, "c", T0 + timedelta(hours=1))
+    shas["d"] = commit(path, "d", T0 + timedelta(hours=2))
+    git(path, 'checkout', '-q', 'main')
+    git(path, 'merge', '-q', '--no-ff', '-m', 'merge', 'feature', authored=T0 + timedelta(hours=3))
+    shas["merge"] = git(path, 'rev-parse', 'HEAD')
+    shas["e"] = commit(path, "e", T0 + timedelta(days=1))
+    return str(path), shas
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sma.db'}")
+    migrate(engine)
+    with Session(engine) as session:
+        yield session
+
+def deploy(session, number, finished, sha):
+    build_id = f"deploy#{number}"
+    bulk_upsert(session, Build, [{"id": build_id, "job_name": "deploy", "number": number, "finish_time": finished}])
+    bulk_upsert(session, Deployment, [{"id": build_id, "commit_sha": sha, "start_time": finished, "finish_time": finished}])
+    return build_id
+
+def test_commits_are_assigned_to_the_first_deployment_containing_them(session, repo, monkeypatch):
+    # Arrange
+    repo_dir, shas = repo
+    monkeypatch.setattr(deployment_index, "FRONTIER_SIZE", 1)
+    first = deploy(session, 1, T0, shas["b"])
+    second = deploy(session, 2, T0 + timedelta(hours=4), shas["merge"])
+    redeploy = deploy(session, 3, T0 + timedelta(hours=5), shas["merge"])
+    third = deploy(session, 4, T0 + timedelta(days=2), shas["e"])
+    unknown = deploy(session, 5, T0 + timedelta(days=2), "f" * 40)
+
+    # Act
+    indexed = update_deployment_index(session, repo_dirs=[repo_dir])
+    again = update_deployment_index(session, repo_dirs=[repo_dir])
+
+    # Assert
+    assert (indexed, again) == (4, 0)
+    assignments = {sha: first_deployment(session, sha).deployment_id for sha in shas.values()}
+    assert assignments == {shas["a"]: first, shas["b"]: first, shas["c"]: second, shas["d"]: second,
+                           shas["merge"]: second, shas["e"]: third}
+    deployments = session.execute(select(Deployment)).scalars().all()
+    lead_times = deployment_lead_times(session, deployments)
+    assert sorted(lead_times[first]) == [60, 180]
+    assert sorted(lead_times[second]) == [60, 120, 180]
+    assert lead_times[redeploy] == []
+    assert lead_times[unknown] == []
+    assert first_deployment(session, "f" * 40) is None
+
+def test_late_deployment_takes_over_commits_and_marks_days(session, repo):
+    # Arrange
+    repo_dir, shas = repo
+    later = deploy(session, 2, T0 + timedelta(days=1), shas["merge"])
+    update_deployment_index(session, repo_dirs=[repo_dir])
+    session.execute(DoraPendingDay.__table__.delete())
+    session.commit()
+
+    # Act
+    earlier = deploy(session, 1, T0, shas["b"])
+    indexed = update_deployment_index(session, repo_dirs=[repo_dir])
+
+    # Assert
+    assert indexed == 1
+    rows = {row.sha: row.deployment_id for row in session.scalars(select(CommitDeployment))}
+    assert rows == {shas["a"]: earlier, shas["b"]: earlier, shas["c"]: later, shas["d"]: later, shas["merge"]: later}
+    assert set(session.scalars(select(DoraPendingDay.day))) == {date(2025, 3, 3), date(2025, 3, 4)}
@@ -0,0 +1,81 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings
+from sma_collector.database.migrations import migrate
+from sma_collector.database.models import (
+    Build, BuildCommit, Commit, Deployment, DoraDailyMetric, DoraPendingDay, Incident, Issue, bulk_upsert
+)
+from sma_collector.dora import pending_days, query_dora_metrics, refresh_dora_metrics, service_dimensions
+
+T0 = datetime(2025, 3, 3, 12, 0, tzinfo=timezone.utc)  # a Monday
+SETTINGS = Settings(DORA_SERVICE_MAP={"^deploy-pay": {"team": "payments", "repo": "org/pay"}})
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sma.db'}")
+    migrate(engine)
+    with Session(engine) as session:
+        yield session
+
+def deploy(session, number, finished, shas, job="deploy-pay"):
+    """Stores a deployment like the processors do; shas maps its changeSet commits to their age in hours."""
+    build_id = f"{job}#{number}"
+    bulk_upsert(session, Commit, [{"sha": sha, "authored_date": finished - timedelta(hours=hours)} for sha, hours in shas.items()])
+    bulk_upsert(session, Build, [{"id": build_id, "job_name": job, "number": number, "status": "SUCCESS",
+                                  "start_time": finished - timedelta(minutes=5), "finish_time": finished}])
+    bulk_upsert(session, BuildCommit, [{"build_id": build_id, "commit_sha": sha} for sha in shas])
+    bulk_upsert(session, DoraPendingDay, pending_days([finished]), commit=False)
+    bulk_upsert(session, Deployment, [{"id": build_id, "commit_sha": list(shas)[-1], "start_time": finished, "finish_time": finished}])
+    return build_id
+
+def incident(session, key, created, hours_to_restore, deployment_id=None):
+    bulk_upsert(session, Issue, [{"id": key, "issue_key": key, "type": "Incident", "created_date": created}])
+    bulk_upsert(session, DoraPendingDay, pending_days([created]), commit=False)
+    bulk_upsert(session, Incident, [{"id": key, "created_date": created, "deployment_id": deployment_id,
+                                     "resolved_date": created + timedelta(hours=hours_to_restore)}])
+
+def test_service_dimensions_use_first_matching_pattern():
+    assert service_dimensions("deploy-payments-prod", SETTINGS) == ("payments", "org/pay")
+    assert service_dimensions("deploy-search", SETTINGS) == ("unassigned", "unassigned")
+
+def test_refresh_materializes_pending_days_for_weekly_queries(session):
+    # Arrange
+    first = deploy(session, 1, T0, {"a" * 40: 2, "b" * 40: 4})
+    deploy(session, 2, T0 + timedelta(days=1), {"c" * 40: 6})
+    deploy(session, 3, T0 + timedelta(days=2), {"d" * 40: 1}, job="deploy-search")
+    incident(session, "INC-1", T0 + timedelta(hours=1), 3, deployment_id=first)
+
+    # Act
+    refreshed = refresh_dora_metrics(session, SETTINGS)
+    weekly = query_dora_metrics(session, date(2025, 3, 3), date(2025, 3, 9), group_by=("team",))
+    overall = query_dora_metrics(session, date(2025, 3, 3), date(2025, 3, 9), group_by=())
+
+    # Assert
+    assert refreshed == 3
+    assert session.scalars(select(DoraPendingDay)).all() == []
+    payments = next(row for row in weekly if row["team"] == "payments")
+    assert (payments["repo"], payments["deployments"], payments["change_failure_rate"]) == ("*", 2, 0.5)
+    assert payments["lead_time_median_minutes"] == pytest.approx(240, rel=0.02)
+    assert payments["lead_time_mean_minutes"] == pytest.approx(240)
+    assert (payments["incidents"], payments["mttr_minutes"]) == (1, 180)
+    assert len(overall) == 1 and overall[0]["deployments"] == 3
+    assert overall[0]["deployments_per_day"] == pytest.approx(3 / 7)
+
+def test_refresh_only_recomputes_marked_days(session):
+    # Arrange
+    deploy(session, 1, T0, {"a" * 40: 2})
+    refresh_dora_metrics(session, SETTINGS)
+    # Overwrite the stored day, to tell whether the next refresh recomputes it.
+    session.execute(DoraDailyMetric.__table__.update().values(deployments=99))
+    session.commit()
+
+    # Act
+    deploy(session, 2, T0 + timedelta(days=1), {"b" * 40: 2})
+    refreshed = refresh_dora_metrics(session, SETTINGS)
+
+    # Assert
+    assert refreshed == 1
+    days = {row.day: row.deployments for row in session.scalars(select(DoraDailyMetric))}
+    assert days == {date(2025, 3, 3): 99, date(2025, 3, 4): 1}
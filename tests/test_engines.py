@@ -0,0 +1,75 @@
+import threading
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sma_collector.config import Settings
+from sma_collector.database import engines
+from sma_collector.database.engines import get_engine, pool_metrics, pool_status
+
+@pytest.fixture
+def pool_settings():
+    return Settings(DB_POOL_SIZE=1, DB_MAX_OVERFLOW=0, DB_POOL_TIMEOUT_SECONDS=0.2)
+
+@pytest.fixture(autouse=True)
+def isolated_registry():
+    saved = dict(engines._engines)
+    engines._engines.clear()
+    yield
+    engines.dispose_engines()
+    engines._engines.clear()
+    engines._engines.update(saved)
+
+def test_get_engine_shares_one_engine_per_url(tmp_path, pool_settings):
+    """Every caller of a URL gets the same engine, and so the same pool."""
+    # Arrange
+    url = f"sqlite:///{tmp_path / 'a.db'}"
+
+    # Act
+    first = get_engine(url, pool_settings)
+    second = get_engine(url, pool_settings)
+    other = get_engine(f"sqlite:///{tmp_path / 'b.db'}", pool_settings)
+
+    # Assert
+    assert first is second
+    assert other is not first
+    assert first.pool.size() == 1
+    assert set(pool_metrics()) == {url, f"sqlite:///{tmp_path / 'b.db'}"}
+
+def test_pool_metrics_count_checkouts_and_timeouts(tmp_path, pool_settings):
+    """Checkouts reuse pooled connections; waiting past the pool timeout is counted."""
+    # Arrange
+    engine = get_engine(f"sqlite:///{tmp_path / 'a.db'}", pool_settings)
+    for _ in range(3):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    # Act
+    with engine.connect():
+        errors = []
+        waiter = threading.Thread(target=lambda: _connect(engine, errors))
+        waiter.start()
+        waiter.join()
+        busy = pool_status(engine)
+
+    # Assert
+    assert len(errors) == 1 and isinstance(errors[0], PoolTimeoutError)
+    status = pool_status(engine)
+    assert busy["checked_out"] == 1
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 4
+    assert status["connects"] == 1
+    assert status["timeouts"] == 1
+    assert status["wait_seconds_max"] >= 0.2
+
+def _connect(engine, errors):
+    try:
+        engine.connect().close()
+    except PoolTimeoutError as e:
+        errors.append(e)
+
+def test_in_memory_sqlite_keeps_default_pool(pool_settings):
+    # Act
+    engine = get_engine("sqlite://", pool_settings)
+
+    # Assert
+    assert pool_status(engine)["pool"] != "InstrumentedQueuePool"
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import pytest
+from sma_collector.config import Settings
+from sma_collector.connectors.local_git_connector import LocalGitConnector
+from sma_collector.git_mirrors import GitMirrorManager
+
+def git(repo_dir, *args):
+    return subprocess.run(['git', '-C', str(repo_dir), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+def make_upstream(path, name):
+    path.mkdir(parents=True)
+    git(path, 'init', '-q', '-b', 'main')
+    git(path, 'config', 'user.name', 'Test Author')
+    git(path, 'config', 'user.email', 'test@example.com')
+    git(path, 'config', 'uploadpack.allowFilter', 'true')
+    commit(path, "file.txt", "first")
+    return f"file://{path}"
+
+def commit(path, filename, content):
+    (path / filename).write_text(content)
+    git(path, 'add', '.')
+    git(path, 'commit', '-q', '-m', f"Write {filename}: {content}")
+    return git(path, 'rev-parse', 'HEAD')
+
+@pytest.fixture
+def upstreams(tmp_path):
+    return {name: make_upstream(tmp_path / "upstream" / name, name) for name in ("org/a", "org/b")}
+
+def test_ensure_clones_bare_mirror_then_fetches(upstreams, tmp_path):
+    """Test that a missing mirror is cloned and an existing one is fetched, not pulled."""
+    # Arrange
+    manager = GitMirrorManager(str(tmp_path / "mirrors"))
+    url = upstreams["org/a"]
+
+    # Act
+    path = manager.ensure(url)
+    new_head = commit(tmp_path / "upstream" / "org/a", "file.txt", "second")
+    manager.ensure(url)
+
+    # Assert
+    assert path == str(tmp_path / "mirrors" / "org_a.git")
+    assert git(path, 'rev-parse', '--is-bare-repository') == 'true'
+    assert git(path, 'rev-parse', 'refs/heads/main') == new_head
+
+def test_sync_all_mirrors_every_repository(upstreams, tmp_path):
+    """Test that several repositories are synced concurrently and failures are reported as None."""
+    manager = GitMirrorManager(str(tmp_path / "mirrors"), max_workers=4)
+    missing = f"file://{tmp_path}/upstream/org/missing"
+
+    paths = manager.sync_all(list(upstreams.values()) + [missing])
+
+    assert all(os.path.isdir(paths[url]) for url in upstreams.values())
+    assert paths[missing] is None
+    assert not os.path.exists(manager.mirror_path(missing))
+
+def test_partial_clone_filter(upstreams, tmp_path):
+    """Test that a filter makes the mirror a blobless partial clone."""
+    manager = GitMirrorManager(str(tmp_path / "mirrors"), clone_filter="blob:none")
+
+    path = manager.ensure(upstreams["org/a"])
+
+    assert git(path, 'config', 'remote.origin.partialclonefilter') == 'blob:none'
+
+def test_fresh_mirrors_are_not_fetched_again(upstreams, tmp_path):
+    """Test that max_age_seconds skips fetches of recently synced mirrors."""
+    manager = GitMirrorManager(str(tmp_path / "mirrors"), max_age_seconds=3600)
+    url = upstreams["org/a"]
+    path = manager.ensure(url)
+    old_head = git(path, 'rev-parse', 'refs/heads/main')
+
+    commit(tmp_path / "upstream" / "org/a", "file.txt", "second")
+    manager.ensure(url)
+
+    assert git(path, 'rev-parse', 'refs/heads/main') == old_head
+
+def test_local_git_connector_collects_from_mirror(upstreams, tmp_path):
+    """Test that LocalGitConnector reads commits from the mirror when GIT_MIRROR_DIR is set."""
+    settings = Settings(GIT_REPO_URL=upstreams["org/b"], GIT_REPO_PATH=str(tmp_path / "unused"),
+                        GIT_MIRROR_DIR=str(tmp_path / "mirrors"))
+
+    connector = LocalGitConnector(settings)
+    commits = connector.collect()
+
+    assert [c['files_changed'] for c in commits] == [1]
+    assert not os.path.exists(tmp_path / "unused")
+    assert connector._repo.bare
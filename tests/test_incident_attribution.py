@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings
+from sma_collector.database.migrations import migrate
+from sma_collector.database.models import Build, Deployment, DoraPendingDay, Incident, Issue, bulk_upsert
+from sma_collector.incident_attribution import DeploymentIntervals, attribute_incidents
+from sma_collector.processors import process_jira_data
+
+T0 = datetime(2025, 3, 3, 12, 0, tzinfo=timezone.utc)
+SETTINGS = Settings(DORA_SERVICE_MAP={"^deploy-pay": {"team": "payments", "service": "payments-api"}})
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sma.db'}")
+    migrate(engine)
+    with Session(engine) as session:
+        yield session
+
+def deploy(session, job, number, started):
+    build_id = f"{job}#{number}"
+    bulk_upsert(session, Build, [{"id": build_id, "job_name": job, "number": number, "status": "SUCCESS"}])
+    bulk_upsert(session, Deployment, [{"id": build_id, "start_time": started, "finish_time": started + timedelta(minutes=10)}])
+    return build_id
+
+def incident(session, key, created, service=None):
+    bulk_upsert(session, Issue, [{"id": key, "issue_key": key, "type": "Incident", "created_date": created}])
+    bulk_upsert(session, Incident, [{"id": key, "created_date": created, "service": service, "attributed_at": None}])
+
+def attributions(session):
+    return dict(session.execute(select(Incident.id, Incident.deployment_id)).all())
+
+def test_live_deployment_is_found_per_service_or_among_all():
+    # Arrange
+    intervals = DeploymentIntervals([
+        ("pay#1", "pay", T0), ("pay#2", "pay", T0 + timedelta(days=2)), ("search#1", "search", T0 + timedelta(days=1)),
+    ])
+
+    # Act & Assert
+    assert intervals.live(T0 - timedelta(hours=1), "pay") is None
+    assert intervals.live(T0 + timedelta(days=1, hours=1), "pay") == "pay#1"
+    assert intervals.live(T0 + timedelta(days=2), "pay") == "pay#2"
+    assert intervals.live(T0 + timedelta(days=1, hours=1), "search") == "search#1"
+    assert intervals.live(T0 + timedelta(days=1, hours=1), "unknown") == "search#1"
+    assert intervals.live(T0 + timedelta(days=1, hours=1)) == "search#1"
+
+def test_attributes_new_incidents_then_only_those_after_a_new_deployment(session):
+    # Arrange
+    deploy(session, "deploy-pay", 1, T0)
+    search = deploy(session, "deploy-search", 1, T0 + timedelta(days=1))
+    incident(session, "INC-1", T0 + timedelta(days=1, hours=1), service="payments-api")
+    incident(session, "INC-2", T0 + timedelta(days=1, hours=1))
+    incident(session, "INC-3", T0 + timedelta(days=3), service="payments-api")
+    incident(session, "INC-0", T0 - timedelta(days=1), service="payments-api")
+    first = attribute_incidents(session, SETTINGS)
+    unchanged = attribute_incidents(session, SETTINGS)
+    session.execute(DoraPendingDay.__table__.delete())
+    session.commit()
+
+    # Act
+    late = deploy(session, "deploy-pay", 2, T0 + timedelta(days=2))
+    after_deployment = attribute_incidents(session, SETTINGS)
+
+    # Assert
+    assert (first, unchanged, after_deployment) == (3, 0, 1)
+    assert attributions(session) == {"INC-0": None, "INC-1": "deploy-pay#1", "INC-2": search, "INC-3": late}
+    assert set(session.scalars(select(DoraPendingDay.day))) == {date(2025, 3, 3), date(2025, 3, 5), date(2025, 3, 6)}
+    assert session.scalar(select(Incident.attributed_at).where(Incident.id == "INC-0")) is not None
+
+def test_recollected_incidents_keep_their_attribution_unless_it_depends_on_a_change(session):
+    # Arrange
+    deploy(session, "deploy-pay", 1, T0)
+    issues = [{
+        "key": f"INC-{n}", "issue_type": "Incident", "status": "Open", "summary": "Outage",
+        "created": T0 + timedelta(hours=n), "resolved": None, "components": ["payments-api"],
+    } for n in (1, 2, 3)]
+    process_jira_data(session, issues)
+    attribute_incidents(session, SETTINGS)
+
+    # Act
+    issues[0]["status"] = "Done"
+    issues[1]["components"] = ["search-api"]
+    issues[2]["created"] = T0 + timedelta(hours=4)
+    process_jira_data(session, issues)
+
+    # Assert
+    pending = set(session.scalars(select(Incident.id).where(Incident.attributed_at.is_(None))))
+    assert pending == {"INC-2", "INC-3"}
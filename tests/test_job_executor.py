@@ -0,0 +1,61 @@
+import threading
+import time
+from sma_collector.job_executor import SourceExecutor
+
+def test_limit_for_uses_source_limit_or_default():
+    """Test that per-source limits fall back to the default limit."""
+    executor = SourceExecutor({'git': 4, 'jira': 2}, default_limit=1)
+
+    assert executor.limit_for('git') == 4
+    assert executor.limit_for('jira') == 2
+    assert executor.limit_for('github') == 1
+    assert executor.capacity(['git', 'jira', 'github']) == 7
+
+def test_submit_respects_per_source_concurrency():
+    """Test that a source never runs more jobs at once than its limit."""
+    executor = SourceExecutor({'jira': 2})
+    lock = threading.Lock()
+    running = {'now': 0, 'max': 0}
+
+    def job():
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        time.sleep(0.05)
+        with lock:
+            running['now'] -= 1
+
+    futures = [executor.submit('jira', job) for _ in range(6)]
+    executor.shutdown(wait=True)
+
+    assert all(f.done() for f in futures)
+    assert running['max'] == 2
+
+def test_slow_source_does_not_block_other_sources():
+    """Test that a blocked source leaves other sources free to run."""
+    executor = SourceExecutor({}, default_limit=1)
+    release = threading.Event()
+
+    slow = executor.submit('jira', release.wait, 5)
+    fast = executor.submit('git', lambda: 'done')
+
+    assert fast.result(timeout=1) == 'done'
+    assert not slow.done()
+    release.set()
+    executor.shutdown(wait=True)
+
+def test_try_submit_refuses_jobs_beyond_the_source_share():
+    """Test that a source takes at most limit × jobs_per_slot jobs until some finish."""
+    executor = SourceExecutor({'jira': 2}, jobs_per_slot=2)
+    release = threading.Event()
+
+    accepted = [executor.try_submit('jira', release.wait, 5) for _ in range(5)]
+    other = executor.try_submit('git', lambda: 'done')
+
+    assert [f is not None for f in accepted] == [True, True, True, True, False]
+    assert executor.pending('jira') == 4
+    assert other.result(timeout=1) == 'done'
+    release.set()
+    executor.shutdown(wait=True)
+    assert executor.pending('jira') == 0
+    assert executor.try_submit('jira', lambda: None) is not None
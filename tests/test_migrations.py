@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+from sma_collector.database.migrations import MIGRATIONS, SECONDARY_INDEXES, ensure_monthly_partitions, migrate, monthly_partitions
+from sma_collector.database.models import OspMetric
+
+def make_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'sma.db'}")
+
+def test_migrate_creates_schema_and_records_versions(tmp_path):
+    """A fresh database gets every table and index; a second run has nothing to do."""
+    # Arrange
+    engine = make_engine(tmp_path)
+
+    # Act
+    first = migrate(engine)
+    second = migrate(engine)
+
+    # Assert
+    assert first == sorted(step.version for step in MIGRATIONS)
+    assert second == []
+    inspector = inspect(engine)
+    assert {"commits", "builds", "osp_metrics", "schema_migrations"} <= set(inspector.get_table_names())
+    indexes = {index["name"] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+    assert set(SECONDARY_INDEXES) <= indexes
+
+def test_migrate_stops_at_target_and_resumes(tmp_path):
+    """Migrating to a target leaves later versions pending, as for an existing init.sql database."""
+    # Arrange
+    engine = make_engine(tmp_path)
+
+    # Act
+    baseline = migrate(engine, target=1)
+    with engine.connect() as connection:
+        before = {index["name"] for index in inspect(connection).get_indexes("commits")}
+    rest = migrate(engine)
+
+    # Assert
+    assert baseline == [1]
+    assert "ix_commits_authored_date" not in before
+    assert rest == [2, 3, 4, 5, 6, 7, 8]
+    with engine.connect() as connection:
+        versions = connection.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()
+    assert versions == [1, 2, 3, 4, 5, 6, 7, 8]
+
+def test_migrate_adds_diff_stat_columns_to_existing_commits(tmp_path):
+    """A commits table created before the diff stats gets their columns."""
+    # Arrange
+    engine = make_engine(tmp_path)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE commits (sha VARCHAR(40) PRIMARY KEY, author_name VARCHAR(255),"
+                                " author_email VARCHAR(255), authored_date TIMESTAMP, message TEXT)"))
+
+    # Act
+    migrate(engine)
+
+    # Assert
+    columns = {column["name"] for column in inspect(engine).get_columns("commits")}
+    assert {"lines_added", "lines_deleted", "files_changed"} <= columns
+
+def test_monthly_partitions_cover_range_in_utc():
+    # Act
+    partitions = monthly_partitions("osp_metrics", datetime(2024, 11, 15, tzinfo=timezone.utc), datetime(2025, 2, 1, tzinfo=timezone.utc))
+
+    # Assert
+    assert [name for name, _, _ in partitions] == ["osp_metrics_202411", "osp_metrics_202412", "osp_metrics_202501", "osp_metrics_202502"]
+    assert partitions[1][1:] == (datetime(2024, 12, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+def test_ensure_monthly_partitions_moves_rows_out_of_default():
+    """A month with rows in the default partition is created with the default detached, and its rows moved."""
+    # Arrange
+    existing = {"osp_metrics_default", "osp_metrics_202501"}
+    statements = []
+    def execute(statement, params=None):
+        sql = str(statement)
+        statements.append(sql)
+        result = MagicMock()
+        result.scalar.return_value = params["table"] if sql.startswith("SELECT to_regclass") and params["table"] in existing else None
+        result.first.return_value = (1,) if sql.startswith("SELECT 1") and params["lower"].month == 2 else None
+        return result
+    connection = MagicMock()
+    connection.execute.side_effect = execute
+
+    # Act
+    ensure_monthly_partitions(connection, "osp_metrics", datetime(2025, 1, 5, tzinfo=timezone.utc), datetime(2025, 3, 1, tzinfo=timezone.utc))
+
+    # Assert
+    changes = [sql.split(" FOR VALUES")[0].split(" WHERE")[0] for sql in statements if not sql.startswith("SELECT")]
+    assert changes == [
+        "ALTER TABLE osp_metrics DETACH PARTITION osp_metrics_default",
+        "CREATE TABLE osp_metrics_202502 PARTITION OF osp_metrics",
+        "INSERT INTO osp_metrics_202502 SELECT * FROM osp_metrics_default",
+        "DELETE FROM osp_metrics_default",
+        "ALTER TABLE osp_metrics ATTACH PARTITION osp_metrics_default DEFAULT",
+        "CREATE TABLE osp_metrics_202503 PARTITION OF osp_metrics",
+    ]
+
+def test_osp_metrics_are_identified_by_id_and_timestamp(tmp_path):
+    """The mapper's primary key is the (id, timestamp) of the partitioned table, even where the DDL keys on id."""
+    # Arrange
+    engine = make_engine(tmp_path)
+    migrate(engine)
+    timestamp = datetime(2025, 3, 1)
+    with Session(engine) as session:
+        session.add(OspMetric(timestamp=timestamp, device_id="dev-1", metric_name="cpu", metric_value=1.0))
+        session.commit()
+
+        # Act
+        metric = session.get(OspMetric, (1, timestamp))
+
+    # Assert
+    assert [column.name for column in inspect(OspMetric).primary_key] == ["id", "timestamp"]
+    assert metric.metric_value == 1.0
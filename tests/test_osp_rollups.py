@@ -0,0 +1,121 @@
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sma_collector.config import Settings
+from sma_collector.database.migrations import migrate
+from sma_collector.database.models import OspMetric, OspMetricRollup
+from sma_collector.osp_rollups import (
+    aggregate, apply_retention, choose_resolution, quantile, query_series, rebuild_rollups, subtract_rollups,
+    update_rollups, value_bin
+)
+
+T0 = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sma.db'}")
+    migrate(engine)
+    with Session(engine) as session:
+        yield session
+
+def sample(seconds, value, device="dev-1", metric="cpu"):
+    return {"timestamp": T0 + timedelta(seconds=seconds), "device_id": device, "metric_name": metric, "metric_value": value}
+
+def test_histogram_quantiles_within_relative_accuracy():
+    """Percentiles from the log-scale bins are within 1% of the exact ones, for any sign."""
+    # Arrange
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 2) * rng.choice([1, 1, 1, -1]) for _ in range(20_000)] + [0.0] * 100
+    bins = {}
+    for value in values:
+        bins[value_bin(value)] = bins.get(value_bin(value), 0) + 1
+    values.sort()
+
+    # Act / Assert
+    for q in (0.01, 0.25, 0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert quantile(bins, q) == pytest.approx(exact, rel=0.0101, abs=1e-9)
+
+def test_update_rollups_merges_batches_into_buckets(session):
+    """Separate batches landing in the same buckets add up to the aggregates of all samples."""
+    # Arrange
+    first = [sample(s, float(s)) for s in range(0, 120)]
+    second = [sample(s, float(s)) for s in range(120, 180)] + [sample(10, 1000.0, device="dev-2")]
+
+    # Act
+    update_rollups(session, first)
+    update_rollups(session, second)
+    session.commit()
+
+    # Assert
+    minutes = session.execute(
+        select(OspMetricRollup).where(OspMetricRollup.resolution == 60, OspMetricRollup.device_id == "dev-1")
+        .order_by(OspMetricRollup.bucket_start)
+    ).scalars().all()
+    assert [(row.sample_count, row.value_min, row.value_max) for row in minutes] == [(60, 0, 59), (60, 60, 119), (60, 120, 179)]
+    hour = session.execute(select(OspMetricRollup).where(OspMetricRollup.resolution == 3600, OspMetricRollup.device_id == "dev-1")).scalar_one()
+    assert (hour.sample_count, hour.value_sum) == (180, sum(range(180)))
+
+def test_subtract_rollups_reads_new_extremes_from_raw_samples_within_retention(session):
+    # Arrange
+    kept = [sample(0, 5.0), sample(30, 7.0)]
+    removed = [sample(10, 1.0), sample(20, 6.0)]
+    session.add_all(OspMetric(**row) for row in kept)
+    update_rollups(session, kept + removed)
+    session.commit()
+
+    # Act
+    touched = subtract_rollups(session, *aggregate(removed), settings=Settings(OSP_METRICS_RAW_RETENTION_DAYS=None))
+    session.commit()
+
+    # Assert
+    assert touched == 3
+    rows = session.execute(select(OspMetricRollup.sample_count, OspMetricRollup.value_sum,
+                                  OspMetricRollup.value_min, OspMetricRollup.value_max)).all()
+    assert rows == [(2, 12.0, 5.0, 7.0)] * 3
+
+def test_query_series_reads_coarsest_fitting_rollup(session):
+    # Arrange
+    update_rollups(session, [sample(s, float(s % 100)) for s in range(0, 2 * 86400, 30)])
+    session.commit()
+
+    # Act
+    hourly = query_series(session, "dev-1", "cpu", T0, T0 + timedelta(days=2), max_points=100)
+    minutes = query_series(session, "dev-1", "cpu", T0, T0 + timedelta(hours=1), max_points=100)
+
+    # Assert
+    assert hourly["resolution"] == 3600 and len(hourly["points"]) == 48
+    assert minutes["resolution"] == 60 and len(minutes["points"]) == 60
+    point = hourly["points"][0]
+    assert point["bucket_start"] == T0 and point["count"] == 120
+    assert point["min"] == 0 and point["max"] == 90
+    assert point["p50"] == pytest.approx(40, rel=0.01)
+
+def test_choose_resolution_skips_expired_rollups():
+    """Minute rollups past their retention cannot serve old ranges."""
+    settings = Settings(OSP_ROLLUP_RETENTION_DAYS={"1m": 7})
+    now = T0 + timedelta(days=30)
+
+    assert choose_resolution(now - timedelta(hours=1), now, 1000, settings, now=now) == 60
+    assert choose_resolution(T0, T0 + timedelta(hours=1), 1000, settings, now=now) == 3600
+
+def test_rebuild_and_retention(session):
+    """Rollups can be rebuilt from raw samples, which retention then deletes while rollups remain."""
+    # Arrange
+    samples = [sample(s, 1.0) for s in range(0, 600, 10)]
+    session.execute(OspMetric.__table__.insert(), samples)
+    session.commit()
+    settings = Settings(OSP_METRICS_RAW_RETENTION_DAYS=1, OSP_ROLLUP_RETENTION_DAYS={"1m": 1})
+
+    # Act
+    rebuilt = rebuild_rollups(session, T0, T0)
+    deleted = apply_retention(session, settings, now=T0 + timedelta(days=3))
+
+    # Assert
+    assert rebuilt == 60
+    assert deleted["osp_metrics"] == 60
+    assert deleted["osp_metric_rollups:1m"] == 10
+    remaining = session.execute(select(OspMetricRollup.resolution, OspMetricRollup.sample_count)).all()
+    assert sorted(remaining) == [(3600, 60), (86400, 60)]
@@ -1,6 +1,8 @@
 import pytest
+from datetime import date
 from unittest.mock import MagicMock, patch
-from sma_collector.processors import process_git_data, process_github_data, process_jira_data
+from sma_collector.database.models import Deployment, DoraPendingDay
+from sma_collector.processors import process_batches, process_git_data, process_github_data, process_jira_data, process_jenkins_data
 
 @pytest.fixture
 def mock_session():
@@ -41,6 +43,45 @@ def test_process_github_data(mock_bulk_upsert, mock_session):
     args, _ = mock_bulk_upsert.call_args
     assert len(args[2]) == 1
     assert args[2][0]['pr_number'] == 1
+    assert "comment_count" not in args[2][0]
+
+@patch('sma_collector.processors.bulk_upsert')
+def test_process_github_data_stores_review_activity(mock_bulk_upsert, mock_session):
+    """Test that review activity fields collected with the pull requests are stored."""
+    # Arrange
+    github_data = [{
+        "id": "123-1", "repo_name": "fake/repo", "pr_number": 1, "title": "Test PR", "author": "testuser",
+        "created_date": "2025-01-01T12:00:00Z", "merged_date": None, "first_comment_date": "2025-01-01T12:30:00Z",
+        "time_to_first_review_minutes": 30, "time_to_merge_minutes": None, "comment_count": 4,
+    }]
+
+    # Act
+    process_github_data(mock_session, github_data)
+
+    # Assert
+    args, _ = mock_bulk_upsert.call_args
+    assert (args[2][0]['time_to_first_review_minutes'], args[2][0]['comment_count']) == (30, 4)
+
+@patch('sma_collector.processors.bulk_upsert')
+def test_process_github_data_keeps_activity_not_fetched(mock_bulk_upsert, mock_session):
+    """Test that pull requests without review activity are upserted apart, so their stored activity stays."""
+    # Arrange
+    pr = {"repo_name": "fake/repo", "title": "Test PR", "author": "testuser",
+          "created_date": "2025-01-01T12:00:00Z", "merged_date": None}
+    github_data = [
+        {**pr, "id": "123-1", "pr_number": 1, "first_comment_date": None, "time_to_first_review_minutes": None,
+         "time_to_merge_minutes": None, "comment_count": 0},
+        {**pr, "id": "123-2", "pr_number": 2},
+    ]
+
+    # Act
+    process_github_data(mock_session, github_data)
+
+    # Assert
+    batches = [call.args[2] for call in mock_bulk_upsert.call_args_list]
+    assert [[row["pr_number"] for row in rows] for rows in batches] == [[1], [2]]
+    assert "comment_count" not in batches[1][0]
+    mock_session.commit.assert_called_once()
 
 @patch('sma_collector.processors.bulk_upsert')
 def test_process_jira_data(mock_bulk_upsert, mock_session):
@@ -60,3 +101,39 @@ def test_process_jira_data(mock_bulk_upsert, mock_session):
     args, _ = mock_bulk_upsert.call_args
     assert len(args[2]) == 1
     assert args[2][0]['issue_key'] == "PROJ-1"
+
+def test_process_batches_calls_processor_per_batch(mock_session):
+    """Test that process_batches stores each batch as it arrives."""
+    # Arrange
+    processor = MagicMock()
+    batches = iter([[{"sha": "1"}, {"sha": "2"}], [{"sha": "3"}]])
+
+    # Act
+    total = process_batches(mock_session, processor, batches)
+
+    # Assert
+    assert total == 3
+    assert processor.call_count == 2
+    processor.assert_called_with(mock_session, [{"sha": "3"}])
+
+@patch('sma_collector.processors.bulk_upsert')
+def test_process_jenkins_data_records_deployments(mock_bulk_upsert, mock_session):
+    """Test that successful deployment job builds are stored as deployments."""
+    # Arrange
+    build = {
+        "id": "https://jenkins/job/deploy/5/", "job_name": "deploy", "number": 5, "status": "SUCCESS",
+        "start_time": "2025-01-01T12:00:00Z", "finish_time": "2025-01-01T12:01:00Z", "duration_millis": 60000,
+        "commit_shas": [], "is_deployment": True,
+    }
+    failed = dict(build, id="https://jenkins/job/deploy/6/", number=6, status="FAILURE")
+
+    # Act
+    process_jenkins_data(mock_session, [build, failed])
+
+    # Assert
+    assert mock_bulk_upsert.call_count == 3
+    pending, _ = mock_bulk_upsert.call_args_list[1]
+    assert pending[1] is DoraPendingDay and [row["day"] for row in pending[2]] == [date(2025, 1, 1)]
+    args, _ = mock_bulk_upsert.call_args
+    assert args[1] is Deployment
+    assert args[2] == [{"id": build["id"], "commit_sha": None, "start_time": build["start_time"], "finish_time": build["finish_time"]}]
@@ -5,17 +5,32 @@ import pika
 
 from sma_collector import main as producer_main
 from sma_collector import collector_worker
+from sma_collector.job_executor import SourceExecutor
+from sma_collector.connector_cache import ConnectorCache
 
+
+@pytest.fixture(autouse=True)
+def no_connector_cache():
+    """Builds a fresh connector for every job so mocks do not leak between tests."""
+    with patch.object(collector_worker, 'connector_cache', ConnectorCache(ttl_seconds=0)):
+        yield
+
+@patch('sma_collector.main.plan_jobs')
 @patch('sma_collector.main.pika.BlockingConnection')
-def test_main_dispatches_jobs(mock_blocking_connection):
+def test_main_dispatches_jobs(mock_blocking_connection, mock_plan_jobs):
     """
-    Test that the main dispatcher sends the correct jobs to the queue.
+    Test that the main dispatcher sends one message per planned shard job.
     """
     # Setup mock objects
     mock_channel = MagicMock()
     mock_connection = MagicMock()
     mock_connection.channel.return_value = mock_channel
     mock_blocking_connection.return_value = mock_connection
+    mock_plan_jobs.return_value = [
+        {'source': 'git', 'shard': 'fake_a', 'settings': {'GIT_REPO_URL': 'https://github.com/fake/a.git'}},
+        {'source': 'git', 'shard': 'fake_b', 'settings': {'GIT_REPO_URL': 'https://github.com/fake/b.git'}},
+        {'source': 'jira'}
+    ]
 
     # Run the producer main function
     producer_main.main()
@@ -23,70 +38,237 @@ def test_main_dispatches_jobs(mock_blocking_connection):
     # Assert that a connection was made
     mock_blocking_connection.assert_called_once()
     mock_connection.channel.assert_called_once()
-    mock_channel.queue_declare.assert_called_once_with(queue='collection_jobs')
+    mock_channel.queue_declare.assert_called_once_with(queue='collection_jobs', durable=True)
 
-    # Assert that both jobs were published
-    assert mock_channel.basic_publish.call_count == 2
+    # Assert that every shard job was published
+    assert mock_channel.basic_publish.call_count == 3
 
     # Check the calls to basic_publish
     expected_calls = [
         call(
             exchange='',
             routing_key='collection_jobs',
-            body=json.dumps({'source': 'git'}),
-            properties=pika.BasicProperties(delivery_mode=2)
-        ),
-        call(
-            exchange='',
-            routing_key='collection_jobs',
-            body=json.dumps({'source': 'jira'}),
+            body=json.dumps(job),
             properties=pika.BasicProperties(delivery_mode=2)
-        )
+        ) for job in mock_plan_jobs.return_value
     ]
     mock_channel.basic_publish.assert_has_calls(expected_calls, any_order=True)
 
 
-@patch('sma_collector.collector_worker.JiraCollector')
-@patch('sma_collector.collector_worker.GitConnector')
+@patch('sma_collector.collector_worker.get_db_session')
 @patch('sma_collector.collector_worker.settings')
-def test_worker_callback(mock_settings, mock_git_connector, mock_jira_collector):
+def test_worker_callback(mock_settings, mock_get_db_session):
     """
     Test that the worker callback correctly processes jobs.
     """
-    # --- Test Git Job ---
-    # Setup mock objects
+    mock_settings.COLLECT_BATCH_SIZE = 500
+    mock_settings.COLLECT_PREFETCH_BATCHES = 1
+    mock_git_connector = MagicMock()
+    mock_jira_collector = MagicMock()
+    mock_git_processor = MagicMock()
+    mock_jira_processor = MagicMock()
+    mock_git_connector.return_value.iter_batches.return_value = [[{'sha': '12345'}]]
+    connectors = {'git': mock_git_connector, 'jira': mock_jira_collector}
+    processors = {'git': mock_git_processor, 'jira': mock_jira_processor}
+
+    with patch.dict(collector_worker.CONNECTOR_REGISTRY, connectors, clear=True), \
+            patch.dict(collector_worker.PROCESSOR_REGISTRY, processors, clear=True):
+        # --- Test Git Job ---
+        # Setup mock objects
+        mock_channel = MagicMock()
+        mock_method = MagicMock()
+        mock_method.delivery_tag = 123
+        git_job_body = json.dumps({'source': 'git'})
+
+        # Call the callback with a git job
+        collector_worker.callback(mock_channel, mock_method, None, git_job_body)
+
+        # Assert GitConnector was called
+        mock_git_connector.assert_called_once()
+        mock_git_connector.return_value.iter_batches.assert_called_once()
+        mock_git_processor.assert_called_once()
+        # Assert JiraConnector was NOT called
+        mock_jira_collector.assert_not_called()
+        # Assert message was acknowledged
+        mock_channel.basic_ack.assert_called_once_with(delivery_tag=123)
+
+        # --- Reset mocks for next test ---
+        mock_git_connector.reset_mock()
+        mock_jira_collector.reset_mock()
+        mock_channel.reset_mock()
+
+        # --- Test Jira Job ---
+        jira_job_body = json.dumps({'source': 'jira'})
+        mock_method.delivery_tag = 456
+
+        # Call the callback with a jira job
+        collector_worker.callback(mock_channel, mock_method, None, jira_job_body)
+
+        # Assert JiraConnector was called
+        mock_jira_collector.assert_called_once()
+        mock_jira_collector.return_value.iter_batches.assert_called_once()
+        # Assert GitConnector was NOT called
+        mock_git_connector.assert_not_called()
+        # Assert message was acknowledged
+        mock_channel.basic_ack.assert_called_once_with(delivery_tag=456)
+
+
+@patch('sma_collector.collector_worker.run_job')
+def test_threaded_callback_acks_after_job_finishes(mock_run_job):
+    """
+    Test that the threaded callback runs jobs off the I/O thread and acks
+    through the connection thread only after the job has finished.
+    """
+    mock_connection = MagicMock()
+    mock_channel = MagicMock()
+    mock_method = MagicMock()
+    mock_method.delivery_tag = 789
+    executor = SourceExecutor({'git': 2})
+
+    on_message = collector_worker.make_threaded_callback(mock_connection, executor)
+    on_message(mock_channel, mock_method, None, json.dumps({'source': 'git'}))
+    executor.shutdown(wait=True)
+
+    mock_run_job.assert_called_once_with({'source': 'git'})
+    mock_channel.basic_ack.assert_not_called()
+    mock_connection.add_callback_threadsafe.assert_called_once()
+    ack = mock_connection.add_callback_threadsafe.call_args[0][0]
+    ack()
+    mock_channel.basic_ack.assert_called_once_with(delivery_tag=789)
+
+
+def test_threaded_callback_requeues_jobs_of_a_source_with_its_share_pending():
+    """
+    Test that a job whose source already has its share of jobs in the
+    executor is nacked for requeueing after a delay instead of queued.
+    """
+    mock_connection = MagicMock()
     mock_channel = MagicMock()
     mock_method = MagicMock()
-    mock_method.delivery_tag = 123
-    git_job_body = json.dumps({'source': 'git'})
-
-    # Call the callback with a git job
-    collector_worker.callback(mock_channel, mock_method, None, git_job_body)
-
-    # Assert GitConnector was called
-    mock_git_connector.assert_called_once()
-    mock_git_connector.return_value.collect.assert_called_once()
-    # Assert JiraConnector was NOT called
-    mock_jira_collector.assert_not_called()
-    # Assert message was acknowledged
-    mock_channel.basic_ack.assert_called_once_with(delivery_tag=123)
-
-    # --- Reset mocks for next test ---
-    mock_git_connector.reset_mock()
-    mock_jira_collector.reset_mock()
-    mock_channel.reset_mock()
-
-    # --- Test Jira Job ---
-    jira_job_body = json.dumps({'source': 'jira'})
-    mock_method.delivery_tag = 456
-
-    # Call the callback with a jira job
-    collector_worker.callback(mock_channel, mock_method, None, jira_job_body)
-
-    # Assert JiraConnector was called
-    mock_jira_collector.assert_called_once()
-    mock_jira_collector.return_value.collect.assert_called_once()
-    # Assert GitConnector was NOT called
-    mock_git_connector.assert_not_called()
-    # Assert message was acknowledged
-    mock_channel.basic_ack.assert_called_once_with(delivery_tag=456)
+    mock_method.delivery_tag = 321
+    executor = MagicMock()
+    executor.try_submit.return_value = None
+
+    on_message = collector_worker.make_threaded_callback(mock_connection, executor)
+    on_message(mock_channel, mock_method, None, json.dumps({'source': 'jira'}))
+
+    mock_channel.basic_nack.assert_not_called()
+    delay, nack = mock_connection.call_later.call_args[0]
+    assert delay == collector_worker.settings.WORKER_REQUEUE_DELAY_SECONDS
+    nack()
+    mock_channel.basic_nack.assert_called_once_with(delivery_tag=321, requeue=True)
+    mock_channel.basic_ack.assert_not_called()
+
+
+@patch('sma_collector.collector_worker.get_db_session')
+def test_run_job_applies_shard_settings_and_params(mock_get_db_session):
+    """
+    Test that shard jobs build the connector with their settings overrides
+    and pass their params to collect().
+    """
+    mock_connector = MagicMock()
+    mock_processor = MagicMock()
+    mock_connector.return_value.iter_batches.return_value = [[{'key': 'OTHER-1'}], [{'key': 'OTHER-2'}]]
+    mock_connector.return_value.watermark_key.return_value = None
+    job = {
+        'source': 'jira',
+        'settings': {'JIRA_PROJECT_KEY': 'OTHER'},
+        'params': {'created_after': '2025-01-01', 'created_before': '2025-02-01'}
+    }
+
+    with patch.dict(collector_worker.CONNECTOR_REGISTRY, {'jira': mock_connector}, clear=True), \
+            patch.dict(collector_worker.PROCESSOR_REGISTRY, {'jira': mock_processor}, clear=True):
+        collector_worker.run_job(job)
+
+    job_settings = mock_connector.call_args[0][0]
+    assert job_settings.JIRA_PROJECT_KEY == 'OTHER'
+    mock_connector.return_value.iter_batches.assert_called_once_with(
+        collector_worker.settings.COLLECT_BATCH_SIZE, created_after='2025-01-01', created_before='2025-02-01'
+    )
+    assert mock_processor.call_count == 2
+
+
+@patch('sma_collector.collector_worker.WatermarkStore')
+@patch('sma_collector.collector_worker.get_db_session')
+def test_run_job_resumes_from_and_advances_watermark(mock_get_db_session, mock_watermark_store):
+    """
+    Test that incremental collectors receive the stored cursor and that the
+    new cursor is saved after all batches were processed.
+    """
+    mock_connector = MagicMock()
+    mock_connector.return_value.watermark_key.return_value = 'fake/repo'
+
+    def iter_batches(batch_size, since=None):
+        mock_connector.return_value.watermark = '2025-01-02T00:00:00+00:00'
+        yield [{'id': '1'}]
+
+    mock_connector.return_value.iter_batches.side_effect = iter_batches
+    mock_store = mock_watermark_store.return_value
+    mock_store.get.return_value = '2025-01-01T00:00:00+00:00'
+
+    with patch.dict(collector_worker.CONNECTOR_REGISTRY, {'github': mock_connector}, clear=True), \
+            patch.dict(collector_worker.PROCESSOR_REGISTRY, {'github': MagicMock()}, clear=True):
+        collector_worker.run_job({'source': 'github'})
+
+    mock_store.get.assert_called_once_with('github', 'fake/repo')
+    mock_connector.return_value.iter_batches.assert_called_once_with(
+        collector_worker.settings.COLLECT_BATCH_SIZE, since='2025-01-01T00:00:00+00:00'
+    )
+    mock_store.set.assert_called_once_with('github', 'fake/repo', '2025-01-02T00:00:00+00:00')
+
+
+@patch('sma_collector.collector_worker.WatermarkStore')
+@patch('sma_collector.collector_worker.get_db_session')
+def test_run_job_keeps_watermark_when_processing_fails(mock_get_db_session, mock_watermark_store):
+    """
+    Test that the cursor is not advanced when storing a batch fails.
+    """
+    mock_connector = MagicMock()
+    mock_connector.return_value.watermark_key.return_value = 'PROJ:*..*'
+    mock_connector.return_value.iter_batches.return_value = [[{'key': 'PROJ-1'}]]
+    mock_processor = MagicMock(side_effect=RuntimeError("db down"))
+
+    with patch.dict(collector_worker.CONNECTOR_REGISTRY, {'jira': mock_connector}, clear=True), \
+            patch.dict(collector_worker.PROCESSOR_REGISTRY, {'jira': mock_processor}, clear=True):
+        collector_worker.run_job({'source': 'jira'})
+
+    mock_watermark_store.return_value.set.assert_not_called()
+
+
+@patch('sma_collector.collector_worker.WatermarkStore')
+@patch('sma_collector.collector_worker.get_db_session')
+def test_run_job_seeds_missing_watermark_from_stored_data(mock_get_db_session, mock_watermark_store):
+    """
+    Test that a source without a stored cursor starts from its seed function.
+    """
+    mock_connector = MagicMock()
+    mock_connector.return_value.watermark_key.return_value = 'build'
+    mock_connector.return_value.iter_batches.return_value = []
+    mock_watermark_store.return_value.get.return_value = None
+    mock_seed = MagicMock(return_value='41')
+
+    with patch.dict(collector_worker.CONNECTOR_REGISTRY, {'jenkins': mock_connector}, clear=True), \
+            patch.dict(collector_worker.PROCESSOR_REGISTRY, {'jenkins': MagicMock()}, clear=True), \
+            patch.dict(collector_worker.WATERMARK_SEED_REGISTRY, {'jenkins': mock_seed}, clear=True):
+        collector_worker.run_job({'source': 'jenkins', 'params': {'job_name': 'build'}})
+
+    mock_seed.assert_called_once_with(mock_get_db_session.return_value, job_name='build')
+    mock_connector.return_value.iter_batches.assert_called_once_with(
+        collector_worker.settings.COLLECT_BATCH_SIZE, job_name='build', since='41'
+    )
+
+
+@patch('sma_collector.collector_worker.get_db_session')
+def test_run_job_runs_registered_task(mock_get_db_session):
+    """
+    Test that maintenance jobs run their registered task with the job session
+    instead of a connector.
+    """
+    mock_task = MagicMock()
+    job = {'source': 'maintenance', 'task': 'osp_metrics_retention', 'params': {'now': '2025-01-01'}}
+
+    with patch.dict(collector_worker.TASK_REGISTRY, {'osp_metrics_retention': mock_task}, clear=True):
+        collector_worker.run_job(job)
+
+    mock_task.assert_called_once_with(mock_get_db_session.return_value, now='2025-01-01')
+    mock_get_db_session.return_value.close.assert_called_once()
@@ -0,0 +1,66 @@
+from datetime import date
+from sma_collector.config import Settings
+from sma_collector.sharding import plan_jobs, plan_git_jobs, plan_jira_jobs, plan_jenkins_jobs, plan_maintenance_jobs, repo_slug
+
+def test_plan_jobs_defaults_to_one_job_per_source():
+    """Test that an unsharded configuration keeps the original three jobs."""
+    jobs = plan_jobs(Settings())
+
+    assert [job['source'] for job in jobs] == ['git', 'github', 'jira']
+
+def test_plan_git_jobs_one_per_repository():
+    """Test that each repository becomes its own job with its own clone path."""
+    settings = Settings(
+        GIT_REPO_URLS=["https://github.com/fake/a.git", "git@bitbucket.org:fake/b.git"],
+        GIT_REPOS_DIR="/repos"
+    )
+
+    jobs = plan_git_jobs(settings)
+
+    assert len(jobs) == 2
+    assert jobs[0]['settings'] == {'GIT_REPO_URL': "https://github.com/fake/a.git", 'GIT_REPO_PATH': "/repos/fake_a"}
+    assert jobs[1]['settings']['GIT_REPO_PATH'] == "/repos/fake_b"
+    assert repo_slug("git@bitbucket.org:fake/b.git") == "fake_b"
+
+def test_plan_jira_jobs_covers_all_created_dates():
+    """Test that Jira windows are contiguous and open-ended at both ends."""
+    settings = Settings(JIRA_SHARD_WINDOW_DAYS=30, JIRA_SHARD_START_DATE=date(2025, 1, 1))
+
+    jobs = plan_jira_jobs(settings, today=date(2025, 2, 15))
+    windows = [job['params'] for job in jobs]
+
+    assert windows == [
+        {'created_after': None, 'created_before': '2025-01-01'},
+        {'created_after': '2025-01-01', 'created_before': '2025-01-31'},
+        {'created_after': '2025-01-31', 'created_before': None},
+    ]
+
+def test_plan_jenkins_jobs_one_per_job_name():
+    """Test that every configured Jenkins job is dispatched once."""
+    settings = Settings(JENKINS_HOST="https://jenkins", JENKINS_JOB_NAME="build", JENKINS_JOB_NAMES=["build", "deploy"])
+
+    jobs = plan_jenkins_jobs(settings)
+
+    assert [job['params'] for job in jobs] == [{'job_name': 'build'}, {'job_name': 'deploy'}]
+
+def test_plan_jenkins_jobs_adds_deployment_pattern_job():
+    """Test that jobs matching the deployment pattern are dispatched as one fan-out job."""
+    settings = Settings(JENKINS_HOST="https://jenkins", JENKINS_JOB_NAME="build", DEPLOYMENT_JOB_NAME_PATTERN="^deploy")
+
+    jobs = plan_jenkins_jobs(settings)
+
+    assert [job['params'] for job in jobs] == [{'job_name': 'build'}, {'job_pattern': '^deploy'}]
+
+def test_plan_maintenance_jobs_only_with_retention():
+    """Test that the retention task is only dispatched when a retention is configured."""
+    assert plan_maintenance_jobs(Settings()) == []
+
+    jobs = plan_maintenance_jobs(Settings(OSP_ROLLUP_RETENTION_DAYS={"1m": 30}))
+
+    assert jobs == [{'source': 'maintenance', 'task': 'osp_metrics_retention'}]
+
+def test_plan_maintenance_jobs_creates_partitions_with_profiling():
+    """Test that the partition task is dispatched when osp_metrics is collected."""
+    jobs = plan_maintenance_jobs(Settings(PROFILING_DATA_PATH="/data/profiling"))
+
+    assert jobs == [{'source': 'maintenance', 'task': 'osp_metrics_partitions'}]